@@ -0,0 +1,66 @@
+"""状態キーの計算速度と visited 集合のメモリ量を比較するベンチマーク
+
+    python -m benchmarks.hashing [状態数]
+
+example.py の初期状態から幅優先で集めた盤面に対して、従来の
+``str(sorted(...))`` によるキーと正規化整数キーを比べる。
+"""
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+from src.solver.canonical import canonicalizer
+from src.solver.example import initial_tubes
+from src.solver.state import TubeState
+
+
+def collect_states(limit):
+    """初期状態から幅優先で盤面を集める"""
+    start = TubeState([list(t) for t in initial_tubes]).packed
+    num_tubes = start.layout.num_tubes
+    seen = {start}
+    queue = deque([start])
+    while queue and len(seen) < limit:
+        state = queue.popleft()
+        for f in range(num_tubes):
+            for t in range(num_tubes):
+                if state.can_move(f, t):
+                    child = state.apply(f, t)
+                    if child not in seen:
+                        seen.add(child)
+                        queue.append(child)
+    return list(seen)[:limit]
+
+
+def legacy_hash(tubes):
+    """変更前の TubeState.get_hash と同じ計算"""
+    return str(sorted(tuple(tube) for tube in tubes))
+
+
+def measure(name, keys_of):
+    start = time.perf_counter()
+    keys = keys_of()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    visited = set(keys_of())
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:10s} {len(keys) / elapsed:12,.0f} keys/s  "
+          f"visited: {len(visited):7,d} keys {size / 1024 / 1024:8.2f} MiB "
+          f"({size / max(len(visited), 1):6.1f} B/key)")
+
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    states = collect_states(limit)
+    decoded = [s.decode() for s in states]
+    canonical = canonicalizer(states[0].layout)
+    print(f"{len(states):,d} states from src/solver/example.py")
+    measure("str(sorted)", lambda: [legacy_hash(t) for t in decoded])
+    measure("canonical", lambda: [canonical.key(s.code) for s in states])
+
+
+if __name__ == "__main__":
+    main()
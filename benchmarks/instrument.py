@@ -0,0 +1,51 @@
+"""計測（TubeSolver(instrument=True)）の有無で探索時間を比べるベンチマーク
+
+    python -m benchmarks.instrument [--strategies dfs,best_first,astar] [--repeat N] [--colors N] [--seeds N]
+
+戦略ごとに instrument=False / True で同じ問題を repeat 回解き、最小の時間と
+overhead（False に対する時間の比）を並べ、True のときの処理ごとの時間の内訳を表示する。
+"""
+import argparse
+import time
+
+from src.solver import TubeSolver, TubeState
+from src.solver.example import initial_tubes
+from benchmarks.memory import random_layout
+
+
+def run(puzzles, strategy, max_iterations, instrument):
+    """全ての問題を1回ずつ解いて（秒, 最後の SolveStats）を返す"""
+    solver = TubeSolver(instrument=instrument)
+    start = time.perf_counter()
+    for tubes in puzzles:
+        solver.solve(TubeState([list(t) for t in tubes]), max_iterations, strategy)
+    return time.perf_counter() - start, solver.stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategies", default="dfs,best_first,astar")
+    parser.add_argument("--max-iterations", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--colors", type=int, help="ランダムな問題の色数（省略時は example.py の問題）")
+    parser.add_argument("--seeds", type=int, default=5)
+    args = parser.parse_args()
+    puzzles = [random_layout(args.colors, seed) for seed in range(args.seeds)] if args.colors else [initial_tubes]
+
+    print(f"{'strategy':12s} {'instrument':>10s} {'time':>8s} {'overhead':>8s}  expand / hash / evaluate")
+    for strategy in args.strategies.split(","):
+        baseline = None
+        for instrument in (False, True):
+            runs = [run(puzzles, strategy, args.max_iterations, instrument) for _ in range(args.repeat)]
+            elapsed = min(r[0] for r in runs)
+            stats = runs[0][1]
+            baseline = baseline or elapsed
+            phases = "-"
+            if stats.instrumented:
+                phases = " / ".join(f"{getattr(stats, f'{phase}_seconds'):.3f}s"
+                                    for phase in ("expand", "hash", "evaluate"))
+            print(f"{strategy:12s} {str(instrument):>10s} {elapsed:7.2f}s {elapsed / baseline:8.2f}  {phases}")
+
+
+if __name__ == "__main__":
+    main()
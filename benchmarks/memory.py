@@ -0,0 +1,81 @@
+"""探索中のメモリ使用量を測るベンチマーク
+
+    python -m benchmarks.memory [--strategies astar,best_first,beam] [--max-iterations N] [--colors N]
+                                [--memory-limit MB]
+
+戦略ごとに別プロセスでパズルを解き、solve の前後で増えた最大RSSと、
+tracemalloc で測った Python オブジェクトのピークを表示する。
+--colors を指定すると example.py の代わりに、その色数で空の試験管2本の
+ランダムな問題（--seed で固定）を解く。--memory-limit を付けると、記録済みの状態の
+集合をその大きさに抑えて一時ファイルへ書き出す場合（TubeSolver(memory_limit=...)）も測る。
+"""
+import argparse
+import multiprocessing
+import random
+import resource
+import time
+import tracemalloc
+
+from src.solver import TubeSolver, TubeState
+from src.solver.example import initial_tubes
+
+
+def random_layout(num_colors, seed, capacity=4, empty=2):
+    """各色 capacity 個をランダムに詰めた問題"""
+    colors = [(40 + 8 * i, 200 - 6 * i, (97 * i) % 256) for i in range(num_colors)]
+    units = [c for c in colors for _ in range(capacity)]
+    random.Random(seed).shuffle(units)
+    tubes = [units[i:i + capacity] for i in range(0, len(units), capacity)]
+    return tubes + [[] for _ in range(empty)]
+
+
+def _measure(tubes, strategy, max_iterations, use_tracemalloc, memory_limit, queue):
+    state = TubeState([list(t) for t in tubes])
+    solver = TubeSolver(memory_limit=memory_limit)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if use_tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    solved, moves, _, _ = solver.solve(state, max_iterations, strategy)
+    elapsed = time.perf_counter() - start
+    heap_peak = tracemalloc.get_traced_memory()[1] if use_tracemalloc else 0
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((solved, len(moves), elapsed, (rss_after - rss_before) * 1024, heap_peak))
+
+
+def measure(tubes, strategy, max_iterations, use_tracemalloc, memory_limit=None):
+    """別プロセスで1回解いて（解けたか, 手数, 秒, 増えた最大RSS, ヒープのピーク）を返す"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure,
+                                      args=(tubes, strategy, max_iterations, use_tracemalloc, memory_limit, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategies", default="astar,best_first,beam")
+    parser.add_argument("--max-iterations", type=int, default=100000)
+    parser.add_argument("--colors", type=int, help="ランダムな問題の色数（省略時は example.py の問題）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="Python オブジェクトのピークも測る（遅くなる）")
+    parser.add_argument("--memory-limit", type=float, help="記録済みの状態の集合に使うメモリの上限（MB）")
+    args = parser.parse_args()
+    tubes = random_layout(args.colors, args.seed) if args.colors else initial_tubes
+
+    limits = [None] if args.memory_limit is None else [None, int(args.memory_limit * 2**20)]
+
+    print(f"{'strategy':12s} {'limit':>8s} {'solved':>6s} {'moves':>5s} {'time':>8s} {'peak RSS':>10s} {'heap peak':>10s}")
+    for strategy in args.strategies.split(","):
+        for limit in limits:
+            solved, moves, elapsed, rss, heap = measure(tubes, strategy, args.max_iterations, args.tracemalloc, limit)
+            heap_text = f"{heap / 2**20:8.1f}MB" if args.tracemalloc else "-"
+            limit_text = f"{limit / 2**20:.0f}MB" if limit else "-"
+            print(f"{strategy:12s} {limit_text:>8s} {str(solved):>6s} {moves:5d} {elapsed:7.2f}s "
+                  f"{rss / 2**20:8.1f}MB {heap_text:>10s}")
+
+
+if __name__ == "__main__":
+    main()
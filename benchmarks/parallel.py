@@ -0,0 +1,47 @@
+"""HDA*（strategy="hda_star"）のプロセス数ごとの速度向上を測るベンチマーク
+
+    python -m benchmarks.parallel [--workers 1,2,4,8] [--colors N] [--seed N] [--max-iterations N]
+
+逐次の A* を基準に、プロセス数ごとの時間・展開数・手数と速度向上を表示する。
+手数が A* と一致し、探索を終えて最短と確かめられたか（optimal）も確認する。
+速度向上はマシンのコア数が上限になる（os.cpu_count() を併記する）。
+"""
+import argparse
+import os
+import time
+
+from src.solver import TubeSolver, TubeState
+from src.solver.example import initial_tubes
+from src.solver.parallel import hda_star
+from benchmarks.memory import random_layout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--max-iterations", type=int, default=1000000)
+    parser.add_argument("--colors", type=int, help="ランダムな問題の色数（省略時は example.py の問題）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    tubes = random_layout(args.colors, args.seed) if args.colors else initial_tubes
+
+    start = time.perf_counter()
+    solved, moves, _, _ = TubeSolver().solve(TubeState([list(t) for t in tubes]), args.max_iterations, "astar")
+    base = time.perf_counter() - start
+    optimum = len(moves) if solved else None
+
+    print(f"cpu_count={os.cpu_count()}")
+    print(f"{'workers':>8s} {'solved':>6s} {'moves':>5s} {'optimal':>7s} {'expanded':>9s} {'time':>8s} {'speedup':>7s}")
+    print(f"{'astar':>8s} {str(solved):>6s} {len(moves):5d} {'-':>7s} {'-':>9s} {base:7.2f}s {1.0:6.2f}x")
+    for workers in map(int, args.workers.split(",")):
+        state = TubeState([list(t) for t in tubes])
+        start = time.perf_counter()
+        result = hda_star(state.packed, workers, args.max_iterations)
+        elapsed = time.perf_counter() - start
+        match = "" if optimum is None or len(result.moves) == optimum else " (A* と手数が異なる)"
+        print(f"{workers:8d} {str(result.solved):>6s} {len(result.moves):5d} {str(result.optimal):>7s} "
+              f"{result.iterations:9d} {elapsed:7.2f}s {base / elapsed:6.2f}x{match}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""パターンデータベース（TubeSolver(pattern_db=...)）の有無で展開数と時間を比べるベンチマーク
+
+    python -m benchmarks.patterns pairs.pdb [--strategies astar,ida_star,anytime] [--colors N] [--seeds N]
+
+pairs.pdb は ``python -m src.solver.patterns build`` で問題と同じ形の盤面向けに作っておく
+（--colors を省略したときは example.py の問題なので ``--tubes 13 --colors 11``）。
+戦略ごとに heuristics.LowerBound とパターンデータベースで同じ問題を解き、
+展開数・時間・手数の合計を並べる。手数が変わったら許容的でないので表示する。
+"""
+import argparse
+import time
+
+from src.solver import TubeSolver, TubeState
+from src.solver.example import initial_tubes
+from src.solver.patterns import load
+from benchmarks.memory import random_layout
+
+
+def run(puzzles, strategy, max_iterations, pattern_db):
+    """全ての問題を1回ずつ解いて（秒, 展開数の合計, 手数のリスト）を返す"""
+    solver = TubeSolver(pattern_db=pattern_db)
+    iterations = 0
+    lengths = []
+    start = time.perf_counter()
+    for tubes in puzzles:
+        solved, moves, _, _ = solver.solve(TubeState([list(t) for t in tubes]), max_iterations, strategy)
+        iterations += solver.stats.iterations
+        lengths.append(len(moves) if solved else None)
+    return time.perf_counter() - start, iterations, lengths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database", help="python -m src.solver.patterns build で作ったファイル")
+    parser.add_argument("--strategies", default="astar,ida_star,anytime")
+    parser.add_argument("--max-iterations", type=int, default=2000000)
+    parser.add_argument("--colors", type=int, help="ランダムな問題の色数（省略時は example.py の問題）")
+    parser.add_argument("--seeds", type=int, default=5)
+    args = parser.parse_args()
+    puzzles = [random_layout(args.colors, seed) for seed in range(args.seeds)] if args.colors else [initial_tubes]
+    database = load(args.database)
+    usable = sum(database.matches(TubeState([list(t) for t in tubes]).packed) for tubes in puzzles)
+    print(f"{usable}/{len(puzzles)} 問がデータベースの盤面の形に合っています")
+
+    print(f"{'strategy':12s} {'heuristic':>9s} {'time':>8s} {'expanded':>10s} {'moves':>6s}")
+    for strategy in args.strategies.split(","):
+        baseline = None
+        for name, pattern_db in (("lower", None), ("pdb", database)):
+            elapsed, iterations, lengths = run(puzzles, strategy, args.max_iterations, pattern_db)
+            moves = sum(length for length in lengths if length is not None)
+            note = ""
+            if baseline is None:
+                baseline = lengths
+            elif lengths != baseline:
+                note = "  手数が違います"
+            print(f"{strategy:12s} {name:>9s} {elapsed:7.2f}s {iterations:10d} {moves:6d}{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""枝刈り（TubeSolver(prune=True)）の有無で展開数を比べるベンチマーク
+
+    python -m benchmarks.pruning [--strategies dfs,best_first,astar,beam] [--colors N] [--seeds N] [--dead-ends]
+
+戦略ごとに prune=False / prune=True で同じ問題を解き、展開した状態数・
+手数・時間を並べて表示する（ratio は prune=False に対する展開数の比）。
+--dead-ends を付けると行き止まりの判定も加えた場合（dead_ends）も測る。
+--colors を指定すると、その色数のランダムな問題を --seeds 個
+（seed 0, 1, ...）解いた合計を表示する。
+"""
+import argparse
+import time
+
+from src.solver import TubeSolver, TubeState
+from src.solver.events import FINISHED, SOLVED
+from src.solver.pruning import Pruner
+from src.solver.solver import COMMUTING_STRATEGIES
+from src.solver.example import initial_tubes
+from benchmarks.memory import random_layout
+
+
+def run(tubes, strategy, max_iterations, prune):
+    """1回解いて（解けたか, 手数, 展開数, 秒）を返す"""
+    events = []
+
+    def record(event):
+        if event.kind in (SOLVED, FINISHED):
+            events.append(event)
+
+    solver = TubeSolver(progress=record, progress_interval=float('inf'), prune=prune)
+    start = time.perf_counter()
+    solved, moves, _, _ = solver.solve(TubeState([list(t) for t in tubes]), max_iterations, strategy)
+    return solved, len(moves), events[-1].iterations, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategies", default="dfs,best_first,astar,beam")
+    parser.add_argument("--max-iterations", type=int, default=200000)
+    parser.add_argument("--colors", type=int, help="ランダムな問題の色数（省略時は example.py の問題）")
+    parser.add_argument("--seeds", type=int, default=10)
+    parser.add_argument("--dead-ends", action="store_true", help="行き止まりの判定を加えた場合も測る")
+    args = parser.parse_args()
+    puzzles = [random_layout(args.colors, seed) for seed in range(args.seeds)] if args.colors else [initial_tubes]
+
+    print(f"{'strategy':12s} {'prune':>9s} {'solved':>6s} {'moves':>6s} {'expanded':>9s} {'time':>8s} {'ratio':>6s}")
+    for strategy in args.strategies.split(","):
+        configs = [("False", False), ("True", True)]
+        if args.dead_ends:
+            configs.append(("dead_ends", Pruner(commuting=strategy in COMMUTING_STRATEGIES, dead_ends=True)))
+        baseline = None
+        for name, prune in configs:
+            results = [run(tubes, strategy, args.max_iterations, prune) for tubes in puzzles]
+            solved = sum(r[0] for r in results)
+            moves = sum(r[1] for r in results)
+            expanded = sum(r[2] for r in results)
+            elapsed = sum(r[3] for r in results)
+            baseline = baseline or expanded
+            print(f"{strategy:12s} {name:>9s} {solved:6d} {moves:6d} {expanded:9d} {elapsed:7.2f}s "
+                  f"{expanded / baseline:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""GUI の1フレームの描画時間を比べるベンチマーク（SDL の dummy ビデオドライバで動かす）
+
+    python -m benchmarks.rendering [--frames N] [--width 800] [--height 600]
+
+従来の描き方（毎フレーム全ての試験管と図形を pygame.draw.rect で描き、クリアの
+文字を作り直して display.flip する）と、src/renderer.py の TubeRenderer を、
+次の3通りのフレームで比べる。
+
+    idle    何も変わらないフレーム
+    select  試験管の選択を毎フレーム切り替える（1本だけ変わる）
+    move    毎フレーム1手動かす（2本だけ変わる）
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from src.game import TestTubeGame
+from src.gui import TestTubeGameGUI
+
+
+def draw_immediate(gui):
+    """従来の描き方で1フレーム描く"""
+    screen = gui.screen
+    screen.fill(gui.bg_color)
+    for (x, y), (colors, selected, _) in zip(gui.tube_positions(), gui.tube_looks(None)):
+        tube_rect = pygame.Rect(x, y, gui.tube_width, gui.tube_height)
+        pygame.draw.rect(screen, gui.tube_color, tube_rect, 2)
+        for i, color in enumerate(reversed(colors)):
+            shape_y = y + gui.tube_height - (i + 1) * gui.shape_height
+            pygame.draw.rect(screen, color, pygame.Rect(x, shape_y, gui.tube_width, gui.shape_height))
+        if selected:
+            pygame.draw.rect(screen, (255, 255, 0), tube_rect, 3)
+    font = pygame.font.Font(None, 74)
+    text = font.render("クリア!", True, (255, 255, 0))
+    screen.blit(text, text.get_rect(center=(gui.width // 2, 100)))
+    pygame.display.flip()
+
+
+def draw_retained(gui):
+    """TubeRenderer で1フレーム描く"""
+    texts = {"clear": ("クリア!", 74, (255, 255, 0), (gui.width // 2, 100))}
+    gui.renderer.render(gui.tube_positions(), gui.tube_looks(None), texts)
+
+
+def change(gui, scenario, frame):
+    """シナリオに合わせて盤面を変える"""
+    game = gui.game
+    if scenario == "select":
+        game.selected_tube = None if game.selected_tube is not None else frame % game.num_tubes
+    elif scenario == "move":
+        # 中身のある試験管から空きのある別の試験管へ1個移す
+        for offset in range(game.num_tubes):
+            source = (frame + offset) % game.num_tubes
+            if not game.tubes[source].is_empty():
+                break
+        for offset in range(1, game.num_tubes):
+            target = (source + offset) % game.num_tubes
+            if not game.tubes[target].is_full():
+                game.move_shape(source, target)
+                break
+
+
+def measure(gui, draw, scenario, frames):
+    """1フレームの時間（ミリ秒）のリスト"""
+    gui.game = TestTubeGame()
+    gui.renderer.invalidate()
+    draw(gui)
+    times = []
+    for frame in range(frames):
+        change(gui, scenario, frame)
+        start = time.perf_counter()
+        draw(gui)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    args = parser.parse_args()
+    gui = TestTubeGameGUI(args.width, args.height)
+
+    print(f"{'scenario':8s} {'renderer':>9s} {'mean ms':>8s} {'p95 ms':>7s} {'max ms':>7s} {'speedup':>7s}")
+    for scenario in ("idle", "select", "move"):
+        baseline = None
+        for name, draw in (("immediate", draw_immediate), ("retained", draw_retained)):
+            times = measure(gui, draw, scenario, args.frames)
+            mean = statistics.fmean(times)
+            baseline = baseline or mean
+            p95 = sorted(times)[int(len(times) * 0.95)]
+            print(f"{scenario:8s} {name:>9s} {mean:8.3f} {p95:7.3f} {max(times):7.3f} {baseline / mean:7.1f}")
+    gui.hints.cancel()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
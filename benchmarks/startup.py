@@ -0,0 +1,69 @@
+"""起動時に読み込むモジュールと時間を比べるベンチマーク（python -X importtime）
+
+    python -m benchmarks.startup [--repeat N] [--check]
+
+対象ごとに新しいプロセスで ``python -X importtime -c "import 対象"`` を実行し、
+読み込みにかかった時間（importtime の累積の合計、repeat 回の最小値）と、
+pygame・numpy などの重いモジュールを読み込んだかを表示する。
+--check を付けると、ソルバーの経路（src.solver と python -m src.solver の cli）が
+pygame を読み込んでいたら終了コード1で終わる。
+"""
+import argparse
+import subprocess
+import sys
+
+# 対象: (名前, -c に渡すコード, pygame を読み込んではいけないか)
+TARGETS = [
+    ("src.solver", "import src.solver", True),
+    ("TubeSolver", "from src.solver import TubeSolver", True),
+    ("cli", "import src.solver.cli", True),
+    ("env", "import src.env", True),
+    ("game", "import src.game", True),
+    ("gui", "import src.gui", False),
+]
+# 読み込んだかを表示する重いモジュール
+HEAVY = ("pygame", "numpy", "sqlite3", "multiprocessing")
+
+
+def importtime(code):
+    """（トップレベルの import の累積時間の合計（ミリ秒）, 読み込んだモジュール名の集合）"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():  # 見出しの行
+            continue
+        modules.add(name.strip())
+        if not name.startswith("  "):  # 字下げのない行がトップレベル
+            total += int(cumulative)
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="ソルバーの経路が pygame を読み込んだら失敗にする")
+    args = parser.parse_args()
+
+    print(f"{'target':12s} {'import ms':>9s} {'modules':>7s}  heavy")
+    failed = []
+    for name, code, headless in TARGETS:
+        runs = [importtime(code) for _ in range(args.repeat)]
+        elapsed = min(run[0] for run in runs)
+        modules = runs[0][1]
+        heavy = [module for module in HEAVY if module in modules]
+        print(f"{name:12s} {elapsed:9.1f} {len(modules):7d}  {', '.join(heavy) or '-'}")
+        if headless and "pygame" in modules:
+            failed.append(name)
+    if failed:
+        print(f"\npygame を読み込んでいます: {', '.join(failed)}", file=sys.stderr)
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
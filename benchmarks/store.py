@@ -0,0 +1,90 @@
+"""解の記録（SolutionStore）の読み書きの速さと、最短（exact）として記録する条件を確かめるベンチマーク
+
+    python -m benchmarks.store [--colors N] [--seeds N] [--check]
+
+ランダムな問題を best_first で解いて一時ファイルの記録へ put し、その後に全ての問題を
+get(touch=True) で引き直して、1回あたりの時間を表示する。
+--check を付けると、最短手順を保証する探索をいくつかの少ない予算（--budgets）で解いて記録し、
+最短と確かめていない手順が exact として記録されていたら終了コード1で終わる
+（hda_star は途中で打ち切ると暫定解が最短とは限らない）。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from src.solver import TubeSolver, TubeState
+from src.solver.solver import OPTIMAL_STRATEGIES
+from src.solver.store import SolutionStore
+from benchmarks.memory import random_layout
+
+
+def throughput(puzzles, directory, max_entries):
+    """（put 1回の秒, get 1回の秒, 記録した状態数）"""
+    store = SolutionStore(os.path.join(directory, "throughput.sqlite3"), max_entries=max_entries)
+    solver = TubeSolver()
+    solved = []
+    for tubes in puzzles:
+        state = TubeState([list(t) for t in tubes]).packed
+        ok, moves, _, _ = solver.solve(TubeState.from_packed(state), 200000, "best_first")
+        if ok:
+            solved.append((state, moves))
+    start = time.perf_counter()
+    for state, moves in solved:
+        store.put(state, moves, False)
+    put_seconds = (time.perf_counter() - start) / max(len(solved), 1)
+    start = time.perf_counter()
+    for state, _ in solved:
+        store.get(state, touch=True)
+    get_seconds = (time.perf_counter() - start) / max(len(solved), 1)
+    return put_seconds, get_seconds, len(store)
+
+
+def check(directory, colors, seed, budgets, workers):
+    """予算で打ち切った探索の手順が exact として記録されないかを確かめ、失敗した戦略のリストを返す"""
+    tubes = random_layout(colors, seed)
+    start = TubeState([list(t) for t in tubes]).packed
+    optimum = len(TubeSolver().solve(TubeState.from_packed(start), 2000000, "astar")[1])
+    failed = []
+    print(f"{'strategy':14s} {'budget':>6s} {'solved':>6s} {'moves':>5s} {'exact':>5s}  (最短 {optimum} 手)")
+    for strategy in OPTIMAL_STRATEGIES:
+        for budget in budgets:
+            store = SolutionStore(os.path.join(directory, f"check-{strategy}-{budget}.sqlite3"))
+            solved, moves, _, _ = TubeSolver(store=store, workers=workers).solve(
+                TubeState.from_packed(start), budget, strategy)
+            known = store.get(start) if solved else None
+            exact = known is not None and known.exact
+            print(f"{strategy:14s} {budget:6d} {str(solved):>6s} {len(moves):5d} {str(exact):>5s}")
+            if exact and len(known.moves) != optimum:
+                failed.append(f"{strategy}({budget})")
+            # 記録を引く最短手順の探索も、最短より長い手順を返してはいけない
+            again = TubeSolver(store=store).solve(TubeState.from_packed(start), 2000000, "astar")[1]
+            if len(again) != optimum:
+                failed.append(f"{strategy}({budget}) → astar")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--colors", type=int, default=7)
+    parser.add_argument("--seeds", type=int, default=20)
+    parser.add_argument("--max-entries", type=int, default=1_000_000)
+    parser.add_argument("--check", action="store_true", help="最短と確かめていない手順を exact で記録したら失敗にする")
+    parser.add_argument("--budgets", default="500,1000,2000,4000", help="--check で解くときの max_iterations")
+    parser.add_argument("--workers", type=int, default=3, help="--check の hda_star のプロセス数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        puzzles = [random_layout(args.colors, seed) for seed in range(args.seeds)]
+        put_seconds, get_seconds, entries = throughput(puzzles, directory, args.max_entries)
+        print(f"put {put_seconds * 1000:.2f}ms  get(touch) {get_seconds * 1000:.3f}ms  {entries} 状態\n")
+        if args.check:
+            failed = check(directory, args.colors, 8, [int(b) for b in args.budgets.split(",")], args.workers)
+            if failed:
+                print(f"\n最短でない手順を exact として記録しました: {', '.join(failed)}", file=sys.stderr)
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
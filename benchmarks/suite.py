@@ -0,0 +1,242 @@
+"""生成したパズル集で探索方法ごとの性能を測り、JSON に記録するベンチマーク
+
+    python -m benchmarks.suite [--corpus quick|full|scaling] [--strategies dfs,best_first,astar,beam]
+                               [--output results.json] [--baseline previous.json]
+
+コーパスの各問題（src.solver.generator で seed から作る）を探索方法ごとに
+別プロセスで解き、時間・展開数・展開数/秒・最大RSSの増分・手数を記録する。
+--tracemalloc を付けると Python オブジェクトのピークも測る（遅くなる）。
+scaling コーパスは容量（5〜8）・1色あたりの個数・試験管の本数（20本以上）を
+変えたときの展開数/秒と手数の伸びを見るためのもの。
+結果はコミットのハッシュなどと一緒に --output へ書き出す。--baseline に
+以前の結果を渡すと、同じ問題・探索方法どうしで時間と展開数を比べ、
+--threshold を超えて遅くなったもの、--node-threshold を超えて展開数が増えたもの、
+解けなくなったものを知らせる。子プロセスが例外や異常終了で結果を返さなかった
+問題は error を付けて記録し、悪化として数える。
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import queue as queues
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from src.solver import TubeSolver
+from src.solver.events import FINISHED, SOLVED
+from src.solver.generator import generate_puzzle, layout_for
+from src.solver.state import TubeState
+
+# 子プロセスの結果を待つ間隔と、time_limit を過ぎてから待つ秒数
+POLL_SECONDS = 1.0
+RESULT_GRACE = 60.0
+
+# コーパス: (名前, 色の数, 容量, 1色あたりの個数, 空の試験管, seed の数, 解けることを確かめる展開数)
+# 1色あたりの個数が None なら容量と同じ
+CORPORA = {
+    "quick": [
+        ("c6", 6, 4, None, 2, 3, 20000),
+        ("c10", 10, 4, None, 2, 3, 20000),
+        ("c12-cap5", 12, 5, None, 2, 2, 20000),
+    ],
+    "full": [
+        ("c6", 6, 4, None, 2, 5, 20000),
+        ("c10", 10, 4, None, 2, 5, 20000),
+        ("c14", 14, 4, None, 2, 5, 20000),
+        ("c10-e1", 10, 4, None, 1, 3, 20000),
+        ("c12-cap5", 12, 5, None, 2, 3, 20000),
+        ("c8-cap8", 8, 8, None, 2, 3, 20000),
+        ("c20", 20, 4, None, 2, 3, 0),
+        ("c30", 30, 4, None, 2, 2, 0),
+    ],
+    "scaling": [
+        ("c10-cap4", 10, 4, None, 2, 2, 0),
+        ("c10-cap5", 10, 5, None, 2, 2, 0),
+        ("c10-cap6", 10, 6, None, 2, 2, 0),
+        ("c10-cap8", 10, 8, None, 2, 2, 0),
+        ("c10-cap6-u4", 10, 6, 4, 2, 2, 0),
+        ("c20-cap4", 20, 4, None, 2, 2, 0),
+        # 容量が大きいと空の試験管2本では解けない問題が多いので増やす
+        ("c20-cap6", 20, 6, None, 3, 2, 0),
+        ("c20-cap8", 20, 8, None, 3, 2, 0),
+        ("c30-cap4", 30, 4, None, 2, 2, 0),
+        ("c30-cap6", 30, 6, None, 4, 2, 0),
+    ],
+}
+
+
+def corpus(name):
+    """コーパスの問題を (名前, seed, 容量, 1色あたりの個数, 試験管の並び) で列挙する"""
+    for case, colors, capacity, units, empty, seeds, verify in CORPORA[name]:
+        for seed in range(seeds):
+            yield case, seed, capacity, units, generate_puzzle(colors, capacity, empty, seed, verify, units)
+
+
+def failed(error):
+    """結果を返せなかった問題の測定値の辞書"""
+    return {"solved": False, "moves": 0, "nodes": 0, "seconds": 0.0, "nodes_per_second": 0.0,
+            "peak_rss_bytes": 0, "heap_peak_bytes": None, "error": error}
+
+
+def _run(tubes, capacity, units, strategy, max_iterations, time_limit, use_tracemalloc, queue):
+    events = []
+
+    def record(event):
+        if event.kind in (SOLVED, FINISHED):
+            events.append(event)
+
+    try:
+        state = TubeState.from_packed(layout_for(tubes, capacity, units_per_color=units))
+        solver = TubeSolver(progress=record, progress_interval=float('inf'))
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if use_tracemalloc:
+            tracemalloc.start()
+        start = time.perf_counter()
+        solved, moves, _, _ = solver.solve(state, max_iterations, strategy, time_limit)
+        elapsed = time.perf_counter() - start
+        heap_peak = tracemalloc.get_traced_memory()[1] if use_tracemalloc else None
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        nodes = events[-1].iterations if events else solver.stats.iterations
+        result = {
+            "solved": solved,
+            "moves": len(moves),
+            "nodes": nodes,
+            "seconds": elapsed,
+            "nodes_per_second": nodes / elapsed if elapsed > 0 else 0.0,
+            "peak_rss_bytes": (rss_after - rss_before) * 1024,
+            "heap_peak_bytes": heap_peak,
+        }
+    except Exception as e:  # 1問の失敗でスイート全体を止めない
+        result = failed(f"{type(e).__name__}: {e}")
+    queue.put(result)
+
+
+def run(tubes, capacity, units, strategy, max_iterations, time_limit, use_tracemalloc):
+    """別プロセスで1回解いて測定値の辞書を返す
+
+    子プロセスが結果を返さずに終わるか、time_limit を RESULT_GRACE 秒過ぎても
+    終わらなければ（止めて）error 付きの辞書を返す。
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(tubes, capacity, units, strategy, max_iterations,
+                                                         time_limit, use_tracemalloc, queue))
+    process.start()
+    deadline = None if time_limit is None else time.monotonic() + time_limit + RESULT_GRACE
+    while True:
+        try:
+            result = queue.get(timeout=POLL_SECONDS)
+            break
+        except queues.Empty:
+            pass
+        if not process.is_alive():
+            try:  # 終わる直前に送った結果が残っているかもしれない
+                result = queue.get(timeout=POLL_SECONDS)
+            except queues.Empty:
+                result = failed(f"子プロセスが終了コード {process.exitcode} で結果を返さずに終わりました")
+            break
+        if deadline is not None and time.monotonic() > deadline:
+            process.terminate()
+            result = failed(f"time_limit を {RESULT_GRACE:.0f} 秒過ぎても終わりませんでした")
+            break
+    process.join()
+    return result
+
+
+def git_revision():
+    """（コミットのハッシュ, 未コミットの変更があるか）。git がなければ (None, None)"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.strip(), bool(status.strip())
+
+
+def compare(results, baseline, threshold, node_threshold):
+    """以前の結果と比べて表示し、悪化した件数を返す"""
+    previous = {(r["case"], r["seed"], r["strategy"]): r for r in baseline["results"]}
+    worse = 0
+    print(f"\nbaseline: {baseline['meta'].get('commit')}")
+    print(f"{'case':12s} {'seed':>4s} {'strategy':12s} {'time':>7s} {'nodes':>7s}  note")
+    for r in results:
+        old = previous.get((r["case"], r["seed"], r["strategy"]))
+        if old is None:
+            continue
+        time_ratio = r["seconds"] / old["seconds"] if old["seconds"] else float('inf')
+        nodes_ratio = r["nodes"] / old["nodes"] if old["nodes"] else float('inf')
+        notes = []
+        if r.get("error"):
+            notes.append(f"エラー: {r['error']}")
+        elif old["solved"] and not r["solved"]:
+            notes.append("解けなくなった")
+        elif r["solved"] and old["solved"] and r["moves"] > old["moves"]:
+            notes.append(f"手数 {old['moves']}→{r['moves']}")
+        if time_ratio > 1 + threshold:
+            notes.append("遅くなった")
+        if nodes_ratio > 1 + node_threshold:
+            notes.append(f"展開数 {old['nodes']}→{r['nodes']}")
+        worse += bool(notes)
+        print(f"{r['case']:12s} {r['seed']:4d} {r['strategy']:12s} {time_ratio:6.2f}x {nodes_ratio:6.2f}x  "
+              f"{', '.join(notes)}")
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", choices=sorted(CORPORA), default="quick")
+    parser.add_argument("--strategies", default="dfs,best_first,astar,beam")
+    parser.add_argument("--max-iterations", type=int, default=200000)
+    parser.add_argument("--time-limit", type=float, default=30.0, help="1回あたりの探索時間の上限（秒）")
+    parser.add_argument("--tracemalloc", action="store_true", help="Python オブジェクトのピークも測る（遅くなる）")
+    parser.add_argument("--output", default="benchmark-results.json", help="結果を書き出す JSON ファイル")
+    parser.add_argument("--baseline", help="比較する以前の結果の JSON ファイル")
+    parser.add_argument("--threshold", type=float, default=0.2, help="遅くなったとみなす時間の増加率")
+    parser.add_argument("--node-threshold", type=float, default=0.1, help="悪化とみなす展開数の増加率")
+    args = parser.parse_args()
+    strategies = args.strategies.split(",")
+
+    results = []
+    print(f"{'case':12s} {'seed':>4s} {'strategy':12s} {'solved':>6s} {'moves':>5s} {'nodes':>8s} "
+          f"{'time':>8s} {'nodes/s':>8s} {'peak RSS':>9s}")
+    for case, seed, capacity, units, tubes in corpus(args.corpus):
+        for strategy in strategies:
+            r = run(tubes, capacity, units, strategy, args.max_iterations, args.time_limit, args.tracemalloc)
+            r.update(case=case, seed=seed, strategy=strategy, capacity=capacity, units_per_color=units or capacity,
+                     tubes=len(tubes))
+            results.append(r)
+            print(f"{case:12s} {seed:4d} {strategy:12s} {str(r['solved']):>6s} {r['moves']:5d} {r['nodes']:8d} "
+                  f"{r['seconds']:7.2f}s {r['nodes_per_second']:8.0f} {r['peak_rss_bytes'] / 2**20:7.1f}MB"
+                  + (f"  {r['error']}" if r.get("error") else ""))
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "corpus": args.corpus,
+            "max_iterations": args.max_iterations,
+            "time_limit": args.time_limit,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\n{len(results)} 件の結果を {args.output} に書き出しました")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            worse = compare(results, json.load(f), args.threshold, args.node_threshold)
+        if worse:
+            print(f"{worse} 件が悪化しました")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
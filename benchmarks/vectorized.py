@@ -0,0 +1,110 @@
+"""NumPy でまとめて展開する探索（TubeSolver(vectorized=True)）の速度を比べるベンチマーク
+
+    python -m benchmarks.vectorized [--strategies best_first,beam] [--colors N] [--seeds N] [--batch N]
+
+戦略ごとに vectorized=False / True で同じ問題を解き、展開数・手数・時間・
+展開数/秒を並べて表示する（speedup は vectorized=False に対する展開数/秒の比）。
+最後に、展開だけ（合法手の生成・子の盤面・評価値・重複除去のキー）の速さを
+--batch 個の状態で比べる。
+"""
+import argparse
+import time
+
+from src.solver import TubeSolver, TubeState
+from src.solver.events import FINISHED, SOLVED
+from src.solver.canonical import canonicalizer
+from src.solver.heuristics import Evaluator
+from src.solver.pruning import Pruner
+from src.solver.vectorized import BatchExpander
+from src.solver.example import initial_tubes
+from benchmarks.memory import random_layout
+
+
+def run(tubes, strategy, max_iterations, vectorized):
+    """1回解いて（解けたか, 手数, 展開数, 秒）を返す"""
+    events = []
+
+    def record(event):
+        if event.kind in (SOLVED, FINISHED):
+            events.append(event)
+
+    solver = TubeSolver(progress=record, progress_interval=float('inf'), vectorized=vectorized)
+    start = time.perf_counter()
+    solved, moves, _, _ = solver.solve(TubeState([list(t) for t in tubes]), max_iterations, strategy)
+    return solved, len(moves), events[-1].iterations, time.perf_counter() - start
+
+
+def frontier(tubes, count):
+    """幅優先で集めた count 個の盤面（展開だけを測る材料）"""
+    states = [TubeState([list(t) for t in tubes]).packed]
+    seen = {states[0].code}
+    pruner = Pruner()
+    i = 0
+    while len(states) < count and i < len(states):
+        for _, child in pruner.successors(states[i]):
+            if child.code not in seen:
+                seen.add(child.code)
+                states.append(child)
+        i += 1
+    return states[:count]
+
+
+def expansion_rate(tubes, count, repeat=5):
+    """（1状態ずつ展開したときの子/秒, まとめて展開したときの子/秒）"""
+    states = frontier(tubes, count)
+    evaluator = Evaluator.from_state(states[0])
+    canonical = canonicalizer(states[0].layout)
+    pruner = Pruner()
+
+    start = time.perf_counter()
+    children = 0
+    for _ in range(repeat):
+        for state in states:
+            static_score = evaluator.static_score(state)
+            for move, child in pruner.successors(state):
+                static_score + evaluator.delta(state, child, *move)
+                canonical.key(child.code)
+                children += 1
+    scalar = children / (time.perf_counter() - start)
+
+    expander = BatchExpander(states[0].layout, evaluator.totals, pruner)
+    codes = [state.code for state in states]
+    start = time.perf_counter()
+    children = 0
+    for _ in range(repeat):
+        children += len(expander.expand(codes).keys)
+    return scalar, children / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategies", default="best_first,beam")
+    parser.add_argument("--max-iterations", type=int, default=100000)
+    parser.add_argument("--colors", type=int, help="ランダムな問題の色数（省略時は example.py の問題）")
+    parser.add_argument("--seeds", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=256, help="展開だけを測るときの状態数")
+    args = parser.parse_args()
+    puzzles = [random_layout(args.colors, seed) for seed in range(args.seeds)] if args.colors else [initial_tubes]
+
+    print(f"{'strategy':12s} {'vectorized':>10s} {'solved':>6s} {'moves':>6s} {'expanded':>9s} {'time':>8s} "
+          f"{'states/s':>9s} {'speedup':>7s}")
+    for strategy in args.strategies.split(","):
+        baseline = None
+        for vectorized in (False, True):
+            results = [run(tubes, strategy, args.max_iterations, vectorized) for tubes in puzzles]
+            solved = sum(r[0] for r in results)
+            moves = sum(r[1] for r in results)
+            expanded = sum(r[2] for r in results)
+            elapsed = sum(r[3] for r in results)
+            rate = expanded / elapsed
+            baseline = baseline or rate
+            print(f"{strategy:12s} {str(vectorized):>10s} {solved:6d} {moves:6d} {expanded:9d} {elapsed:7.2f}s "
+                  f"{rate:9.0f} {rate / baseline:7.2f}")
+
+    scalar, batched = expansion_rate(puzzles[0], args.batch)
+    print(f"\nexpand only ({args.batch} states): scalar {scalar:.0f} children/s, "
+          f"batched {batched:.0f} children/s ({batched / scalar:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,13 @@
-from .gui import main
+"""試験管パズルゲーム
 
-if __name__ == "__main__":
-    main()
+GUI（gui）・ゲーム（game）・ソルバー（solver）はそれぞれ使うときに読み込む。
+``import src.solver`` や ``python -m src.solver`` は pygame を読み込まない。
+"""
+
+
+def __getattr__(name):
+    # src.main は GUI を起動するときだけ pygame ごと読み込む
+    if name == "main":
+        from .gui import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,288 @@
+"""画面を使わずにゲームを大量に動かすための環境（pygame を読み込まない）
+
+    from src.env import GameEnv, VectorGameEnv
+
+    env = GameEnv()
+    env.reset(seed=0)                      # generator.generate_puzzle で作った盤面
+    reward, done, moved = env.step(0, 13)
+    env.undo()
+
+    envs = VectorGameEnv(1024)
+    envs.reset(seeds=range(1024))
+    rewards, dones, moved = envs.step(from_tubes, to_tubes)   # 長さ 1024 の配列
+
+盤面は色ID（1から。0 は空き）のリストで持ち、色は reset のたびに登録し直す。
+規則は既定でソルバーと同じ（移動先が空か、一番上が同じ色のときだけ1個移せる）。
+match_color=False なら TestTubeGame と同じく空きのある試験管ならどこへでも移せる。
+
+完成した試験管（units_per_color 個の同じ色）の数と、完成しているか空の試験管の数を
+移動のたびに動かした2本の分だけ更新する。報酬は完成した試験管の数の増減で、
+全ての試験管が完成しているか空になったら done になる。undo は移動の記録を1手ずつ戻す。
+"""
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+Layout = Sequence[Sequence[Hashable]]
+
+DEFAULT_CAPACITY = 4
+# reset(seed=...) で作る盤面の色の数と空の試験管の本数
+DEFAULT_COLORS = 12
+DEFAULT_EMPTY = 2
+
+
+class StepResult(NamedTuple):
+    reward: int  # 完成した試験管の数の増減
+    done: bool   # 全ての試験管が完成しているか空か
+    moved: bool  # 移動できたか（できなければ盤面は変わらない）
+
+
+def _generate(seed: int, num_colors: int, empty: int, capacity: int, units_per_color: Optional[int]):
+    # 解けることは確かめない（確かめると1問ごとに探索する）
+    from .solver.generator import generate_puzzle
+    return generate_puzzle(num_colors, capacity, empty, seed, verify_iterations=0, units_per_color=units_per_color)
+
+
+class GameEnv:
+    """1つのゲームの盤面を、移動・報酬・完成の判定・やり直しとともに持つ
+
+    Args:
+        capacity: 試験管の容量
+        units_per_color: 1色あたりの個数（省略時は capacity）。この個数の同じ色がそろうと完成
+        match_color: True なら移動先が空か一番上が同じ色のときだけ移せる
+        num_colors, empty: reset(seed=...) で作る盤面の色の数と空の試験管の本数
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, units_per_color: Optional[int] = None,
+                 match_color: bool = True, num_colors: int = DEFAULT_COLORS, empty: int = DEFAULT_EMPTY):
+        self.capacity = capacity
+        self.units_per_color = units_per_color or capacity
+        self.match_color = match_color
+        self.num_colors = num_colors
+        self.empty = empty
+        self.colors: List[Optional[Hashable]] = [None]  # 色ID → 色
+        self.tubes: List[List[int]] = []
+        self.moves: List[Tuple[int, int]] = []  # やり直し用の移動の記録
+        self.completed = 0  # 完成した試験管の数
+        self.settled = 0    # 完成しているか空の試験管の数
+
+    def reset(self, layout: Optional[Layout] = None, seed: Optional[int] = None) -> List[List[int]]:
+        """盤面を layout（各試験管は下から上の色）か、seed から作った盤面にして色IDの盤面を返す"""
+        if layout is None:
+            layout = _generate(seed or 0, self.num_colors, self.empty, self.capacity, self.units_per_color)
+        ids: Dict[Hashable, int] = {}
+        self.colors = [None]
+        self.tubes = []
+        for tube in layout:
+            if len(tube) > self.capacity:
+                raise ValueError(f"試験管の容量（{self.capacity}）を超えています: {len(tube)}")
+            row = []
+            for color in tube:
+                cid = ids.get(color)
+                if cid is None:
+                    cid = ids[color] = len(self.colors)
+                    self.colors.append(color)
+                row.append(cid)
+            self.tubes.append(row)
+        self.moves = []
+        self.completed = sum(self.is_complete(i) for i in range(len(self.tubes)))
+        self.settled = sum(self.is_settled(i) for i in range(len(self.tubes)))
+        return self.tubes
+
+    @property
+    def done(self) -> bool:
+        return self.settled == len(self.tubes)
+
+    def is_complete(self, idx: int) -> bool:
+        """units_per_color 個の同じ色がそろっているか"""
+        tube = self.tubes[idx]
+        return len(tube) == self.units_per_color and tube.count(tube[0]) == len(tube)
+
+    def is_settled(self, idx: int) -> bool:
+        """完成しているか空か"""
+        return not self.tubes[idx] or self.is_complete(idx)
+
+    def can_move(self, from_idx: int, to_idx: int) -> bool:
+        if from_idx == to_idx:
+            return False
+        source = self.tubes[from_idx]
+        target = self.tubes[to_idx]
+        if not source or len(target) >= self.capacity:
+            return False
+        return not self.match_color or not target or target[-1] == source[-1]
+
+    def legal_moves(self) -> List[Tuple[int, int]]:
+        num_tubes = len(self.tubes)
+        return [(a, b) for a in range(num_tubes) for b in range(num_tubes) if self.can_move(a, b)]
+
+    def _transfer(self, from_idx: int, to_idx: int) -> int:
+        """1個移して、完成した試験管の数の増減を返す（完成の数は動かした2本だけ数え直す）"""
+        before_complete = self.is_complete(from_idx) + self.is_complete(to_idx)
+        before_settled = self.is_settled(from_idx) + self.is_settled(to_idx)
+        self.tubes[to_idx].append(self.tubes[from_idx].pop())
+        delta = self.is_complete(from_idx) + self.is_complete(to_idx) - before_complete
+        self.completed += delta
+        self.settled += self.is_settled(from_idx) + self.is_settled(to_idx) - before_settled
+        return delta
+
+    def step(self, from_idx: int, to_idx: int) -> StepResult:
+        """1個移す。移せなければ盤面を変えずに moved=False を返す"""
+        if not self.can_move(from_idx, to_idx):
+            return StepResult(0, self.done, False)
+        reward = self._transfer(from_idx, to_idx)
+        self.moves.append((from_idx, to_idx))
+        return StepResult(reward, self.done, True)
+
+    def undo(self) -> Optional[Tuple[int, int]]:
+        """最後の移動を戻して、その移動を返す（記録がなければ None）"""
+        if not self.moves:
+            return None
+        from_idx, to_idx = self.moves.pop()
+        self._transfer(to_idx, from_idx)
+        return from_idx, to_idx
+
+
+class VectorGameEnv:
+    """N 個のゲームを配列で持ち、1回の step で全てを1手ずつ進める
+
+    盤面は (N, 試験管, 容量) の uint8 配列 slots（色ID、0 は空き、下から上）と
+    (N, 試験管) の高さ heights で持つ。全てのゲームで試験管の本数をそろえること
+    （少ない盤面は空の試験管で埋める）。色は全てのゲームで共通の表に登録する（255色まで）。
+    done になったゲームは reset するまで動かない。
+
+    Args:
+        num_envs: ゲームの数
+        その他は GameEnv と同じ
+    """
+
+    def __init__(self, num_envs: int, capacity: int = DEFAULT_CAPACITY, units_per_color: Optional[int] = None,
+                 match_color: bool = True, num_colors: int = DEFAULT_COLORS, empty: int = DEFAULT_EMPTY):
+        self.num_envs = num_envs
+        self.capacity = capacity
+        self.units_per_color = units_per_color or capacity
+        self.match_color = match_color
+        self.num_colors = num_colors
+        self.empty = empty
+        self.colors: List[Optional[Hashable]] = [None]
+        self.slots = np.zeros((num_envs, 0, capacity), np.uint8)
+        self.heights = np.zeros((num_envs, 0), np.int16)
+        self.complete = np.zeros((num_envs, 0), bool)
+        self.completed = np.zeros(num_envs, np.int32)
+        self.settled = np.zeros(num_envs, np.int32)
+        self.history: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []  # (移動元, 移動先, 動いたか)
+        self._envs = np.arange(num_envs)
+
+    def reset(self, layouts: Optional[Sequence[Layout]] = None, seeds: Optional[Iterable[int]] = None) -> np.ndarray:
+        """全てのゲームを layouts か、seeds から作った盤面にして slots を返す"""
+        if layouts is None:
+            seeds = list(seeds) if seeds is not None else list(range(self.num_envs))
+            layouts = [_generate(seed, self.num_colors, self.empty, self.capacity, self.units_per_color)
+                       for seed in seeds]
+        if len(layouts) != self.num_envs:
+            raise ValueError(f"盤面の数が {self.num_envs} ではありません: {len(layouts)}")
+        num_tubes = max(len(layout) for layout in layouts)
+        ids: Dict[Hashable, int] = {}
+        self.colors = [None]
+        slots = np.zeros((self.num_envs, num_tubes, self.capacity), np.uint8)
+        heights = np.zeros((self.num_envs, num_tubes), np.int16)
+        for e, layout in enumerate(layouts):
+            for t, tube in enumerate(layout):
+                if len(tube) > self.capacity:
+                    raise ValueError(f"試験管の容量（{self.capacity}）を超えています: {len(tube)}")
+                for k, color in enumerate(tube):
+                    cid = ids.get(color)
+                    if cid is None:
+                        if len(self.colors) > 255:
+                            raise ValueError("色が255種類を超えています")
+                        cid = ids[color] = len(self.colors)
+                        self.colors.append(color)
+                    slots[e, t, k] = cid
+                heights[e, t] = len(tube)
+        self.slots = slots
+        self.heights = heights
+        self.complete = self._complete_all()
+        self.completed = self.complete.sum(axis=1, dtype=np.int32)
+        self.settled = (self.complete | (heights == 0)).sum(axis=1, dtype=np.int32)
+        self.history = []
+        return self.slots
+
+    @property
+    def done(self) -> np.ndarray:
+        return self.settled == self.slots.shape[1]
+
+    def _complete_all(self) -> np.ndarray:
+        units = self.units_per_color
+        same = (self.slots[:, :, :units] == self.slots[:, :, :1]).all(axis=2)
+        return (self.heights == units) & same
+
+    def _complete_at(self, envs: np.ndarray, tubes: np.ndarray) -> np.ndarray:
+        """指定したゲームの指定した試験管が完成しているか"""
+        units = self.units_per_color
+        rows = self.slots[envs, tubes, :units]
+        return (self.heights[envs, tubes] == units) & (rows == rows[:, :1]).all(axis=1)
+
+    def legal_mask(self) -> np.ndarray:
+        """(N, 移動元, 移動先) の移せるかどうか"""
+        heights = self.heights
+        num_tubes = heights.shape[1]
+        tops = np.take_along_axis(self.slots, np.maximum(heights - 1, 0)[:, :, None], axis=2)[:, :, 0]
+        mask = (heights > 0)[:, :, None] & (heights < self.capacity)[:, None, :]
+        if self.match_color:
+            mask &= (heights == 0)[:, None, :] | (tops[:, :, None] == tops[:, None, :])
+        mask &= ~np.eye(num_tubes, dtype=bool)[None]
+        mask &= ~self.done[:, None, None]
+        return mask
+
+    def _transfer(self, envs: np.ndarray, from_tubes: np.ndarray, to_tubes: np.ndarray) -> np.ndarray:
+        """envs の各ゲームで1個移し、完成した試験管の数の増減を返す"""
+        heights = self.heights
+        source_height = heights[envs, from_tubes] - 1
+        target_height = heights[envs, to_tubes]
+        before_complete = self.complete[envs, from_tubes].astype(np.int32) + self.complete[envs, to_tubes]
+        # 動かす前の移動元は空ではなく、移動先は空なら完成していない
+        before_settled = before_complete + (target_height == 0)
+        self.slots[envs, to_tubes, target_height] = self.slots[envs, from_tubes, source_height]
+        self.slots[envs, from_tubes, source_height] = 0
+        heights[envs, from_tubes] = source_height
+        heights[envs, to_tubes] = target_height + 1
+        from_complete = self._complete_at(envs, from_tubes)
+        to_complete = self._complete_at(envs, to_tubes)
+        self.complete[envs, from_tubes] = from_complete
+        self.complete[envs, to_tubes] = to_complete
+        after_complete = from_complete.astype(np.int32) + to_complete
+        after_settled = after_complete + (source_height == 0)
+        delta = after_complete - before_complete
+        self.completed[envs] += delta
+        self.settled[envs] += after_settled - before_settled
+        return delta
+
+    def step(self, from_tubes: Sequence[int], to_tubes: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """各ゲームで1個移し、(報酬, done, 移動できたか) の配列を返す
+
+        移せない移動（done のゲームを含む）はそのゲームだけ盤面を変えない。
+        """
+        from_tubes = np.asarray(from_tubes, np.intp)
+        to_tubes = np.asarray(to_tubes, np.intp)
+        envs = self._envs
+        source_height = self.heights[envs, from_tubes]
+        target_height = self.heights[envs, to_tubes]
+        moved = (from_tubes != to_tubes) & (source_height > 0) & (target_height < self.capacity) & ~self.done
+        if self.match_color:
+            top = self.slots[envs, from_tubes, np.maximum(source_height - 1, 0)]
+            target_top = self.slots[envs, to_tubes, np.maximum(target_height - 1, 0)]
+            moved &= (target_height == 0) | (top == target_top)
+        rewards = np.zeros(self.num_envs, np.int32)
+        active = envs[moved]
+        if len(active):
+            rewards[active] = self._transfer(active, from_tubes[active], to_tubes[active])
+        self.history.append((from_tubes, to_tubes, moved))
+        return rewards, self.done, moved
+
+    def undo(self) -> Optional[np.ndarray]:
+        """最後の step を戻して、そのとき動いたゲームのマスクを返す（記録がなければ None）"""
+        if not self.history:
+            return None
+        from_tubes, to_tubes, moved = self.history.pop()
+        active = self._envs[moved]
+        if len(active):
+            self._transfer(active, to_tubes[active], from_tubes[active])
+        return moved
@@ -1,8 +1,14 @@
+from typing import Optional
 import pygame
 import sys
 from .game import TestTubeGame
+from .hints import HintService, position
+from .renderer import TubeLook, TubeRenderer
 from .tube import Shape
 
+# 自動で解くときの1手の間隔（ミリ秒）
+AUTO_SOLVE_INTERVAL = 400
+
 class TestTubeGameGUI:
     def __init__(self, width: int = 800, height: int = 600):
         pygame.init()
@@ -20,22 +26,70 @@ class TestTubeGameGUI:
         self.bg_color = (20, 20, 50)
         self.tube_color = (200, 200, 200, 128)
         
-    def draw_tube(self, x: int, y: int, tube_index: int):
-        # 試験管の描画
-        tube_rect = pygame.Rect(x, y, self.tube_width, self.tube_height)
-        pygame.draw.rect(self.screen, self.tube_color, tube_rect, 2)
+        # ヒント（H キー）と自動で解くモード（A キー）。探索は HintService の子プロセスで行う
+        self.hints = HintService()
+        self.show_hint = False
+        self.auto_solve = False
+        self.last_auto_move = 0
+        self.blinking = False  # ヒントの手が見つかっていて点滅させているか
+        self.hint_from_color = (0, 255, 255)
+        self.hint_to_color = (0, 255, 0)
         
-        # 試験管の内容物を描画（下から上に）
-        shapes = self.game.tubes[tube_index].shapes
-        for i, shape in enumerate(reversed(shapes)):
-            shape_y = y + self.tube_height - (i + 1) * self.shape_height
-            shape_rect = pygame.Rect(x, shape_y, self.tube_width, self.shape_height)
-            pygame.draw.rect(self.screen, shape.color, shape_rect)
-            
-        # 選択された試験管をハイライト
-        if self.game.selected_tube == tube_index:
-            pygame.draw.rect(self.screen, (255, 255, 0), tube_rect, 3)
+        # 変わった試験管だけを描き直す描画。マウスの移動では描き直すものがないので起こさない
+        self.renderer = TubeRenderer(self.screen, self.tube_width, self.tube_height, self.game.tube_capacity,
+                                     self.bg_color, self.tube_color)
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+        
+    def tube_positions(self) -> list[tuple[int, int]]:
+        # 試験管の配置（左上の座標）
+        tube_spacing = self.width // (self.game.num_tubes + 1)
+        y = self.height // 2 - self.tube_height
+        return [((i + 1) * tube_spacing - self.tube_width // 2, y) for i in range(self.game.num_tubes)]
+        
+    def tube_looks(self, hint: Optional[tuple[int, int]]) -> list[TubeLook]:
+        # 各試験管の見た目（内容物の色・選択中か・ヒントの枠の色）
+        hint_colors = dict(zip(hint, (self.hint_from_color, self.hint_to_color))) if hint else {}
+        return [(tuple(shape.color for shape in tube.shapes), self.game.selected_tube == i, hint_colors.get(i))
+                for i, tube in enumerate(self.game.tubes)]
+        
+    def reset_hint(self):
+        # 盤面が変わったら探索中のヒントを取り消す
+        self.hints.cancel()
+        self.show_hint = False
+        self.auto_solve = False
+        
+    def update_hint(self) -> tuple[Optional[tuple[int, int]], Optional[str]]:
+        # 探索が終わっていれば（点滅中のヒントの手, 状態の表示）を返し、自動で解くモードなら1手進める
+        self.blinking = False
+        if not (self.show_hint or self.auto_solve):
+            return None, None
+        result = self.hints.poll(self.game)
+        if result is None:
+            self.hints.request(self.game)
+            return None, "..."
+        if not result.moves:
+            self.auto_solve = False
+            if self.game.is_game_complete():
+                return None, None
+            return None, "ヒントなし" if result.error is None else f"ヒントなし（{result.error}）"
+        if self.auto_solve:
+            now = pygame.time.get_ticks()
+            if now - self.last_auto_move >= AUTO_SOLVE_INTERVAL:
+                self.last_auto_move = now
+                self.game.selected_tube = None
+                self.game.move_shape(*result.moves[0])
+                return None, None
+        # ヒントの移動元と移動先の試験管を点滅させる
+        self.blinking = True
+        if pygame.time.get_ticks() // 300 % 2:
+            return None, None
+        return result.moves[0], None
             
+    @property
+    def animating(self) -> bool:
+        # ヒントの探索中・点滅中と自動で解くモードの間は一定の間隔で描き直す
+        return self.auto_solve or self.hints.searching or self.blinking
+        
     def get_tube_index(self, pos: tuple[int, int]) -> int:
         x, y = pos
         tube_spacing = self.width // (self.game.num_tubes + 1)
@@ -50,39 +104,48 @@ class TestTubeGameGUI:
         clock = pygame.time.Clock()
         
         while True:
-            for event in pygame.event.get():
+            # 動きのないときはイベントが来るまで眠る
+            events = pygame.event.get() if self.animating else [pygame.event.wait()] + pygame.event.get()
+            for event in events:
                 if event.type == pygame.QUIT:
+                    self.hints.cancel()
                     pygame.quit()
                     sys.exit()
                     
+                if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    self.renderer.invalidate()
+                    
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     tube_index = self.get_tube_index(event.pos)
                     if tube_index != -1:
+                        before = position(self.game)
                         self.game.select_tube(tube_index)
+                        if position(self.game) != before:
+                            self.reset_hint()
                         
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_r:
+                        self.reset_hint()
                         self.game = TestTubeGame()
+                    elif event.key == pygame.K_h:
+                        self.show_hint = not self.show_hint
+                    elif event.key == pygame.K_a:
+                        self.auto_solve = not self.auto_solve
                         
-            # 画面の描画
-            self.screen.fill(self.bg_color)
+            # ヒントの表示と自動で解く1手
+            hint, status = self.update_hint()
             
-            # 試験管の配置
-            tube_spacing = self.width // (self.game.num_tubes + 1)
-            for i in range(self.game.num_tubes):
-                x = (i + 1) * tube_spacing - self.tube_width // 2
-                y = self.height // 2 - self.tube_height
-                self.draw_tube(x, y, i)
-                
-            # ゲームクリア判定
-            if self.game.is_game_complete():
-                font = pygame.font.Font(None, 74)
-                text = font.render("クリア!", True, (255, 255, 0))
-                text_rect = text.get_rect(center=(self.width // 2, 100))
-                self.screen.blit(text, text_rect)
-                
-            pygame.display.flip()
-            clock.tick(60)
+            # 変わった試験管とテキストだけを描き直す
+            texts = {
+                "status": (status, 36, (255, 255, 255), (self.width // 2, self.height - 40)) if status else None,
+                # ゲームクリア判定
+                "clear": ("クリア!", 74, (255, 255, 0), (self.width // 2, 100))
+                         if self.game.is_game_complete() else None,
+            }
+            self.renderer.render(self.tube_positions(), self.tube_looks(hint), texts)
+            
+            if self.animating:
+                clock.tick(60)
 
 def main():
     game = TestTubeGameGUI()
@@ -0,0 +1,179 @@
+"""GUI のヒントと自動で解くための、ソルバーを別プロセスで動かすサービス
+
+    hints = HintService(time_limit=3.0)
+    hints.request(game)          # 探索を始める（記録済みの盤面なら探索しない）
+    result = hints.poll(game)    # 毎フレーム呼ぶ。探し終えていれば HintResult、まだなら None
+    hints.cancel()               # プレイヤーが動かしたら探索中のプロセスを止める
+
+探索は1回ごとに子プロセスで行う。Python のソルバーは GIL を手放さないので、
+スレッドで動かすと描画のループが止まる。取り消しは子プロセスを terminate する。
+見つけた手順は、途中の各盤面からの残りの手順も含めて盤面ごとに覚えておくので、
+ヒントどおりに進めている間は次のヒントを探索せずに返せる。
+
+黒い図形（game.py の EMPTY、shapes.py の '?'）は未知の色として扱い、未知の色を
+含む盤面は solver.belief.BeliefSolver で解く（返るのは色が現れるまでの手順）。
+黒い図形の数が足りない色の数と合わない盤面（BeliefSolver.world_layout が ValueError）
+では、黒を普通の色として TubeSolver で解く。それでも完成できない個数の色があれば
+探索せず、理由を HintResult.error に入れて返す（GUI は「ヒントなし」と理由を表示する）。
+"""
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+from collections import Counter
+import multiprocessing
+from .game import TestTubeGame
+from .solver.packed import UNKNOWN_COLOR
+
+if TYPE_CHECKING:
+    from .solver.state import TubeState
+
+Move = Tuple[int, int]
+Position = Tuple[Tuple[Tuple[int, int, int], ...], ...]
+
+# 未知の色として扱う図形の色（game.py の EMPTY）
+HIDDEN_SHAPE_COLOR = (0, 0, 0)
+# 盤面ごとに覚えておく手順の数の上限（超えたら全て捨てる）
+MAX_CACHED_POSITIONS = 1 << 12
+
+
+class HintResult(NamedTuple):
+    moves: List[Move]  # 盤面から指す手順（見つからなければ空）
+    solved: bool       # 手順の最後で解けるか（未知の色があるときは色が現れるまでの手順なので False）
+    error: Optional[str] = None  # 探索できなかった理由
+
+
+def position(game: TestTubeGame) -> Position:
+    """ゲームの盤面を、各試験管の色（下から上）のタプルにする（未知の色はグレー）"""
+    return tuple(tuple(UNKNOWN_COLOR if shape.color == HIDDEN_SHAPE_COLOR else shape.color
+                       for shape in tube.shapes)
+                 for tube in game.tubes)
+
+
+def _prepare(tubes: Position, capacity: int) -> Tuple[Optional['TubeState'], Optional[str]]:
+    """探索する盤面と、探索できないときの理由
+
+    未知の色の数が足りない色の数と合わなければ、黒を普通の色とした盤面にする。
+    それでも各色の個数が units_per_color の倍数でなければ（完成できないので）理由を返す。
+    """
+    from .solver.belief import BeliefSolver
+    from .solver.state import TubeState
+    state = TubeState([list(tube) for tube in tubes], capacity=capacity)
+    if not state.layout.colors.unknown_id:
+        return state, None
+    try:
+        BeliefSolver.world_layout(state.packed)
+        return state, None
+    except ValueError as e:
+        reason = str(e)
+    state = TubeState([[HIDDEN_SHAPE_COLOR if color == UNKNOWN_COLOR else color for color in tube]
+                       for tube in tubes], capacity=capacity)
+    units = state.layout.units_per_color
+    if all(n % units == 0 for n in Counter(cid for tube in state.packed.tube_ids() for cid in tube).values()):
+        return state, None
+    return None, reason
+
+
+def _search(conn, tubes: Position, capacity: int, strategy: str, max_iterations: int,
+            time_limit: float) -> None:
+    """子プロセスで盤面を解き、HintResult を conn へ送る"""
+    # ソルバーは探索する子プロセスでだけ読み込む（GUI の起動を遅くしない）
+    from .solver.belief import BeliefSolver
+    from .solver.solver import TubeSolver
+    try:
+        state, reason = _prepare(tubes, capacity)
+        if state is None:
+            result = HintResult([], False, reason)
+        elif state.layout.colors.unknown_id:
+            plan = BeliefSolver(max_iterations=max_iterations).plan(state)
+            result = HintResult(plan.moves, False)
+        else:
+            solved, moves, _, _ = TubeSolver().solve(state, max_iterations, strategy, time_limit)
+            result = HintResult(moves if solved else [], solved)
+    except Exception as e:  # 探索の失敗でゲームを止めない
+        result = HintResult([], False, f"{type(e).__name__}: {e}")
+    conn.send(result)
+    conn.close()
+
+
+class HintService:
+    """盤面ごとのヒントを子プロセスで探索し、結果を覚えておく
+
+    Args:
+        strategy: TubeSolver の探索方法
+        max_iterations: 展開する状態数の上限
+        time_limit: 1回の探索時間の上限（秒）
+    """
+
+    def __init__(self, strategy: str = "best_first", max_iterations: int = 200000, time_limit: float = 3.0):
+        self.strategy = strategy
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.cache: Dict[Position, HintResult] = {}
+        self._process: Optional[multiprocessing.Process] = None
+        self._conn = None
+        self._pending: Optional[Position] = None  # 探索中の盤面
+
+    @property
+    def searching(self) -> bool:
+        """探索中か"""
+        return self._pending is not None
+
+    def request(self, game: TestTubeGame) -> None:
+        """盤面のヒントの探索を始める（記録済みか、同じ盤面を探索中なら何もしない）"""
+        key = position(game)
+        if key in self.cache or key == self._pending:
+            return
+        self.cancel()
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(
+            target=_search, args=(sender, key, game.tube_capacity, self.strategy, self.max_iterations,
+                                  self.time_limit),
+            daemon=True)
+        self._process.start()
+        sender.close()
+        self._conn = receiver
+        self._pending = key
+
+    def poll(self, game: TestTubeGame) -> Optional[HintResult]:
+        """盤面のヒントを返す（探索が終わっていなければ None。待たない）"""
+        if self._pending is not None:
+            result = None
+            if self._conn.poll():
+                try:
+                    result = self._conn.recv()
+                except EOFError:  # 結果を送らずに終わった
+                    result = HintResult([], False, "探索プロセスが異常終了しました")
+            elif not self._process.is_alive() and not self._conn.poll():
+                result = HintResult([], False, "探索プロセスが異常終了しました")
+            if result is not None:
+                self._remember(self._pending, result)
+                self._close()
+        return self.cache.get(position(game))
+
+    def cancel(self) -> None:
+        """探索中なら子プロセスを止めて結果を捨てる"""
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+        self._close()
+
+    def _close(self) -> None:
+        if self._process is not None:
+            self._process.join()
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+        self._pending = None
+
+    def _remember(self, key: Position, result: HintResult) -> None:
+        """結果を覚える。手順の途中の各盤面にも残りの手順を記録する"""
+        if len(self.cache) >= MAX_CACHED_POSITIONS:
+            self.cache.clear()
+        self.cache[key] = result
+        if result.error is not None:
+            return
+        # 解けない手順の最後の盤面（未知の色が現れたところ）は改めて探索させる
+        last = len(result.moves) if result.solved else len(result.moves) - 1
+        tubes = [list(tube) for tube in key]
+        for i, (from_tube, to_tube) in enumerate(result.moves[:last]):
+            tubes[to_tube].append(tubes[from_tube].pop())
+            self.cache.setdefault(tuple(tuple(tube) for tube in tubes), HintResult(result.moves[i + 1:],
+                                                                                    result.solved))
@@ -0,0 +1,163 @@
+"""試験管の盤面を、前のフレームから変わったところだけ描き直す保持型の描画
+
+図形と空の試験管の画像は一度だけ作ってキャッシュし、試験管ごとの見た目
+（色の並び・選択中か・ヒントの枠の色）から組み立てた画像もキャッシュする。
+render は前のフレームで描いた見た目を覚えておき、変わった試験管とテキストだけを
+blit して、その矩形だけを pygame.display.update に渡す。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import pygame
+
+Color = Tuple[int, int, int]
+# 試験管の見た目: (図形の色の並び, 選択中か, ヒントの枠の色（なければ None）)
+TubeLook = Tuple[Tuple[Color, ...], bool, Optional[Color]]
+# テキスト: (文字列, フォントの大きさ, 色, 中心の座標)
+TextSpec = Tuple[str, int, Color, Tuple[int, int]]
+
+# ヒントの枠を描くための試験管の周りの余白
+HINT_MARGIN = 4
+# 見た目ごとに覚えておく試験管の画像の数の上限（超えたら全て捨てる）
+MAX_TUBE_SURFACES = 1 << 10
+
+
+class TubeRenderer:
+    """試験管とテキストを、変わったものだけ画面に描く
+
+    Args:
+        screen: 描画先（pygame.display.set_mode の戻り値）
+        tube_width, tube_height: 試験管の大きさ
+        capacity: 試験管の容量（図形1個の高さは tube_height // capacity）
+        bg_color, tube_color, select_color: 背景・試験管の枠・選択中の枠の色
+    """
+
+    def __init__(self, screen: pygame.Surface, tube_width: int, tube_height: int, capacity: int,
+                 bg_color: Color, tube_color: Tuple[int, ...], select_color: Color = (255, 255, 0)):
+        self.screen = screen
+        self.tube_width = tube_width
+        self.tube_height = tube_height
+        self.shape_height = tube_height // capacity
+        self.bg_color = bg_color
+        self.tube_color = tube_color
+        self.select_color = select_color
+        self._empty_tube = self._make_empty_tube()
+        self._shapes: Dict[Color, pygame.Surface] = {}
+        self._tubes: Dict[TubeLook, pygame.Surface] = {}
+        self._fonts: Dict[int, pygame.font.Font] = {}
+        self._labels: Dict[Tuple[str, int, Color], pygame.Surface] = {}
+        # 前のフレームで描いたもの
+        self._positions: List[Tuple[int, int]] = []
+        self._drawn: List[Optional[TubeLook]] = []
+        self._texts: Dict[str, Tuple[TextSpec, pygame.Rect]] = {}
+        self._full = True
+
+    def invalidate(self) -> None:
+        """次の render で画面全体を描き直す（ウィンドウが隠れて戻ったときなど）"""
+        self._full = True
+
+    def slot_rect(self, position: Tuple[int, int]) -> pygame.Rect:
+        """試験管の左上の座標から、ヒントの枠まで含めた描画範囲を求める"""
+        x, y = position
+        return pygame.Rect(x - HINT_MARGIN, y - HINT_MARGIN, self.tube_width + 2 * HINT_MARGIN,
+                           self.tube_height + 2 * HINT_MARGIN)
+
+    def _make_empty_tube(self) -> pygame.Surface:
+        surface = pygame.Surface((self.tube_width + 2 * HINT_MARGIN, self.tube_height + 2 * HINT_MARGIN))
+        surface.fill(self.bg_color)
+        pygame.draw.rect(surface, self.tube_color,
+                         pygame.Rect(HINT_MARGIN, HINT_MARGIN, self.tube_width, self.tube_height), 2)
+        return surface
+
+    def _shape(self, color: Color) -> pygame.Surface:
+        surface = self._shapes.get(color)
+        if surface is None:
+            surface = self._shapes[color] = pygame.Surface((self.tube_width, self.shape_height))
+            surface.fill(color)
+        return surface
+
+    def _tube(self, look: TubeLook) -> pygame.Surface:
+        """見た目から試験管の画像を組み立てる（同じ見た目は使い回す）"""
+        surface = self._tubes.get(look)
+        if surface is not None:
+            return surface
+        colors, selected, hint = look
+        surface = self._empty_tube.copy()
+        # 内容物を下から上に並べる（GUI の従来の描き方と同じく、リストの末尾を一番下に描く）
+        for i, color in enumerate(reversed(colors)):
+            surface.blit(self._shape(color), (HINT_MARGIN, HINT_MARGIN + self.tube_height - (i + 1) * self.shape_height))
+        tube_rect = pygame.Rect(HINT_MARGIN, HINT_MARGIN, self.tube_width, self.tube_height)
+        if selected:
+            pygame.draw.rect(surface, self.select_color, tube_rect, 3)
+        if hint is not None:
+            pygame.draw.rect(surface, hint, surface.get_rect(), 3)
+        if len(self._tubes) >= MAX_TUBE_SURFACES:
+            self._tubes.clear()
+        self._tubes[look] = surface
+        return surface
+
+    def _label(self, text: str, size: int, color: Color) -> pygame.Surface:
+        key = (text, size, color)
+        surface = self._labels.get(key)
+        if surface is None:
+            font = self._fonts.get(size)
+            if font is None:
+                font = self._fonts[size] = pygame.font.Font(None, size)
+            surface = self._labels[key] = font.render(text, True, color)
+        return surface
+
+    def render(self, positions: Sequence[Tuple[int, int]], looks: Sequence[TubeLook],
+               texts: Dict[str, Optional[TextSpec]]) -> List[pygame.Rect]:
+        """変わった試験管とテキストを描き、画面に反映した矩形を返す
+
+        Args:
+            positions: 各試験管の左上の座標
+            looks: 各試験管の見た目
+            texts: 表示する場所の名前 → テキスト（None なら消す）
+        """
+        screen = self.screen
+        full = self._full or list(positions) != self._positions
+        if full:
+            screen.fill(self.bg_color)
+            self._positions = list(positions)
+            self._drawn = [None] * len(positions)
+            self._texts = {}
+            self._full = False
+        slots = [self.slot_rect(position) for position in positions]
+        redraw = {i for i, look in enumerate(looks) if look != self._drawn[i]}
+        dirty: List[pygame.Rect] = []
+
+        # 変わったテキストを消す。重なっていた試験管は描き直す
+        texts_to_draw = set()
+        for name in set(self._texts) | set(texts):
+            old = self._texts.get(name)
+            spec = texts.get(name)
+            if old is not None and old[0] == spec:
+                continue
+            if old is not None:
+                screen.fill(self.bg_color, old[1])
+                dirty.append(old[1])
+                redraw.update(i for i, slot in enumerate(slots) if slot.colliderect(old[1]))
+                del self._texts[name]
+            if spec is not None:
+                texts_to_draw.add(name)
+
+        for i in sorted(redraw):
+            screen.blit(self._tube(looks[i]), slots[i])
+            self._drawn[i] = looks[i]
+            dirty.append(slots[i])
+            # 描き直した試験管に重なっていたテキストも描き直す
+            texts_to_draw.update(name for name, (_, rect) in self._texts.items() if rect.colliderect(slots[i]))
+
+        for name in texts_to_draw:
+            text, size, color, center = spec = texts[name]
+            label = self._label(text, size, color)
+            rect = label.get_rect(center=center)
+            screen.blit(label, rect)
+            self._texts[name] = (spec, rect)
+            dirty.append(rect)
+
+        if full:
+            pygame.display.flip()
+            return [screen.get_rect()]
+        if dirty:
+            pygame.display.update(dirty)
+        return dirty
@@ -1,17 +1,53 @@
-from .state import TubeState
-from .solver import TubeSolver
+from typing import Optional
 
-def solve_puzzle(tubes) -> list:
+# TubeState・TubeSolver・STRATEGIES は最初に使うときに読み込む
+# （src.solver.packed などの軽いモジュールだけを使うときに探索の実装まで読み込まない）
+_LAZY = {"TubeState": ".state", "TubeSolver": ".solver", "STRATEGIES": ".solver"}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def solve_puzzle(tubes, strategy: str = "dfs", max_iterations: int = 100000, progress=None,
+                 capacity: int = 4, units_per_color=None, store=None, belief: Optional[bool] = None) -> tuple:
     """パズルを解く
     
     Args:
         tubes: 試験管の初期状態のリスト。各試験管は色のRGBタプルのリスト。
+        strategy: 探索方法（"dfs", "best_first", "astar", "ida_star", "beam", "hda_star",
+            "bidirectional", "anytime"。TubeSolver.solve を参照）
+        max_iterations: 展開する状態数の上限
+        progress: 進捗イベント（ProgressEvent）を受け取るコールバック。省略時は何も出力しない。
+        capacity: 試験管の容量
+        units_per_color: 1色あたりの個数（省略時は capacity と同じ）
+        store: 解いた結果を記録するディスク上の置換表（SolutionStore かファイルのパス）。
+            記録済みのパズルは探索せずにすぐ返る。
+        belief: True なら belief.BeliefSolver で解く（未知の色が現れるまでの手順を返す）。
+            None なら未知の色（グレー）を含む盤面のときだけ。False ならグレーも普通の色として解く。
         
     Returns:
-        移動手順のリスト。各要素は (from_idx, to_idx) のタプル。
-        解けない場合は空のリスト。
+        (解けたか, 移動手順, スコア, 色付きの移動手順) のタプル（TubeSolver.solve と同じ）。
+        移動手順の各要素は (from_idx, to_idx) のタプル。
+        解けなかった場合は最も良かった途中までの手順を返す。
+        BeliefSolver で解いたときは未知の色が現れるまでの手順で、その最後で完成するときだけ解けたとする。
     """
-    initial_state = TubeState(tubes)
-    solver = TubeSolver()
-    solution = solver.solve(initial_state)
-    return solution if solution else [] 
\ No newline at end of file
+    from .solver import TubeSolver
+    from .state import TubeState
+    initial_state = TubeState(tubes, capacity=capacity, units_per_color=units_per_color)
+    if isinstance(store, str):
+        from .store import SolutionStore
+        store = SolutionStore(store)
+    if belief is None:
+        belief = bool(initial_state.layout.colors.unknown_id)
+    if belief:
+        from .belief import BeliefSolver
+        return BeliefSolver(strategy=strategy, max_iterations=max_iterations, store=store).solve(initial_state)
+    solver = TubeSolver(progress=progress, store=store)
+    return solver.solve(initial_state, max_iterations, strategy) 
\ No newline at end of file
@@ -0,0 +1,49 @@
+from typing import List, Tuple
+from array import array
+
+# 根ノードの親
+ROOT = -1
+
+
+class NodeArena:
+    """展開したノードの親と直前の移動を列ごとの配列で持つ
+
+    ノードは追加順の番号で参照し、各列には
+      parent: 親ノードの番号（根は ROOT）
+      move_from / move_to: 親からの移動
+      depth:  根からの手数
+    を持つ（1ノードあたり10バイト）。探索の先端（未展開の状態）は
+    （盤面, 親ノードの番号, 直前の移動）だけを持ち、取り出して展開するときに
+    ここへ追加する。手順は最後に親をたどって1回だけ組み立てる。
+    """
+    __slots__ = ('parent', 'move_from', 'move_to', 'depth')
+
+    def __init__(self):
+        self.parent = array('i')
+        self.move_from = array('H')
+        self.move_to = array('H')
+        self.depth = array('H')
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def add(self, parent: int = ROOT, move: Tuple[int, int] = (0, 0)) -> int:
+        """ノードを追加して番号を返す"""
+        self.parent.append(parent)
+        self.move_from.append(move[0])
+        self.move_to.append(move[1])
+        self.depth.append(self.depth[parent] + 1 if parent != ROOT else 0)
+        return len(self.parent) - 1
+
+    def path(self, node: int) -> List[Tuple[int, int]]:
+        """根からノードまでの移動手順"""
+        moves = []
+        while self.parent[node] != ROOT:
+            moves.append((self.move_from[node], self.move_to[node]))
+            node = self.parent[node]
+        moves.reverse()
+        return moves
+
+    def nbytes(self) -> int:
+        """列が使っているバイト数"""
+        return sum(col.itemsize * len(col) for col in (self.parent, self.move_from, self.move_to, self.depth))
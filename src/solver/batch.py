@@ -0,0 +1,202 @@
+"""多数のパズルをプロセスプールで並列に解く
+
+    python -m src.solver.batch puzzles.jsonl [--workers N] [--strategy astar]
+                               [--time-limit 秒] [--max-iterations N] [--capacity N] > results.jsonl
+
+入力は1行に1問の JSONL。各行は試験管のリスト（各試験管は下から順の
+[R, G, B] のリスト）か、{"id": ..., "tubes": [...]} のオブジェクト。
+結果は解き終わった順に1行ずつ JSON で出力する。
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+import argparse
+import json
+import os
+import sys
+import time
+from .packed import Color, ColorTable, Layout, PackedState
+from .solver import STRATEGIES, TubeSolver
+from .state import TubeState
+
+Puzzle = Sequence[Sequence[Color]]
+
+
+@dataclass
+class BatchResult:
+    index: int  # 入力での順番
+    solved: bool
+    moves: List[Tuple[int, int]]
+    score: Optional[int]
+    elapsed: float  # 1問にかかった秒数
+    error: Optional[str] = None
+    stats: Optional[Dict] = None  # 探索の統計（instrument.SolveStats.as_dict()）
+
+
+class _Worker:
+    """ワーカープロセスごとの状態
+
+    色の対応表と Layout（試験管ごとのメモを持つ）をプロセス内で使い回すので、
+    同じ色・同じ形のパズルが続くと正規化キーや評価値のメモが温まったままになる。
+    """
+
+    def __init__(self, palette: Sequence[Color], capacity: int, units_per_color: Optional[int], strategy: str,
+                 max_iterations: int, time_limit: Optional[float], solver_options: Dict):
+        self.colors = ColorTable(palette)
+        self.capacity = capacity
+        self.units_per_color = units_per_color
+        self.layouts: Dict[Tuple[int, int], Layout] = {}
+        self.strategy = strategy
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.solver = TubeSolver(**solver_options)
+
+    def layout(self, num_tubes: int) -> Layout:
+        # 色が増えて詰め方のビット幅が変わったら作り直す
+        key = (num_tubes, len(self.colors))
+        layout = self.layouts.get(key)
+        if layout is None:
+            layout = self.layouts[key] = Layout(num_tubes, self.colors, self.capacity,
+                                                units_per_color=self.units_per_color)
+        return layout
+
+    def solve(self, index: int, tubes: Puzzle) -> BatchResult:
+        started = time.perf_counter()
+        try:
+            self.colors.intern_tubes(tubes)
+            state = TubeState.from_packed(PackedState.from_tubes(tubes, self.layout(len(tubes))))
+            solved, moves, score, _ = self.solver.solve(state, self.max_iterations, self.strategy, self.time_limit)
+        except Exception as e:  # 1問の失敗でバッチ全体を止めない
+            return BatchResult(index, False, [], None, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+        return BatchResult(index, solved, moves, score, time.perf_counter() - started,
+                           stats=self.solver.stats.as_dict())
+
+
+_worker: Optional[_Worker] = None
+
+
+def _init_worker(*args) -> None:
+    global _worker
+    _worker = _Worker(*args)
+
+
+def _solve_chunk(chunk: List[Tuple[int, Puzzle]]) -> List[BatchResult]:
+    return [_worker.solve(index, tubes) for index, tubes in chunk]
+
+
+def _chunks(puzzles: Iterable[Puzzle], size: int) -> Iterator[List[Tuple[int, Puzzle]]]:
+    chunk = []
+    for index, tubes in enumerate(puzzles):
+        chunk.append((index, tubes))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def solve_many(puzzles: Iterable[Puzzle], workers: Optional[int] = None, strategy: str = "dfs",
+               max_iterations: int = 100000, time_limit: Optional[float] = None, chunksize: int = 4,
+               palette: Sequence[Color] = (), capacity: int = 4, units_per_color: Optional[int] = None,
+               **solver_options) -> Iterator[BatchResult]:
+    """パズルをまとめて解き、解き終わった順に BatchResult を返す
+
+    Args:
+        puzzles: パズルの並び（イテレータでもよい。必要な分だけ読み進める）
+        workers: ワーカープロセス数（省略時は CPU 数）。1 なら同じプロセスで解く。
+        strategy, max_iterations: TubeSolver.solve に渡す探索方法と1問あたりの展開数の上限
+        time_limit: 1問あたりの探索時間の上限（秒）
+        chunksize: 1回にワーカーへ渡す問題数
+        palette: あらかじめ登録しておく色（ワーカー間で色IDを揃えたいとき）
+        capacity, units_per_color: 全ての問題に共通の試験管の容量と1色あたりの個数
+        solver_options: TubeSolver のコンストラクタに渡す引数
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"未知の探索方法です: {strategy}")
+    workers = workers or os.cpu_count() or 1
+    init_args = (list(palette), capacity, units_per_color, strategy, max_iterations, time_limit, solver_options)
+    chunks = _chunks(puzzles, chunksize)
+
+    if workers == 1:
+        worker = _Worker(*init_args)
+        for chunk in chunks:
+            for index, tubes in chunk:
+                yield worker.solve(index, tubes)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init_args) as executor:
+        # 投入するチャンク数をワーカー数の2倍までに抑え、入力を少しずつ読む
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(_solve_chunk, chunk))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def read_jsonl(path: str) -> Iterator[Tuple[Optional[object], Puzzle]]:
+    """JSONL から（id, 試験管の並び）を読む（"-" なら標準入力）"""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in stream:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict):
+                yield record.get("id"), [[tuple(c) for c in tube] for tube in record["tubes"]]
+            else:
+                yield None, [[tuple(c) for c in tube] for tube in record]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.solver.batch", description="JSONL のパズルをまとめて解く")
+    parser.add_argument("puzzles", help="1行に1問の JSONL ファイル（- で標準入力）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（省略時は CPU 数）")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="dfs", help="探索方法")
+    parser.add_argument("--max-iterations", type=int, default=100000, help="1問あたりの展開数の上限")
+    parser.add_argument("--time-limit", type=float, default=None, help="1問あたりの探索時間の上限（秒）")
+    parser.add_argument("--chunksize", type=int, default=4, help="1回にワーカーへ渡す問題数")
+    parser.add_argument("--capacity", type=int, default=4, help="試験管の容量")
+    parser.add_argument("--units-per-color", type=int, help="1色あたりの個数（省略時は容量と同じ）")
+    parser.add_argument("--store", help="解いた結果を記録・再利用する SQLite ファイル（ワーカー間で共有）")
+    parser.add_argument("--pattern-db", help="最短手順を保証する探索の下界に使うパターンデータベースのファイル")
+    parser.add_argument("--stats", action="store_true", help="処理ごとの回数と時間も数えて stats に出力する")
+    args = parser.parse_args(argv)
+
+    ids = []
+
+    def puzzles():
+        for puzzle_id, tubes in read_jsonl(args.puzzles):
+            ids.append(puzzle_id)
+            yield tubes
+
+    store = None
+    if args.store:  # sqlite3 は --store を指定したときだけ読み込む
+        from .store import SolutionStore
+        store = SolutionStore(args.store)
+    solved = total = 0
+    started = time.perf_counter()
+    for result in solve_many(puzzles(), args.workers, args.strategy, args.max_iterations, args.time_limit,
+                             args.chunksize, capacity=args.capacity, units_per_color=args.units_per_color,
+                             store=store, instrument=args.stats or None,
+                             pattern_db=args.pattern_db):
+        record = asdict(result)
+        record["id"] = ids[result.index]
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+        solved += result.solved
+        total += 1
+    elapsed = time.perf_counter() - started
+    print(f"{solved}/{total} 問を解きました（{elapsed:.1f}秒, {total / max(elapsed, 1e-9):.1f} 問/秒）", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""未知の色（?）を含む盤面を、あり得る色の割り当て（世界）の集合として解く
+
+    from src.solver.belief import BeliefSolver
+
+    plan = BeliefSolver(samples=16).plan(TubeState(tubes))
+    # plan.moves を指して、plan.reveals なら現れた色を盤面に書き込んでからもう一度 plan する
+
+未知のスロットに入り得る色は、各色が units_per_color 個ずつという条件
+（TubeSolver._is_valid_initial_state と同じ）から決まる。見えている個数が
+足りない色の不足分を未知のスロットに並べた割り当てが、盤面と矛盾しない世界になる
+（それでも余る未知のスロットは、全く見えていない色が units_per_color 個ずつあるとみなす）。
+
+plan は世界を samples 個無作為に選び（決定化）、それぞれを通常の TubeSolver で
+解いてから、各世界の手順を共有の木（先頭からの接頭辞）として1手ずつたどる。
+各手では、見えている盤面で指せる（移動元の一番上が見えていて、移動先が空か
+見えている同じ色の）手を、多くの世界の手順が次に選んでいる順に試す。
+その手を選ばなかった世界は、その手を指した後から解き直して、解けるなら手順を
+付け替えて残す（解けなければその世界ではこの手は安全でない）。安全な世界の
+割合が quorum 以上の最初の手を指し、そのような手がなければそこで止める。未知の色が一番上に現れる手（並びごと移す
+規則では、並びの下が未知の色の手も）を指したら、色を見てから計画し直す必要が
+あるのでそこで止める。同じ世界（正規化キーが等しいもの）は1回だけ解く。
+使い回した手順で同じ見えている盤面に戻ることがあるので、一度通った盤面に戻る手は指さない。
+
+全ての色が見えている盤面では、世界は1つで、plan は普通に解いた手順を返す。
+solve は plan の結果を TubeSolver.solve と同じ (解けたか, 移動手順, スコア, 色付きの移動手順)
+の形で返す（solve_puzzle と python -m src.solver は未知の色を含む盤面をこれで解く）。
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import random
+from .canonical import canonicalizer
+from .packed import ColorTable, Layout, PackedState
+from .solver import TubeSolver
+from .state import TubeState
+
+Move = Tuple[int, int]
+
+# 全く見えていない色に使う仮の色（RGB として現れない値。k 色目は青の成分から k を引く）
+HIDDEN_COLOR_BASE = (-1, -1, -1)
+
+
+class BeliefPlan(NamedTuple):
+    moves: List[Move]  # 見えている盤面から指す手順
+    support: float     # 手順を指した後も解ける世界の割合（選んだ世界のうち、最初に解けたものに対して）
+    worlds: int        # 選んだ世界の数（重複を除く前）
+    reveals: bool      # 最後の手で未知の色が一番上に現れる（見てから計画し直す）
+
+
+class BeliefSolver:
+    """未知の色を含む盤面を、無作為に選んだ世界ごとに解いて多数決で手を決める
+
+    Args:
+        samples: 選ぶ世界の数
+        strategy: 各世界を解く探索方法
+        max_iterations: 1つの世界を解くときの展開数の上限
+        quorum: 指す手に必要な、その手の後も解ける世界の割合（最初に解けた世界に対して。1.0 なら全て）
+        seed: 世界を選ぶ乱数の種
+        solver_options: 各世界を解く TubeSolver に渡す引数
+    """
+
+    def __init__(self, samples: int = 16, strategy: str = "dfs", max_iterations: int = 20000,
+                 quorum: float = 1.0, seed: Optional[int] = None, **solver_options):
+        self.samples = samples
+        self.strategy = strategy
+        self.max_iterations = max_iterations
+        self.quorum = quorum
+        self.random = random.Random(seed)
+        self.solver = TubeSolver(**solver_options)
+
+    @staticmethod
+    def world_layout(state: PackedState) -> Tuple[Layout, List[int]]:
+        """世界を表す Layout と、未知のスロットに入る色IDの多重集合（色ごとの不足分）
+
+        不足分の合計が未知のスロットより少ないときは、その差を units_per_color 個ずつの
+        全く見えていない色とみなし、仮の色（HIDDEN_COLOR_BASE から作る）を加えた
+        Layout を作る。見えている色が units_per_color 個を超えているか、差が
+        units_per_color で割り切れない盤面は ValueError。
+        """
+        layout = state.layout
+        unknown = layout.colors.unknown_id
+        counts: Dict[int, int] = {}
+        hidden = 0
+        for tube in state.tube_ids():
+            for cid in tube:
+                if cid == unknown:
+                    hidden += 1
+                else:
+                    counts[cid] = counts.get(cid, 0) + 1
+        missing = []
+        for cid, n in sorted(counts.items()):
+            if n > layout.units_per_color:
+                raise ValueError(f"色 {layout.colors.color(cid)} が {layout.units_per_color} 個より多くあります")
+            missing.extend([cid] * (layout.units_per_color - n))
+        unseen, rest = divmod(hidden - len(missing), layout.units_per_color)
+        if unseen < 0 or rest:
+            raise ValueError(f"未知のスロット {hidden} 個に対して、足りない色が {len(missing)} 個です")
+        if not unseen:
+            return layout, missing
+        colors = ColorTable(layout.colors.colors[1:])
+        for k in range(unseen):
+            missing.extend([colors.intern(HIDDEN_COLOR_BASE[:2] + (HIDDEN_COLOR_BASE[2] - k,))]
+                           * layout.units_per_color)
+        return Layout(layout.num_tubes, colors, layout.capacity, layout.pour_run, layout.units_per_color), missing
+
+    def worlds(self, state: PackedState, count: int) -> List[PackedState]:
+        """盤面と矛盾しない色の割り当てを count 個無作為に選ぶ"""
+        unknown = state.layout.colors.unknown_id
+        layout, missing = self.world_layout(state)
+        if not missing:
+            return [state] * count
+        tubes = state.tube_ids()
+        worlds = []
+        for _ in range(count):
+            fill = iter(self.random.sample(missing, len(missing)))
+            worlds.append(PackedState(layout.pack([[next(fill) if cid == unknown else cid for cid in tube]
+                                                   for tube in tubes]), layout))
+        return worlds
+
+    def _solve(self, world: PackedState, cache: Dict[int, Optional[Tuple[PackedState, List[Move]]]]
+               ) -> Optional[List[Move]]:
+        """世界を解いた手順（解けなければ None）。同じ正規化キーの世界は1回だけ解く"""
+        canonical = canonicalizer(world.layout)
+        key = canonical.key(world.code)
+        if key not in cache:
+            solved, moves, _, _ = self.solver.solve(TubeState.from_packed(world), self.max_iterations, self.strategy)
+            cache[key] = (world, moves) if solved else None
+        hit = cache[key]
+        if hit is None:
+            return None
+        solved_world, moves = hit
+        if solved_world.code == world.code:
+            return list(moves)
+        # 並べ替え・色の付け替えで移り合う別の世界の手順を、この世界の試験管番号に直す
+        order = canonical.form(world.code)[1]
+        position = {tube: j for j, tube in enumerate(canonical.form(solved_world.code)[1])}
+        return [(order[position[from_tube]], order[position[to_tube]]) for from_tube, to_tube in moves]
+
+    @staticmethod
+    def _visible_move(visible: PackedState, move: Move) -> bool:
+        """見えている盤面で指せる手か（移動元の一番上が見えていて、移動先が空か見えている同じ色）"""
+        from_tube, to_tube = move
+        unknown = visible.layout.colors.unknown_id
+        return visible.can_move(from_tube, to_tube) and visible.top(from_tube) != unknown
+
+    @staticmethod
+    def _reveals(visible: PackedState, move: Move) -> bool:
+        """指すと未知の色が一番上に現れるか（並びごと移すなら、移した並びのすぐ下が未知の色か）"""
+        unknown = visible.layout.colors.unknown_id
+        if not unknown:
+            return False
+        units = visible.layout.units(visible.tube(move[0]))
+        moved = visible.pour_count(*move) if visible.layout.pour_run else 1
+        return len(units) > moved and units[-moved - 1] == unknown
+
+    def plan(self, state: TubeState) -> BeliefPlan:
+        """見えている盤面から、選んだ世界の多くで安全な手順を求める"""
+        visible = state.packed
+        cache: Dict[int, Optional[Tuple[PackedState, List[Move]]]] = {}  # 正規化キー → (解いた世界, 手順)
+        worlds = self.worlds(visible, self.samples)
+        # 生きている世界ごとの（今の盤面, 残りの手順）
+        live = []
+        for world in worlds:
+            moves = self._solve(world, cache)
+            if moves is not None:
+                live.append((world, moves))
+        solvable = len(live)  # 解けた世界の数（安全な世界の割合の分母）
+        prefix: List[Move] = []
+        seen = {visible.code}  # 手順の途中で見えていた盤面（同じ盤面に戻る手は指さない）
+        reveals = False
+        while live and not visible.is_solved():
+            votes: Dict[Move, int] = {}
+            for _, moves in live:
+                if moves and self._visible_move(visible, moves[0]) and visible.step(*moves[0]).code not in seen:
+                    votes[moves[0]] = votes.get(moves[0], 0) + 1
+            # 多くの世界が選んでいる手から順に、quorum 以上の世界で安全なものを探す
+            survivors = None
+            for move in sorted(votes, key=votes.get, reverse=True):
+                survivors = self._survivors(live, move, self.quorum * solvable, cache)
+                if survivors is not None:
+                    break
+            if survivors is None:
+                break
+            prefix.append(move)
+            live = survivors
+            reveals = self._reveals(visible, move)
+            visible = visible.step(*move)
+            seen.add(visible.code)
+            if reveals:
+                break
+        return BeliefPlan(prefix, len(live) / solvable if solvable else 0.0, len(worlds), reveals)
+
+    def result(self, state: TubeState, plan: BeliefPlan) -> Tuple[bool, List[Move], int, list]:
+        """plan を TubeSolver.solve と同じ (解けたか, 移動手順, スコア, 色付きの移動手順) にする
+
+        手順は未知の色が現れるまでのものなので、最後に盤面が完成するときだけ解けたとする。
+        """
+        start = end = state.packed
+        for move in plan.moves:
+            end = end.step(*move)
+        solver = self.solver
+        return (end.is_solved(), list(plan.moves), solver._evaluate(end, len(plan.moves)),
+                solver._move_history(start, plan.moves))
+
+    def solve(self, state: TubeState) -> Tuple[bool, List[Move], int, list]:
+        """plan して、結果を TubeSolver.solve と同じ形で返す"""
+        return self.result(state, self.plan(state))
+
+    def _survivors(self, live: List[Tuple[PackedState, List[Move]]], move: Move, needed: float,
+                   cache: Dict[int, Optional[Tuple[PackedState, List[Move]]]]
+                   ) -> Optional[List[Tuple[PackedState, List[Move]]]]:
+        """move を指した後も解ける世界の（盤面, 残りの手順）。needed 個に届かないと分かれば None"""
+        # その手を選んでいる世界は解き直さずに済むので先に数える
+        live = sorted(live, key=lambda entry: not (entry[1] and entry[1][0] == move))
+        survivors = []
+        for i, (world, moves) in enumerate(live):
+            if len(survivors) + len(live) - i < needed:
+                return None
+            child = world.step(*move)
+            if moves and moves[0] == move:
+                survivors.append((child, moves[1:]))
+                continue
+            rest = self._solve(child, cache)
+            if rest is not None:
+                survivors.append((child, rest))
+        return survivors if len(survivors) >= needed else None
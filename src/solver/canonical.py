@@ -0,0 +1,131 @@
+from typing import Dict, List, Tuple
+from .packed import Layout, PackedState
+
+# 試験管ごとのメモの上限（容量の大きいパズルで際限なく増えないように）
+MAX_TUBE_MEMO = 1 << 18
+
+
+def _mix(x: int) -> int:
+    """整数を64ビットの擬似乱数に写す（splitmix64）"""
+    x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+class Canonicalizer:
+    """試験管の並べ替えと色の付け替えを同一視した盤面のキーを作る
+
+    各試験管を「色によらない模様（同じ色の位置関係）」と、その試験管に
+    含まれる色の特徴量（その色がどの模様のどの位置に現れるか）で並べ替え、
+    その順に色を最初に現れた順の番号へ付け替えてから1つの整数に詰める
+    （1スロット1バイトなので色は255種類まで）。キーが等しい盤面は必ず
+    互いに並べ替え・色の付け替えで移り合う。未知の色は付け替えず、常に
+    番号1に固定する。
+    """
+    __slots__ = ('layout', 'first_label', '_tubes')
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+        self.first_label = 2 if layout.colors.unknown_id else 1
+        self._tubes: Dict[int, tuple] = {}
+
+    def _tube_info(self, value: int) -> Tuple[int, bytes, Tuple[Tuple[int, int], ...]]:
+        """スロット値から（模様, 1スロット1バイトの色ID列, 色ごとの寄与）を求める
+
+        寄与は (色ID, 模様と位置から決まる乱数) の組で、盤面全体で色ごとに
+        足し合わせると色の付け替えによらない「色の特徴量」になる。
+        """
+        info = self._tubes.get(value)
+        if info is not None:
+            return info
+        layout = self.layout
+        units = layout.units(value)
+        unknown = layout.colors.unknown_id
+        label_bits = (layout.capacity + 1).bit_length()
+        local: Dict[int, int] = {}
+        pattern = 0
+        for k, cid in enumerate(units):
+            if cid == unknown:
+                label = layout.capacity + 1
+            else:
+                label = local.setdefault(cid, len(local) + 1)
+            pattern |= label << (k * label_bits)
+        pattern = (pattern << layout.capacity.bit_length()) | len(units)
+        slots = bytes(units) + bytes(layout.capacity - len(units))
+        weights = tuple((cid, _mix(pattern * 64 + k)) for k, cid in enumerate(units))
+        info = (pattern, slots, weights)
+        if len(self._tubes) >= MAX_TUBE_MEMO:
+            self._tubes.clear()
+        self._tubes[value] = info
+        return info
+
+    def _relabel(self, slots: List[bytes]) -> int:
+        """並べ替え済みの試験管の色を付け替えて1つの整数に詰める
+
+        付け替えは bytes.translate で行い、初出順は dict.fromkeys で求める。
+        キーは1スロット1バイトの固定幅になる。
+        """
+        joined = b''.join(slots)
+        table = bytearray(256)
+        unknown = self.layout.colors.unknown_id
+        if unknown:
+            table[unknown] = 1
+        label = self.first_label
+        for cid in dict.fromkeys(joined):
+            if cid and cid != unknown:
+                table[cid] = label
+                label += 1
+        return int.from_bytes(joined.translate(table), 'little')
+
+    def _order(self, values: List[int]) -> Tuple[List[int], List[tuple]]:
+        """試験管の正規の並び順（values の添字のリスト）と各試験管のメモ
+
+        模様 → 含まれる色の特徴量 → 元のスロット値 の順に比べる。どれも
+        試験管の位置に依存しないので、並べ替えただけの盤面は同じ順になる。
+        """
+        tubes = self._tubes
+        infos = [tubes.get(v) or self._tube_info(v) for v in values]
+        features: Dict[int, int] = {}
+        for info in infos:
+            for cid, weight in info[2]:
+                features[cid] = features.get(cid, 0) + weight
+        tube_bits = self.layout.tube_bits
+        sort_keys = []
+        for info, value in zip(infos, values):
+            feature = 0
+            for cid, _ in info[2]:
+                feature = (feature * 0x100000001B3 + features[cid]) & 0xFFFFFFFFFFFFFFFF
+            sort_keys.append((((info[0] << 64) | feature) << tube_bits) | value)
+        return sorted(range(len(values)), key=sort_keys.__getitem__), infos
+
+    def key(self, code: int) -> int:
+        """盤面の正規化キー"""
+        layout = self.layout
+        tube_bits = layout.tube_bits
+        mask = layout.tube_mask
+        values = []
+        for _ in range(layout.num_tubes):
+            values.append(code & mask)
+            code >>= tube_bits
+        order, infos = self._order(values)
+        return self._relabel([infos[i][1] for i in order])
+
+    def form(self, code: int) -> Tuple[int, List[int]]:
+        """正規化キーと、正規化後の各位置に対応する元の試験管番号"""
+        layout = self.layout
+        values = [layout.tube(code, i) for i in range(layout.num_tubes)]
+        order, infos = self._order(values)
+        return self._relabel([infos[i][1] for i in order]), order
+
+
+def canonicalizer(layout: Layout) -> Canonicalizer:
+    """Layout ごとに1つの Canonicalizer を使い回す"""
+    if layout.canonical is None:
+        layout.canonical = Canonicalizer(layout)
+    return layout.canonical
+
+
+def canonical_key(state: PackedState) -> int:
+    """盤面の正規化キー"""
+    return canonicalizer(state.layout).key(state.code)
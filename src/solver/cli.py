@@ -0,0 +1,175 @@
+"""ソルバーのコマンドラインインターフェース
+
+    python -m src.solver [layout.json] [--strategy astar] [--max-iterations N] [--time-limit SECONDS]
+                         [--stats] [--profile cprofile,tracemalloc]
+
+layout.json は試験管のリスト（各試験管は下から順の [R, G, B] のリスト）。
+省略すると example.py の初期状態を解く。未知の色（グレー [128, 128, 128]）を含む盤面は
+belief.BeliefSolver で未知の色が現れるまでの手順を求める（--no-belief ならグレーも普通の色として解く）。
+"""
+from typing import List, Optional, Sequence
+import argparse
+import json
+import sys
+from .events import FINISHED, IMPROVED, NEW_BEST, SOLVED, STATS, ProgressEvent
+from .solver import STRATEGIES
+
+# 色の名前（ソルバーの表示用）
+COLOR_NAMES = {
+    (255, 0, 0): "赤",            # RED
+    (255, 255, 0): "黄",          # YELLOW
+    (0, 191, 255): "水色",        # LIGHT_BLUE
+    (128, 0, 128): "赤紫",        # PURPLE
+    (148, 0, 211): "紫",          # VIOLET
+    (255, 165, 0): "オレンジ",    # ORANGE
+    (0, 255, 0): "緑",            # GREEN
+    (255, 182, 193): "ピンク",    # PINK
+    (0, 0, 255): "青",            # BLUE
+    (0, 100, 0): "深緑",          # DARK_GREEN
+    (255, 218, 185): "肌色",      # SKIN
+    (128, 128, 128): "不明"       # UNKNOWN
+}
+
+
+def color_name(color) -> str:
+    return COLOR_NAMES.get(color, "不明")
+
+
+def print_state(tubes, score, moves, move_history=None, out=sys.stdout):
+    """盤面と手順一覧を表示する"""
+    print(f"\n現在の状態:", file=out)
+    print(f"スコア: {score}", file=out)
+    print(f"手数: {len(moves)}", file=out)
+    print("\n試験管の状態:", file=out)
+    for i, tube in enumerate(tubes):
+        colors = [color_name(color) for color in tube]
+        print(f"試験管{i+1:2d}: {colors}", file=out)
+
+    if move_history:
+        print("\n手順一覧:", file=out)
+        for i, (from_tube, to_tube, color) in enumerate(move_history, 1):
+            print(f"{i:2d}手目: 試験管{from_tube+1:2d} → 試験管{to_tube+1:2d} ({color_name(color)}を移動)",
+                  file=out)
+
+
+class ConsoleRenderer:
+    """ProgressEvent の流れを端末に表示する
+
+    途中経過は1行ずつ、終了時に盤面と手順一覧を表示する。
+    verbose なら途中経過でも盤面と手順一覧を表示する（従来の表示）。
+    """
+
+    def __init__(self, verbose: bool = False, out=sys.stdout):
+        self.verbose = verbose
+        self.out = out
+
+    def __call__(self, event: ProgressEvent) -> None:
+        head = f"[{event.elapsed:7.2f}s] 展開 {event.iterations:,d} 未展開 {event.frontier:,d}"
+        if event.kind == STATS:
+            print(f"{head} 記録済み {event.visited:,d}", file=self.out)
+        elif event.kind == NEW_BEST:
+            print(f"{head} スコア {event.score} 手数 {len(event.moves)}", file=self.out)
+            if self.verbose:
+                print_state(event.state.decode(), event.score, event.moves, event.move_history, self.out)
+        elif event.kind == IMPROVED:
+            print(f"{head} 解の手数 {len(event.moves)} 下界 {event.bound}（差 {len(event.moves) - event.bound}）",
+                  file=self.out)
+        elif event.kind in (SOLVED, FINISHED):
+            result = "解けました" if event.kind == SOLVED else "解答が見つかりませんでした"
+            if event.bound is not None:
+                result += f"（最短手数の下界 {event.bound}）"
+            print(f"{head} {result}", file=self.out)
+            print_state(event.state.decode(), event.score, event.moves, event.move_history, self.out)
+
+
+def load_layout(path: str) -> List[List[tuple]]:
+    """JSON ファイルから試験管の並びを読み込む"""
+    with open(path, encoding="utf-8") as f:
+        return [[tuple(color) for color in tube] for tube in json.load(f)]
+
+
+def print_stats(stats, out=sys.stdout) -> None:
+    """探索の統計（instrument.SolveStats）を表示する"""
+    print(f"\n探索の統計 ({stats.strategy}, {stats.elapsed:.2f}秒, 展開 {stats.iterations:,d}):", file=out)
+    if stats.instrumented:
+        for phase, name in (("expand", "合法手の生成"), ("hash", "正規化キー"), ("evaluate", "評価")):
+            calls = getattr(stats, f"{phase}_calls")
+            seconds = getattr(stats, f"{phase}_seconds")
+            print(f"  {name}: {calls:,d} 回 {seconds:.3f}秒", file=out)
+        print(f"  記録済みの状態に当たった回数: {stats.dedupe_hits:,d}", file=out)
+        print(f"  未展開の最大 {stats.frontier_peak:,d} 記録済みの最大 {stats.visited_peak:,d}", file=out)
+    if stats.memory_peak is not None:
+        print(f"  最大のメモリ量: {stats.memory_peak / 2**20:.1f} MiB", file=out)
+        for line in stats.memory_top:
+            print(f"    {line}", file=out)
+    if stats.profile:
+        print(stats.profile, file=out)
+
+
+def solve_belief(state, args, store) -> int:
+    """未知の色を含む盤面を BeliefSolver で計画して表示する（手順が見つかれば終了コード0）"""
+    from .belief import BeliefSolver
+    belief = BeliefSolver(strategy=args.strategy, max_iterations=args.max_iterations, store=store,
+                          post_optimize=args.post_optimize, pattern_db=args.pattern_db)
+    plan = belief.plan(state)
+    solved, moves, score, move_history = belief.result(state, plan)
+    end = state.packed
+    for move in moves:
+        end = end.step(*move)
+    result = "解けました" if solved else ("未知の色が現れます。色を書き込んでからもう一度解いてください"
+                                          if plan.reveals else "安全な手順が見つかりませんでした")
+    print(f"世界 {plan.worlds} 個のうち {plan.support:.0%} で解ける手順: {result}")
+    print_state(end.decode(), score, moves, move_history)
+    return 0 if moves or solved else 1
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.solver", description="試験管パズルを解く")
+    parser.add_argument("layout", nargs="?", help="試験管の並びを書いた JSON ファイル（省略時は example.py の問題）")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="dfs", help="探索方法")
+    parser.add_argument("--max-iterations", type=int, default=100000, help="展開する状態数の上限")
+    parser.add_argument("--time-limit", type=float, help="探索時間の上限（秒）")
+    parser.add_argument("--capacity", type=int, default=4, help="試験管の容量")
+    parser.add_argument("--units-per-color", type=int, help="1色あたりの個数（省略時は容量と同じ）")
+    parser.add_argument("--store", help="解いた結果を記録・再利用する SQLite ファイル")
+    parser.add_argument("--post-optimize", action="store_true", help="解けた手順を短くする後処理を行う")
+    parser.add_argument("--no-belief", dest="belief", action="store_false",
+                        help="未知の色（グレー）を含む盤面も BeliefSolver を使わずに普通の色として解く")
+    parser.add_argument("--pattern-db", help="最短手順を保証する探索の下界に使うパターンデータベースのファイル")
+    parser.add_argument("--interval", type=float, default=1.0, help="途中経過を表示する間隔（秒）")
+    parser.add_argument("--verbose", action="store_true", help="途中経過でも盤面と手順一覧を表示する")
+    parser.add_argument("--quiet", action="store_true", help="途中経過を表示しない")
+    parser.add_argument("--stats", action="store_true", help="処理ごとの回数と時間を数えて終了時に表示する")
+    parser.add_argument("--profile", help="cprofile / tracemalloc（カンマ区切り）で探索を測って終了時に表示する")
+    args = parser.parse_args(argv)
+
+    from . import TubeSolver, TubeState
+    if args.layout:
+        tubes = load_layout(args.layout)
+    else:
+        from .example import initial_tubes as tubes
+
+    renderer = ConsoleRenderer(args.verbose)
+    if args.quiet:
+        # 途中経過は捨て、終了時のイベントだけを表示する
+        progress = lambda event: renderer(event) if event.kind in (SOLVED, FINISHED) else None
+    else:
+        progress = renderer
+    store = None
+    if args.store:
+        from .store import SolutionStore
+        store = SolutionStore(args.store)
+    solver = TubeSolver(progress=progress, progress_interval=args.interval, store=store,
+                        post_optimize=args.post_optimize, instrument=args.stats or None, profile=args.profile,
+                        pattern_db=args.pattern_db)
+    state = TubeState([list(tube) for tube in tubes], capacity=args.capacity, units_per_color=args.units_per_color)
+    if args.belief and state.layout.colors.unknown_id:
+        return solve_belief(state, args, store)
+    solved, _, _, _ = solver.solve(state, args.max_iterations, args.strategy, args.time_limit)
+    if solver.stats.instrumented or solver.stats.profile or solver.stats.memory_top:
+        print_stats(solver.stats)
+    return 0 if solved else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
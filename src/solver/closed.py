@@ -0,0 +1,140 @@
+from typing import Iterator, List, Optional, Set
+from heapq import merge
+import mmap
+import sys
+import tempfile
+
+# 1状態あたりの set の管理領域の目安（スロットと空きの分）
+SET_OVERHEAD = 32
+# Bloom フィルタに使う予算の割合と、1つのキーで立てるビット数
+BLOOM_SHARE = 0.25
+BLOOM_HASHES = 4
+# ディスク上の並びがこの数を超えたら1つにまとめる
+MAX_RUNS = 8
+
+
+class _Run:
+    """一時ファイルに書き出した、ソート済みの固定幅のキーの並び"""
+    __slots__ = ('file', 'data', 'width', 'count')
+
+    def __init__(self, records: Iterator[bytes], width: int, directory: Optional[str]):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        count = 0
+        for record in records:
+            self.file.write(record)
+            count += 1
+        self.file.flush()
+        self.width = width
+        self.count = count
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if count else b''
+
+    def __contains__(self, record: bytes) -> bool:
+        data, width = self.data, self.width
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = data[mid * width:(mid + 1) * width]
+            if probe < record:
+                lo = mid + 1
+            elif probe > record:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __iter__(self) -> Iterator[bytes]:
+        data, width = self.data, self.width
+        for i in range(self.count):
+            yield data[i * width:(i + 1) * width]
+
+    def close(self) -> None:
+        if self.count:
+            self.data.close()
+        self.file.close()
+
+
+class ClosedSet:
+    """メモリの上限を決めた記録済みの状態の集合（正規化キーの int を入れる）
+
+    新しいキーは普通の set に入れ、推定の使用量が memory_limit を超えたら
+    ソートして固定幅（key_bytes バイト、ビッグエンディアン）の並びとして
+    一時ファイルへ書き出し、set を空にする（外部メモリ探索の重複検出と同じ考え方）。
+    書き出したキーは Bloom フィルタにも登録し、フィルタが「あるかもしれない」と
+    答えたときだけ各並びを mmap 上の二分探索で調べる。並びが MAX_RUNS 個を
+    超えたら1つにまとめる。Bloom フィルタは大きさが固定なので、書き出した数が
+    増えるほど二分探索が増えて遅くなるが、メモリは上限のまま増えない。
+
+    Args:
+        key_bytes: キーを固定幅で書き出すときのバイト数（キーは 256**key_bytes 未満）
+        memory_limit: set と Bloom フィルタに使うメモリの目安（バイト）
+        directory: 一時ファイルを作るディレクトリ（None なら既定の場所）
+    """
+    __slots__ = ('key_bytes', 'directory', 'hot', 'hot_limit', 'bloom', 'bloom_bits', 'runs', 'spilled')
+
+    def __init__(self, key_bytes: int, memory_limit: int, directory: Optional[str] = None):
+        self.key_bytes = key_bytes
+        self.directory = directory
+        self.hot: Set[int] = set()
+        bloom_bytes = max(1, int(memory_limit * BLOOM_SHARE))
+        self.bloom: Optional[bytearray] = None  # 初めて書き出すときに作る
+        self.bloom_bits = bloom_bytes * 8
+        entry_size = sys.getsizeof(1 << (8 * key_bytes - 1)) + SET_OVERHEAD
+        self.hot_limit = max(1, (memory_limit - bloom_bytes) // entry_size)
+        self.runs: List[_Run] = []
+        self.spilled = 0  # 書き出したキーの数
+
+    def __len__(self) -> int:
+        return len(self.hot) + self.spilled
+
+    def _positions(self, key: int) -> Iterator[int]:
+        h = hash(key)
+        m = self.bloom_bits
+        step = (h // m) % m | 1
+        for i in range(BLOOM_HASHES):
+            yield (h + i * step) % m
+
+    def __contains__(self, key: int) -> bool:
+        if key in self.hot:
+            return True
+        if not self.runs:
+            return False
+        bloom = self.bloom
+        for p in self._positions(key):
+            if not bloom[p >> 3] & (1 << (p & 7)):
+                return False
+        record = key.to_bytes(self.key_bytes, 'big')
+        return any(record in run for run in self.runs)
+
+    def add(self, key: int) -> None:
+        self.hot.add(key)
+        if len(self.hot) >= self.hot_limit:
+            self.spill()
+
+    def spill(self) -> None:
+        """メモリ上のキーをソート済みの並びとして書き出す"""
+        if not self.hot:
+            return
+        if self.bloom is None:
+            self.bloom = bytearray(self.bloom_bits // 8)
+        bloom = self.bloom
+        for key in self.hot:
+            for p in self._positions(key):
+                bloom[p >> 3] |= 1 << (p & 7)
+        width = self.key_bytes
+        records = (key.to_bytes(width, 'big') for key in sorted(self.hot))
+        self.runs.append(_Run(records, width, self.directory))
+        self.spilled += len(self.hot)
+        self.hot.clear()
+        if len(self.runs) > MAX_RUNS:
+            runs = self.runs
+            self.runs = [_Run(merge(*runs), width, self.directory)]
+            for run in runs:
+                run.close()
+
+    def close(self) -> None:
+        """一時ファイルを消す"""
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.hot.clear()
+        self.spilled = 0
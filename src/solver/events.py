@@ -0,0 +1,105 @@
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+from dataclasses import dataclass, field
+from .packed import Color, PackedState
+import time
+
+if TYPE_CHECKING:
+    from .instrument import SolveStats
+
+# イベントの種類
+NEW_BEST = "new_best"  # 評価値の良い状態が見つかった
+IMPROVED = "improved"  # より短い解が見つかった（strategy="anytime"）
+SOLVED = "solved"      # 解けた
+STATS = "stats"        # 定期的な統計
+FINISHED = "finished"  # 解けずに探索を終えた
+
+# 時刻を確認する間隔（展開数）
+CHECK_EVERY = 64
+
+
+@dataclass
+class ProgressEvent:
+    kind: str
+    iterations: int  # これまでに展開した状態数
+    elapsed: float   # 探索開始からの経過秒数
+    frontier: int = 0  # 未展開の状態数
+    visited: int = 0   # 記録済みの状態数
+    score: Optional[int] = None
+    state: Optional[PackedState] = None
+    moves: List[Tuple[int, int]] = field(default_factory=list)
+    move_history: List[Tuple[int, int, Color]] = field(default_factory=list)
+    bound: Optional[int] = None  # 最短手数の下界（strategy="anytime" のとき。手数との差が最適性のギャップ）
+    stats: Optional['SolveStats'] = None  # 探索の統計（SOLVED / FINISHED のとき）
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class Progress:
+    """探索の進捗をコールバックへ流す
+
+    NEW_BEST と STATS は interval 秒に1回までに間引く。間引かれた NEW_BEST は
+    保留しておき、次に送れるときか探索の終了時にまとめて送る。IMPROVED は間引かない。
+    コールバックが None のときは探索側で呼び出し自体を省く。
+    """
+    __slots__ = ('callback', 'interval', 'started', 'last_sent', 'pending')
+
+    def __init__(self, callback: ProgressCallback, interval: float = 1.0):
+        self.callback = callback
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_sent = float('-inf')
+        self.pending: Optional[tuple] = None
+
+    def _due(self, now: float) -> bool:
+        return now - self.last_sent >= self.interval
+
+    def _send(self, event: ProgressEvent, now: float) -> None:
+        self.last_sent = now
+        self.pending = None
+        self.callback(event)
+
+    def new_best(self, iterations: int, score: int, state: PackedState,
+                 path: Callable[[], Tuple[list, list]], frontier: int = 0, visited: int = 0) -> None:
+        """評価値の良い状態が見つかった（path は（移動手順, 色付きの移動手順）を返す関数で、送るときだけ呼ぶ）"""
+        now = time.monotonic()
+        pending = (iterations, now - self.started, frontier, visited, score, state, path)
+        if self._due(now):
+            self._send_best(pending, now)
+        else:
+            self.pending = pending
+
+    def _send_best(self, pending, now: float) -> None:
+        iterations, elapsed, frontier, visited, score, state, path = pending
+        moves, move_history = path()
+        self._send(ProgressEvent(NEW_BEST, iterations, elapsed, frontier, visited, score, state,
+                                 moves, move_history), now)
+
+    def improved(self, iterations: int, score: int, state: PackedState, moves, move_history, bound: int,
+                 frontier: int = 0, visited: int = 0) -> None:
+        """より短い解が見つかった（bound はその時点の最短手数の下界）"""
+        now = time.monotonic()
+        self.pending = None
+        self._send(ProgressEvent(IMPROVED, iterations, now - self.started, frontier, visited, score, state,
+                                 list(moves), list(move_history), bound), now)
+
+    def tick(self, iterations: int, frontier: int = 0, visited: int = 0) -> None:
+        """定期的な統計（CHECK_EVERY 回に1回呼ぶ）"""
+        now = time.monotonic()
+        if not self._due(now):
+            return
+        if self.pending is not None:
+            self._send_best(self.pending, now)
+        else:
+            self._send(ProgressEvent(STATS, iterations, now - self.started, frontier, visited), now)
+
+    def finish(self, solved: bool, iterations: int, score, state: Optional[PackedState], moves, move_history,
+               frontier: int = 0, visited: int = 0, bound: Optional[int] = None,
+               stats: Optional['SolveStats'] = None) -> None:
+        """探索の終了（保留中の NEW_BEST を送ってから SOLVED か FINISHED を送る）"""
+        now = time.monotonic()
+        if self.pending is not None:
+            self._send_best(self.pending, now)
+        self._send(ProgressEvent(SOLVED if solved else FINISHED, iterations, now - self.started,
+                                 frontier, visited, score, state, list(moves), list(move_history), bound, stats),
+                   now)
@@ -1,6 +1,7 @@
 from . import solve_puzzle
 from .state import TubeState
 from .solver import TubeSolver
+from .cli import ConsoleRenderer
 
 # 色の定義
 RED = (255, 0, 0)  # 赤
@@ -39,10 +40,10 @@ initial_tubes = [
 def main():
     print("パズルを解く:")
     # パズルを解く
-    solution = solve_puzzle(initial_tubes)
+    solved, _, _, _ = solve_puzzle(initial_tubes, progress=ConsoleRenderer())
     
     # 解答を表示
-    if not solution:
+    if not solved:
         print("解答が見つかりませんでした。")
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+"""解けることを確かめたランダムなパズルを作る
+
+    from src.solver.generator import generate_puzzle
+
+    tubes = generate_puzzle(num_colors=8, capacity=4, empty=2, seed=0)
+
+同じ引数と seed からは常に同じパズルができる。各色 units_per_color 個
+（省略時は capacity 個）ずつを num_colors 本の試験管へランダムに詰め、空の試験管を
+empty 本加える（試験管は num_colors + empty 本）。verify_iterations > 0 なら最良優先探索で
+解けることを確かめ、その展開数で解けなければ同じ乱数列で詰め直す。
+MAX_ATTEMPTS 回詰め直しても確かめられなければ（空の試験管が少ないときなど）、
+完成した盤面から逆向きの移動を重ねて崩したパズルを返す。逆向きの移動は
+それぞれ正しい移動を巻き戻したものなので、この方法で作ったパズルは必ず解ける。
+"""
+from typing import List, Optional
+import random
+from .packed import Color, ColorTable, Layout, PackedState, UNKNOWN_COLOR
+from .solver import TubeSolver
+from .state import TubeState
+
+# 最初に使う色（example.py と同じ。cli.COLOR_NAMES で名前が付く）
+BASE_PALETTE: List[Color] = [
+    (255, 0, 0), (255, 255, 0), (0, 191, 255), (128, 0, 128), (148, 0, 211), (255, 165, 0),
+    (0, 255, 0), (255, 182, 193), (0, 0, 255), (0, 100, 0), (255, 218, 185),
+]
+
+# 詰め直す回数の上限
+MAX_ATTEMPTS = 5
+# 逆向きに崩すときの1個あたりの移動回数
+SCRAMBLE_MOVES_PER_UNIT = 8
+
+
+def palette(num_colors: int) -> List[Color]:
+    """互いに異なる num_colors 色（未知の色は含まない）"""
+    colors = BASE_PALETTE[:num_colors]
+    used = set(colors) | {UNKNOWN_COLOR}
+    i = 0
+    while len(colors) < num_colors:
+        color = ((37 * i + 20) % 256, (101 * i + 60) % 256, (163 * i + 100) % 256)
+        i += 1
+        if color not in used:
+            used.add(color)
+            colors.append(color)
+    return colors
+
+
+def layout_for(tubes: List[List[Color]], capacity: int = 4, colors: Optional[ColorTable] = None,
+               units_per_color: Optional[int] = None) -> PackedState:
+    """容量と1色あたりの個数を指定して試験管の並びを PackedState にする"""
+    colors = colors if colors is not None else ColorTable()
+    colors.intern_tubes(tubes)
+    return PackedState.from_tubes(tubes, Layout(len(tubes), colors, capacity, units_per_color=units_per_color))
+
+
+def scramble(num_colors: int, capacity: int = 4, empty: int = 2, seed: int = 0,
+             moves: Optional[int] = None, units_per_color: Optional[int] = None) -> List[List[Color]]:
+    """完成した盤面から逆向きの移動を moves 回重ねて崩したパズル（必ず解ける）
+
+    試験管 a の一番上を試験管 b へ移す逆向きの移動は、b から a へ戻す正しい移動が
+    あるとき、つまり a の上から2個目が同じ色か a が1個だけのときに行える。
+    """
+    rng = random.Random(seed)
+    units = units_per_color or capacity
+    tubes = [[c] * units for c in palette(num_colors)] + [[] for _ in range(empty)]
+    if moves is None:
+        moves = SCRAMBLE_MOVES_PER_UNIT * num_colors * units
+    indices = range(len(tubes))
+    for _ in range(moves):
+        sources = [a for a in indices if len(tubes[a]) == 1 or (len(tubes[a]) > 1 and tubes[a][-1] == tubes[a][-2])]
+        targets = [b for b in indices if len(tubes[b]) < capacity]
+        pairs = [(a, b) for a in sources for b in targets if a != b]
+        if not pairs:
+            break
+        a, b = rng.choice(pairs)
+        tubes[b].append(tubes[a].pop())
+    return tubes
+
+
+def generate_puzzle(num_colors: int, capacity: int = 4, empty: int = 2, seed: int = 0,
+                    verify_iterations: int = 20000, units_per_color: Optional[int] = None) -> List[List[Color]]:
+    """解けることを確かめたランダムなパズル（各試験管は下から上の色のリスト）
+
+    Args:
+        num_colors: 色の数
+        capacity: 試験管の容量
+        empty: 空の試験管の本数
+        seed: 乱数の種
+        verify_iterations: 解けることを確かめる最良優先探索の展開数（0 なら確かめない）
+        units_per_color: 1色あたりの個数（省略時は capacity。各試験管にこの個数ずつ詰める）
+
+    Returns:
+        詰め直しても確かめられなければ scramble() で作ったパズル
+    """
+    rng = random.Random(seed)
+    per_tube = units_per_color or capacity
+    units = [c for c in palette(num_colors) for _ in range(per_tube)]
+    for _ in range(MAX_ATTEMPTS):
+        rng.shuffle(units)
+        tubes = [units[i:i + per_tube] for i in range(0, len(units), per_tube)] + [[] for _ in range(empty)]
+        if not verify_iterations:
+            return tubes
+        state = layout_for(tubes, capacity, units_per_color=units_per_color)
+        if state.is_solved():
+            continue
+        solved, _, _, _ = TubeSolver().solve(TubeState.from_packed(state), verify_iterations, "best_first")
+        if solved:
+            return tubes
+    return scramble(num_colors, capacity, empty, seed, units_per_color=units_per_color)
@@ -0,0 +1,151 @@
+from typing import Dict, Tuple
+from .packed import Layout, PackedState
+
+
+class LowerBound:
+    """解くまでに必要な手数の下界（許容的ヒューリスティック）
+
+    - 試験管の一番下から続く同じ色の並び（底の並び）より上にある個体は、
+      少なくとも1回は動かす必要がある
+    - 同じ色の底の並びが複数の試験管にあるとき、最も長いもの以外は
+      少なくとも1回は動かす必要がある
+
+    2つの集合は重ならないので、足し合わせても許容的なままになる。
+
+    Layout.pour_run のときは1手で並びごと動くので、個数の代わりに
+    （底の並びより上にある並びの数）＋（色ごとの底の並びの数 − 1）を使う。
+    1手で減るのはどちらか一方の1つだけなので、これも許容的になる。
+    """
+    __slots__ = ('layout', '_tubes')
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+        self._tubes: Dict[int, Tuple[int, int, int]] = {}
+
+    def _tube_info(self, value: int) -> Tuple[int, int, int]:
+        """スロット値から（底の色, 底の並びの長さ, その上にある個数）を求める
+
+        pour_run なら底の並びの長さの代わりに1、個数の代わりに並びの数を返す。
+        """
+        info = self._tubes.get(value)
+        if info is None:
+            units = self.layout.units(value)
+            run = 0
+            while run < len(units) and units[run] == units[0]:
+                run += 1
+            if self.layout.pour_run:
+                above = sum(1 for i in range(run, len(units)) if units[i] != units[i - 1])
+                run = 1 if units else 0
+            else:
+                above = len(units) - run
+            info = (units[0], run, above) if units else (0, 0, 0)
+            self._tubes[value] = info
+        return info
+
+    def __call__(self, state: PackedState) -> int:
+        layout = self.layout
+        code = state.code
+        mask = layout.tube_mask
+        tube_bits = layout.tube_bits
+        tubes = self._tubes
+        bound = 0
+        run_total: Dict[int, int] = {}
+        run_max: Dict[int, int] = {}
+        for _ in range(layout.num_tubes):
+            value = code & mask
+            code >>= tube_bits
+            if not value:
+                continue
+            color, run, above = tubes.get(value) or self._tube_info(value)
+            bound += above
+            run_total[color] = run_total.get(color, 0) + run
+            if run > run_max.get(color, 0):
+                run_max[color] = run
+        for color, total in run_total.items():
+            bound += total - run_max[color]
+        return bound
+
+
+# 試験管ごとの寄与のメモの上限
+MAX_TUBE_MEMO = 1 << 18
+
+
+class Evaluator:
+    """TubeSolver の評価値を試験管ごとの寄与の和として計算する
+
+    色の分散ペナルティ（2本以上に散らばった色ごとに 本数 × 200）は
+      200 × Σ(各試験管に含まれる色の種類数) − 200 × Σ(全個数を含む色の数)
+    と書き直せるので、色ごとの総数さえ分かっていれば試験管ごとに閉じる。
+    1回の移動で変わるのは2本だけなので、評価値の差分は O(1) で求まる。
+    深さのペナルティは含めない（呼び出し側で引く）。
+    """
+    __slots__ = ('layout', 'totals', '_tubes')
+
+    def __init__(self, layout: Layout, totals: Dict[int, int]):
+        self.layout = layout
+        self.totals = totals  # 色IDごとの盤面全体での個数
+        self._tubes: Dict[int, int] = {}
+
+    @classmethod
+    def from_state(cls, state: PackedState) -> 'Evaluator':
+        totals: Dict[int, int] = {}
+        for tube in state.tube_ids():
+            for cid in tube:
+                totals[cid] = totals.get(cid, 0) + 1
+        return cls(state.layout, totals)
+
+    def tube_score(self, value: int) -> int:
+        """1本の試験管の評価値への寄与"""
+        score = self._tubes.get(value)
+        if score is not None:
+            return score
+        tube = self.layout.units(value)
+        score = 0
+        if not tube:
+            score += 300  # 空のチューブのボーナス
+        else:
+            if len(tube) == self.layout.units_per_color and all(c == tube[0] for c in tube):
+                score += 20000  # 完成ボーナス
+
+            # 連続した同じ色のボーナス
+            consecutive = 1
+            for i in range(len(tube) - 1):
+                if tube[i] == tube[i + 1]:
+                    consecutive += 1
+                    score += consecutive * 200
+
+            # チューブが完成に近い場合の追加ボーナス
+            if len(tube) >= 2 and all(c == tube[0] for c in tube):
+                score += len(tube) * 500
+
+            # 色の分散ペナルティのうち、この試験管の分
+            for color in set(tube):
+                score -= 200
+                if tube.count(color) == self.totals.get(color):
+                    score += 200
+
+        if len(self._tubes) >= MAX_TUBE_MEMO:
+            self._tubes.clear()
+        self._tubes[value] = score
+        return score
+
+    def static_score(self, state: PackedState) -> int:
+        """深さのペナルティを除いた評価値"""
+        layout = self.layout
+        code = state.code
+        mask = layout.tube_mask
+        tube_bits = layout.tube_bits
+        tubes = self._tubes
+        score = 0
+        for _ in range(layout.num_tubes):
+            value = code & mask
+            code >>= tube_bits
+            cached = tubes.get(value)
+            score += cached if cached is not None else self.tube_score(value)
+        return score
+
+    def delta(self, state: PackedState, child: PackedState, from_idx: int, to_idx: int) -> int:
+        """state から child への移動による評価値の変化"""
+        tube_score = self.tube_score
+        return (tube_score(child.tube(from_idx)) + tube_score(child.tube(to_idx))
+                - tube_score(state.tube(from_idx)) - tube_score(state.tube(to_idx)))
@@ -0,0 +1,252 @@
+"""探索の内側の処理ごとの回数・時間と、cProfile / tracemalloc による計測
+
+    solver = TubeSolver(instrument=True, profile="cprofile,tracemalloc")
+    solver.solve(state, strategy="best_first")
+    print(solver.stats.expand_seconds, solver.stats.hash_calls, solver.stats.dedupe_hits)
+
+TubeSolver(instrument=True)（または環境変数 TUBE_SOLVER_INSTRUMENT=1）のときだけ、
+探索が使う呼び出し（合法手の生成・正規化キー・評価関数と下界）を回数と時間を数える
+包みに差し替え、記録済みの状態の集合を重複の数を数える包みで返す。無効なら何も
+差し替えないので、探索の内側のループの速さは変わらない。
+
+profile（または環境変数 TUBE_SOLVER_PROFILE）に "cprofile" や "tracemalloc" を
+カンマ区切りで指定すると、その探索全体を cProfile で測って累積時間の上位を、
+tracemalloc で測って最大のメモリ量と確保の多い行を SolveStats に入れる。
+profile_every（TUBE_SOLVER_PROFILE_EVERY）が N なら N 回に1回の探索だけを測る。
+
+SolveStats は計測が無効でも毎回作り、TubeSolver.stats と SOLVED / FINISHED の
+イベント（ProgressEvent.stats）に付く。
+"""
+from typing import Any, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+import os
+import time
+
+# 計測を有効にする環境変数
+INSTRUMENT_ENV = "TUBE_SOLVER_INSTRUMENT"
+PROFILE_ENV = "TUBE_SOLVER_PROFILE"
+PROFILE_EVERY_ENV = "TUBE_SOLVER_PROFILE_EVERY"
+# 指定できる計測
+PROFILERS = ("cprofile", "tracemalloc")
+# cProfile の結果に残す関数の数と、tracemalloc の結果に残す行の数
+PROFILE_TOP = 20
+MEMORY_TOP = 10
+
+
+@dataclass
+class SolveStats:
+    strategy: str
+    solved: bool = False
+    iterations: int = 0  # 展開した状態数
+    elapsed: float = 0.0  # 探索にかかった秒数
+    frontier: int = 0  # 終了時の未展開の状態数
+    visited: int = 0   # 終了時の記録済みの状態数
+    # 以下は instrument=True のときだけ数える
+    instrumented: bool = False
+    expand_calls: int = 0  # 合法手の生成（_successors / _get_valid_moves）
+    expand_seconds: float = 0.0
+    hash_calls: int = 0  # 正規化キーの計算
+    hash_seconds: float = 0.0
+    evaluate_calls: int = 0  # 評価関数と下界
+    evaluate_seconds: float = 0.0
+    dedupe_hits: int = 0  # 記録済みの状態に当たった回数
+    frontier_peak: int = 0  # 未展開の状態数の最大（CHECK_EVERY 回の展開ごとと終了時に見た値）
+    visited_peak: int = 0   # 記録済みの状態数の最大（同上）
+    # profile を指定したときの結果
+    profile: Optional[str] = None  # cProfile の累積時間の上位（pstats の表）
+    memory_peak: Optional[int] = None  # tracemalloc で見た最大のメモリ量（バイト）
+    memory_top: List[str] = field(default_factory=list)  # 確保の多い行
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+def env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() not in ("", "0", "false", "no")
+
+
+def parse_profile(profile: Optional[str]) -> tuple:
+    """"cprofile,tracemalloc" のような指定を計測の名前のタプルにする"""
+    if not profile:
+        return ()
+    names = tuple(name.strip().lower() for name in profile.split(",") if name.strip())
+    for name in names:
+        if name not in PROFILERS:
+            raise ValueError(f"未知の計測です: {name}（{', '.join(PROFILERS)} から選んでください）")
+    return names
+
+
+def _timed(fn: Callable, stats: SolveStats, phase: str) -> Callable:
+    """fn の呼び出し回数と時間を stats の {phase}_calls / {phase}_seconds に足す包み"""
+    calls = f"{phase}_calls"
+    seconds = f"{phase}_seconds"
+    clock = time.perf_counter
+
+    def wrapper(*args):
+        started = clock()
+        try:
+            return fn(*args)
+        finally:
+            setattr(stats, seconds, getattr(stats, seconds) + clock() - started)
+            setattr(stats, calls, getattr(stats, calls) + 1)
+    return wrapper
+
+
+def _timed_iter(fn: Callable, stats: SolveStats, phase: str) -> Callable:
+    """列挙する関数（ジェネレーターを返す）の呼び出し回数と、列挙し終えるまでの時間を足す包み
+
+    探索は子を1つ取り出すたびに正規化キーや評価値を求めるので、取り出す
+    1回ごとの時間だけを足す（間に挟まる他の処理の時間は含めない）。
+    """
+    calls = f"{phase}_calls"
+    seconds = f"{phase}_seconds"
+    clock = time.perf_counter
+
+    def iterate(items):
+        while True:
+            started = clock()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                setattr(stats, seconds, getattr(stats, seconds) + clock() - started)
+            yield item
+
+    def wrapper(*args):
+        started = clock()
+        items = iter(fn(*args))
+        setattr(stats, seconds, getattr(stats, seconds) + clock() - started)
+        setattr(stats, calls, getattr(stats, calls) + 1)
+        return iterate(items)
+    return wrapper
+
+
+class _Proxy:
+    """一部のメソッドだけを計測付きに差し替え、残りは元のオブジェクトに任せる"""
+
+    def __init__(self, target, **methods):
+        self._target = target
+        self.__dict__.update(methods)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class CountingSet:
+    """記録済みの状態の集合（set か ClosedSet）を包み、当たった回数を数える"""
+    __slots__ = ('inner', 'stats')
+
+    def __init__(self, inner, stats: SolveStats):
+        self.inner = inner
+        self.stats = stats
+
+    def __contains__(self, key) -> bool:
+        if key in self.inner:
+            self.stats.dedupe_hits += 1
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self.inner)
+
+    def add(self, key) -> None:
+        self.inner.add(key)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class CountingDict(dict):
+    """状態ごとの手数の表。get と in で記録済みの状態に当たった回数を数える"""
+    __slots__ = ('stats',)
+
+    def __init__(self, stats: SolveStats, *args):
+        super().__init__(*args)
+        self.stats = stats
+
+    def get(self, key, default=None):
+        value = dict.get(self, key, self)
+        if value is self:
+            return default
+        self.stats.dedupe_hits += 1
+        return value
+
+    def __contains__(self, key) -> bool:
+        if dict.__contains__(self, key):
+            self.stats.dedupe_hits += 1
+            return True
+        return False
+
+
+class Instrument:
+    """1回の探索の計測。TubeSolver が探索の前に作り、呼び出しを包むのに使う"""
+
+    def __init__(self, stats: SolveStats):
+        self.stats = stats
+
+    def timed(self, fn: Callable, phase: str, lazy: bool = False) -> Callable:
+        """fn を phase の回数と時間を数える包みにする（lazy なら返す列挙の時間も数える）"""
+        return (_timed_iter if lazy else _timed)(fn, self.stats, phase)
+
+    def canonical(self, canonical):
+        return _Proxy(canonical, key=self.timed(canonical.key, "hash"), form=self.timed(canonical.form, "hash"))
+
+    def evaluator(self, evaluator):
+        return _Proxy(evaluator, static_score=self.timed(evaluator.static_score, "evaluate"),
+                      delta=self.timed(evaluator.delta, "evaluate"))
+
+    def visited(self, visited) -> CountingSet:
+        return CountingSet(visited, self.stats)
+
+    def table(self, *args) -> CountingDict:
+        return CountingDict(self.stats, *args)
+
+    def sizes(self, frontier: int, visited: int) -> None:
+        stats = self.stats
+        if frontier > stats.frontier_peak:
+            stats.frontier_peak = frontier
+        if visited > stats.visited_peak:
+            stats.visited_peak = visited
+
+
+class Profiler:
+    """探索全体を cProfile / tracemalloc で測る"""
+
+    def __init__(self, names: tuple):
+        self.names = names
+        self._profile = None
+        self._started_tracing = False
+
+    def __enter__(self) -> 'Profiler':
+        if "tracemalloc" in self.names:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        if "cprofile" in self.names:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+
+    def report(self, stats: SolveStats) -> None:
+        """測った結果を stats に入れる（tracemalloc はここで止める）"""
+        if self._profile is not None:
+            import io
+            import pstats
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            stats.profile = out.getvalue()
+        if "tracemalloc" in self.names:
+            import tracemalloc
+            stats.memory_peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot()
+            stats.memory_top = [str(line) for line in snapshot.statistics("lineno")[:MEMORY_TOP]]
+            if self._started_tracing:
+                tracemalloc.stop()
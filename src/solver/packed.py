@@ -0,0 +1,264 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Color = Tuple[int, int, int]
+
+# 未知の色（?マーク）として扱うグレー
+UNKNOWN_COLOR: Color = (128, 128, 128)
+# 試験管の容量を指定しないときの値
+DEFAULT_CAPACITY = 4
+
+
+class ColorTable:
+    """RGBタプルと小さな整数IDの対応表（ID 0 は空きスロット）"""
+    __slots__ = ('colors', 'ids', 'unknown_id')
+
+    def __init__(self, colors: Iterable[Color] = ()):
+        self.colors: List[Optional[Color]] = [None]
+        self.ids: Dict[Color, int] = {}
+        self.unknown_id = 0  # 0 は「未知の色なし」を表す
+        for color in colors:
+            self.intern(color)
+
+    @classmethod
+    def from_tubes(cls, tubes: Sequence[Sequence[Color]]) -> 'ColorTable':
+        """試験管の並びに現れる色を下から順に登録した表を作る"""
+        table = cls()
+        table.intern_tubes(tubes)
+        return table
+
+    def intern_tubes(self, tubes: Sequence[Sequence[Color]]) -> None:
+        """試験管の並びに現れる色をまとめて登録する"""
+        for tube in tubes:
+            for color in tube:
+                self.intern(color)
+
+    def intern(self, color: Color) -> int:
+        """色を登録してIDを返す（登録済みなら既存のID）"""
+        cid = self.ids.get(color)
+        if cid is None:
+            cid = len(self.colors)
+            self.colors.append(color)
+            self.ids[color] = cid
+            if color == UNKNOWN_COLOR:
+                self.unknown_id = cid
+        return cid
+
+    def color(self, cid: int) -> Optional[Color]:
+        """IDからRGBタプルを返す"""
+        return self.colors[cid]
+
+    def __len__(self) -> int:
+        """登録されている色の数（空きスロットは含まない）"""
+        return len(self.colors) - 1
+
+
+class Layout:
+    """パズルの形（試験管の本数・容量・1色あたりの個数）と整数への詰め方
+
+    状態全体を1つの整数で表す。試験管 i は ``i * tube_bits`` ビット目から
+    ``tube_bits`` ビットの固定幅スロットを持ち、その中に下から順に
+    ``bits`` ビットずつ色IDを詰める。色IDは1以上なので、試験管の長さは
+    スロット値のビット長から O(1) で求まる。``bits`` は作成時点の色の数で
+    決まるため、色は Layout を作る前に全て登録しておくこと。
+
+    units_per_color は1色あたりの個数で、省略すると capacity と同じ。
+    同じ色が units_per_color 個そろった試験管を完成とみなす。
+
+    pour_run=True なら1回の移動で一番上の同じ色の並びを入るだけまとめて移す
+    （PackedState.step がこの規則に従う）。
+    """
+    __slots__ = ('num_tubes', 'capacity', 'units_per_color', 'colors', 'pour_run', 'bits', 'tube_bits',
+                 'slot_mask', 'tube_mask', 'uniform', 'canonical')
+
+    def __init__(self, num_tubes: int, colors: ColorTable, capacity: int = DEFAULT_CAPACITY, pour_run: bool = False,
+                 units_per_color: Optional[int] = None):
+        if units_per_color is None:
+            units_per_color = capacity
+        if not 0 < units_per_color <= capacity:
+            raise ValueError(f"1色あたりの個数は1以上、容量（{capacity}）以下にしてください: {units_per_color}")
+        self.num_tubes = num_tubes
+        self.capacity = capacity
+        self.units_per_color = units_per_color
+        self.colors = colors
+        self.pour_run = pour_run
+        self.bits = max(1, len(colors).bit_length())
+        self.tube_bits = self.bits * capacity
+        self.slot_mask = (1 << self.bits) - 1
+        self.tube_mask = (1 << self.tube_bits) - 1
+        # uniform[n]: 長さnの単色の試験管を作るための係数（色ID × uniform[n]）
+        self.uniform = [sum(1 << (k * self.bits) for k in range(n)) for n in range(capacity + 1)]
+        self.canonical = None  # canonical.canonicalizer() が遅延生成する
+
+    def pack(self, tubes: Sequence[Sequence[int]]) -> int:
+        """色IDのリスト（下から上）の並びを1つの整数に詰める"""
+        code = 0
+        for i, tube in enumerate(tubes):
+            value = 0
+            for k, cid in enumerate(tube):
+                value |= cid << (k * self.bits)
+            code |= value << (i * self.tube_bits)
+        return code
+
+    def tube(self, code: int, idx: int) -> int:
+        """指定した試験管のスロット値を取り出す"""
+        return (code >> (idx * self.tube_bits)) & self.tube_mask
+
+    def length(self, value: int) -> int:
+        """スロット値から試験管に入っている個数を求める"""
+        return (value.bit_length() + self.bits - 1) // self.bits
+
+    def units(self, value: int) -> List[int]:
+        """スロット値を色IDのリスト（下から上）に戻す"""
+        units = []
+        while value:
+            units.append(value & self.slot_mask)
+            value >>= self.bits
+        return units
+
+
+class PackedState:
+    """整数に詰めた不変・ハッシュ可能な盤面"""
+    __slots__ = ('code', 'layout')
+
+    def __init__(self, code: int, layout: Layout):
+        self.code = code
+        self.layout = layout
+
+    @classmethod
+    def from_tubes(cls, tubes: Sequence[Sequence[Color]], layout: Layout) -> 'PackedState':
+        """RGBタプルの並びから盤面を作る"""
+        for i, tube in enumerate(tubes):
+            if len(tube) > layout.capacity:
+                raise ValueError(f"試験管 {i} に容量（{layout.capacity}）を超える {len(tube)} 個が入っています")
+        intern = layout.colors.intern
+        return cls(layout.pack([[intern(c) for c in tube] for tube in tubes]), layout)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PackedState) and self.code == other.code
+
+    def __hash__(self) -> int:
+        return hash(self.code)
+
+    def __repr__(self) -> str:
+        return f"PackedState({self.tube_ids()})"
+
+    def tube(self, idx: int) -> int:
+        return self.layout.tube(self.code, idx)
+
+    def length(self, idx: int) -> int:
+        return self.layout.length(self.tube(idx))
+
+    def top(self, idx: int) -> int:
+        """一番上の色ID（空なら0）"""
+        value = self.tube(idx)
+        if not value:
+            return 0
+        return value >> ((self.layout.length(value) - 1) * self.layout.bits)
+
+    def top_run(self, idx: int) -> int:
+        """一番上から同じ色が連続している個数"""
+        layout = self.layout
+        value = self.tube(idx)
+        n = layout.length(value)
+        if not n:
+            return 0
+        shift = (n - 1) * layout.bits
+        top = value >> shift
+        run = 1
+        while run < n:
+            shift -= layout.bits
+            if (value >> shift) & layout.slot_mask != top:
+                break
+            run += 1
+        return run
+
+    def is_uniform(self, idx: int) -> bool:
+        """試験管が空でなく単色かどうか"""
+        layout = self.layout
+        value = self.tube(idx)
+        return value != 0 and value == (value & layout.slot_mask) * layout.uniform[layout.length(value)]
+
+    def is_complete(self, idx: int) -> bool:
+        """試験管に同じ色が units_per_color 個そろっているか（容量が同じなら満杯）"""
+        layout = self.layout
+        value = self.tube(idx)
+        return value != 0 and value == (value & layout.slot_mask) * layout.uniform[layout.units_per_color]
+
+    def can_move(self, from_idx: int, to_idx: int) -> bool:
+        """移動可能かどうかを判定"""
+        if from_idx == to_idx:
+            return False
+        layout = self.layout
+        source = self.tube(from_idx)
+        if not source:
+            return False
+        target = self.tube(to_idx)
+        if not target:
+            return True
+        n = layout.length(target)
+        if n >= layout.capacity:
+            return False
+        target_top = target >> ((n - 1) * layout.bits)
+        if target_top == layout.colors.unknown_id:
+            return False
+        return source >> ((layout.length(source) - 1) * layout.bits) == target_top
+
+    def pour_count(self, from_idx: int, to_idx: int) -> int:
+        """並びごと移すときに移る個数（移動可能であることが前提）"""
+        return min(self.top_run(from_idx), self.layout.capacity - self.length(to_idx))
+
+    def pour(self, from_idx: int, to_idx: int) -> 'PackedState':
+        """一番上の同じ色の並びを入るだけ移した新しい盤面を返す（移動可能であることが前提）"""
+        layout = self.layout
+        bits = layout.bits
+        source = self.tube(from_idx)
+        n_from = layout.length(source)
+        n_to = layout.length(self.tube(to_idx))
+        count = min(self.top_run(from_idx), layout.capacity - n_to)
+        run = (source >> ((n_from - 1) * bits)) * layout.uniform[count]
+        code = self.code
+        code -= run << (from_idx * layout.tube_bits + (n_from - count) * bits)
+        code += run << (to_idx * layout.tube_bits + n_to * bits)
+        return PackedState(code, layout)
+
+    def step(self, from_idx: int, to_idx: int) -> 'PackedState':
+        """Layout の規則に従って1手進めた盤面（pour_run なら pour、そうでなければ apply）"""
+        return self.pour(from_idx, to_idx) if self.layout.pour_run else self.apply(from_idx, to_idx)
+
+    def unit_moves(self, moves: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """この盤面から始まる移動手順を1個ずつの移動に展開する（GUI での再生用）"""
+        if not self.layout.pour_run:
+            return list(moves)
+        units = []
+        state = self
+        for from_idx, to_idx in moves:
+            units.extend([(from_idx, to_idx)] * state.pour_count(from_idx, to_idx))
+            state = state.pour(from_idx, to_idx)
+        return units
+
+    def apply(self, from_idx: int, to_idx: int) -> 'PackedState':
+        """一番上の1個を移動した新しい盤面を返す（移動可能であることが前提）"""
+        layout = self.layout
+        bits = layout.bits
+        source = self.tube(from_idx)
+        n_from = layout.length(source)
+        n_to = layout.length(self.tube(to_idx))
+        color = source >> ((n_from - 1) * bits)
+        code = self.code
+        code -= color << (from_idx * layout.tube_bits + (n_from - 1) * bits)
+        code += color << (to_idx * layout.tube_bits + n_to * bits)
+        return PackedState(code, layout)
+
+    def is_solved(self) -> bool:
+        """全ての試験管が空か、完成しているかどうか"""
+        return all(not self.tube(i) or self.is_complete(i) for i in range(self.layout.num_tubes))
+
+    def tube_ids(self) -> List[List[int]]:
+        """色IDのリスト（下から上）の並びに戻す"""
+        layout = self.layout
+        return [layout.units(self.tube(i)) for i in range(layout.num_tubes)]
+
+    def decode(self) -> List[List[Color]]:
+        """RGBタプルのリスト（下から上）の並びに戻す"""
+        colors = self.layout.colors.colors
+        return [[colors[cid] for cid in tube] for tube in self.tube_ids()]
@@ -0,0 +1,345 @@
+"""ハッシュ分散 A*（HDA*）による1問の並列探索
+
+各状態の担当プロセスは正規化キーのハッシュで決まり、各プロセスは担当分の
+未展開リストと到達済みの表だけを持って普通の A* を回す。担当外の子は
+宛先ごとにためておき、宛先プロセスの受信箱（共有メモリ上の固定長レコードの
+並び）へまとめて書き込む。
+
+終了判定: 全プロセスが待機中（未展開がないか、残りがすべて f ≥ 暫定解の手数）で、
+書き込んだレコード数と受け取ったレコード数の合計が一致し、その様子が
+2回続けて変わらなければ、どこにも仕事は残っていない。下界は許容的なので、
+このとき暫定解があればそれが最短手順である。
+"""
+from typing import List, Optional, Sequence, Tuple
+from array import array
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from itertools import count
+from multiprocessing import shared_memory
+import multiprocessing
+import struct
+import time
+from .packed import ColorTable, Layout, PackedState
+from .canonical import _mix, canonicalizer
+from .heuristics import LowerBound
+from .arena import ROOT
+from .pruning import Pruner
+
+# ノード番号は（プロセス番号 << NODE_BITS | プロセス内の番号）
+NODE_BITS = 40
+# 1つの受信箱に入るレコード数
+INBOX_RECORDS = 1 << 14
+# 宛先ごとにこの数たまったら受信箱へ書き込む
+BATCH = 64
+# 受信箱と停止フラグを確認する間隔（展開数）
+EXPAND_BATCH = 64
+# 待機中に眠る秒数
+IDLE_SLEEP = 0.0005
+
+INF = (1 << 62)
+
+# レコードの先頭: 手数, 親ノード, 移動元, 移動先（後ろに盤面の整数が続く）
+_HEADER = struct.Struct('<HqHH')
+_COUNT = struct.Struct('<q')
+
+# 共有カウンタの列（プロセス数ずつ並ぶ）
+_SENT, _RECEIVED, _EXPANDED, _FRONTIER, _VISITED = range(5)
+
+
+@dataclass
+class ParallelResult:
+    solved: bool
+    moves: List[Tuple[int, int]]
+    optimal: bool      # 探索を終えて最短であることまで確かめたか
+    iterations: int    # 全プロセスで展開した状態数
+    frontier: int = 0  # 終了時の未展開の状態数
+    visited: int = 0   # 到達済みの表の大きさの合計
+    workers: int = 1
+
+
+def owner(key: int, workers: int) -> int:
+    """正規化キーの担当プロセス（int のハッシュはプロセス間で同じ値になる）"""
+    return _mix(hash(key)) % workers
+
+
+class _Shared:
+    """プロセス間で共有するもの（fork/spawn どちらでも子へ渡せる）"""
+
+    def __init__(self, ctx, workers: int, record_size: int):
+        self.workers = workers
+        self.record_size = record_size
+        self.inboxes = [shared_memory.SharedMemory(create=True, size=_COUNT.size + INBOX_RECORDS * record_size)
+                        for _ in range(workers)]
+        for shm in self.inboxes:
+            _COUNT.pack_into(shm.buf, 0, 0)
+        self.names = [shm.name for shm in self.inboxes]
+        self.locks = [ctx.Lock() for _ in range(workers)]
+        # 各列は持ち主のプロセスだけが書く
+        self.counters = ctx.Array('q', 5 * workers, lock=False)
+        self.idle = ctx.Array('b', workers, lock=False)
+        self.incumbent = ctx.Array('q', [INF, ROOT], lock=False)  # 暫定解の手数とノード番号
+        self.incumbent_lock = ctx.Lock()
+        self.stop = ctx.Value('b', 0, lock=False)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['inboxes']  # 子では名前から開き直す
+        return state
+
+    def column(self, col: int) -> List[int]:
+        n = self.workers
+        return self.counters[col * n:(col + 1) * n]
+
+    def close(self) -> None:
+        for shm in self.inboxes:
+            shm.close()
+            shm.unlink()
+
+
+class _Worker:
+    """1つのプロセスが担当する分の A*"""
+
+    def __init__(self, index: int, shared: _Shared, spec: tuple):
+        code, colors, num_tubes, capacity, pour_run, units_per_color, pruner, pattern_db = spec
+        self.layout = Layout(num_tubes, ColorTable(colors), capacity, pour_run, units_per_color)
+        self.start = PackedState(code, self.layout)
+        self.successors = pruner.successors
+        self.canonical = canonicalizer(self.layout)
+        self.lower_bound = LowerBound(self.layout)
+        if pattern_db:
+            # 各ワーカーが同じファイルを mmap するので、表のページはプロセス間で共有される
+            from .patterns import load
+            for path in pattern_db:
+                bound = load(path).bound(self.start)
+                if bound is not None:
+                    self.lower_bound = bound
+                    break
+        self.index = index
+        self.shared = shared
+        self.n = shared.workers
+        self.base = index << NODE_BITS
+        self.nbytes = (self.layout.tube_bits * num_tubes + 7) // 8
+        self.inboxes = [shared_memory.SharedMemory(name=name) for name in shared.names]
+        self.outbox: List[List[bytes]] = [[] for _ in range(self.n)]
+        self.heap: list = []
+        self.best_g = {}
+        self.counter = count()
+        # 展開したノードの親と直前の移動（親は他のプロセスのノードのこともある）
+        self.parent = array('q')
+        self.move_from = array('H')
+        self.move_to = array('H')
+        self.best_h, self.best_node = INF, ROOT
+
+    def _column_add(self, col: int, value: int) -> None:
+        self.shared.counters[col * self.n + self.index] += value
+
+    def push(self, code: int, g: int, parent: int, from_tube: int, to_tube: int,
+             state: Optional[PackedState] = None, key: Optional[int] = None) -> None:
+        if key is None:
+            key = self.canonical.key(code)
+        if self.best_g.get(key, g + 1) <= g:
+            return
+        self.best_g[key] = g
+        state = state or PackedState(code, self.layout)
+        h = self.lower_bound(state)
+        if g + h >= self.shared.incumbent[0]:
+            return
+        heappush(self.heap, (g + h, h, next(self.counter), g, key, state, parent, from_tube, to_tube))
+
+    def receive(self) -> int:
+        """受信箱のレコードを自分の未展開リストへ移す"""
+        shm = self.inboxes[self.index]
+        if not _COUNT.unpack_from(shm.buf, 0)[0]:
+            return 0
+        self.shared.idle[self.index] = 0
+        size = self.shared.record_size
+        with self.shared.locks[self.index]:
+            records = _COUNT.unpack_from(shm.buf, 0)[0]
+            data = bytes(shm.buf[_COUNT.size:_COUNT.size + records * size])
+            _COUNT.pack_into(shm.buf, 0, 0)
+        header = _HEADER.size
+        for offset in range(0, len(data), size):
+            g, parent, from_tube, to_tube = _HEADER.unpack_from(data, offset)
+            code = int.from_bytes(data[offset + header:offset + size], 'little')
+            self.push(code, g, parent, from_tube, to_tube)
+        self._column_add(_RECEIVED, records)
+        return records
+
+    def flush(self, dest: int) -> None:
+        """宛先の受信箱へ書けるだけ書く（書いた数は鍵を持ったまま数える）"""
+        batch = self.outbox[dest]
+        size = self.shared.record_size
+        shm = self.inboxes[dest]
+        with self.shared.locks[dest]:
+            records = _COUNT.unpack_from(shm.buf, 0)[0]
+            written = min(len(batch), INBOX_RECORDS - records)
+            if written:
+                offset = _COUNT.size + records * size
+                shm.buf[offset:offset + written * size] = b''.join(batch[:written])
+                _COUNT.pack_into(shm.buf, 0, records + written)
+                self._column_add(_SENT, written)
+        del batch[:written]
+
+    def expand(self) -> None:
+        """未展開リストから EXPAND_BATCH 個まで展開する"""
+        heap = self.heap
+        incumbent = self.shared.incumbent
+        nbytes = self.nbytes
+        expanded = 0
+        while heap and expanded < EXPAND_BATCH and heap[0][0] < incumbent[0]:
+            _, h, _, g, key, state, parent, from_tube, to_tube = heappop(heap)
+            if self.best_g[key] < g:
+                continue
+            node = self.base | len(self.parent)
+            self.parent.append(parent)
+            self.move_from.append(from_tube)
+            self.move_to.append(to_tube)
+            expanded += 1
+            if h < self.best_h:
+                self.best_h, self.best_node = h, node
+            if state.is_solved():
+                with self.shared.incumbent_lock:
+                    if g < incumbent[0]:
+                        incumbent[0], incumbent[1] = g, node
+                continue
+            child_g = g + 1
+            for (f, t), child in self.successors(state, (from_tube, to_tube) if parent != ROOT else None):
+                child_key = self.canonical.key(child.code)
+                dest = owner(child_key, self.n)
+                if dest == self.index:
+                    self.push(child.code, child_g, node, f, t, child, child_key)
+                    continue
+                outbox = self.outbox[dest]
+                outbox.append(_HEADER.pack(child_g, node, f, t) + child.code.to_bytes(nbytes, 'little'))
+                if len(outbox) >= BATCH:
+                    self.flush(dest)
+        self._column_add(_EXPANDED, expanded)
+
+    def run(self) -> None:
+        shared = self.shared
+        index = self.index
+        if owner(self.canonical.key(self.start.code), self.n) == index:
+            self.push(self.start.code, 0, ROOT, 0, 0, self.start)
+        while not shared.stop.value:
+            self.receive()
+            if self.heap and self.heap[0][0] < shared.incumbent[0]:
+                shared.idle[index] = 0
+                self.expand()
+            else:
+                for dest in range(self.n):
+                    if self.outbox[dest]:
+                        self.flush(dest)
+                if not any(self.outbox):
+                    shared.idle[index] = 1
+                    time.sleep(IDLE_SLEEP)
+            shared.counters[_FRONTIER * self.n + index] = len(self.heap)
+            shared.counters[_VISITED * self.n + index] = len(self.best_g)
+
+    def serve(self, conn) -> None:
+        """探索後、親をたどる問い合わせに答える（None で終了）"""
+        conn.send((self.best_h, self.best_node))
+        while True:
+            local = conn.recv()
+            if local is None:
+                break
+            conn.send((self.parent[local], self.move_from[local], self.move_to[local]))
+        for shm in self.inboxes:
+            shm.close()
+
+
+def _run_worker(index: int, shared: _Shared, spec: tuple, conn) -> None:
+    worker = _Worker(index, shared, spec)
+    try:
+        worker.run()
+    finally:
+        worker.serve(conn)
+
+
+def _path(conns, node: int) -> List[Tuple[int, int]]:
+    """各プロセスに親を問い合わせて根からノードまでの移動手順を組み立てる"""
+    moves = []
+    mask = (1 << NODE_BITS) - 1
+    while True:
+        conn = conns[node >> NODE_BITS]
+        conn.send(node & mask)
+        parent, from_tube, to_tube = conn.recv()
+        if parent == ROOT:
+            break
+        moves.append((from_tube, to_tube))
+        node = parent
+    moves.reverse()
+    return moves
+
+
+def hda_star(start: PackedState, workers: int, max_iterations: int = 100000,
+             checkpoint=None, poll: float = 0.001, pruner: Optional[Pruner] = None,
+             pattern_db: Sequence[str] = ()) -> ParallelResult:
+    """workers 個のプロセスで HDA* を行う
+
+    Args:
+        start: 初期状態
+        workers: プロセス数
+        max_iterations: 全プロセスで展開する状態数の上限
+        checkpoint: checkpoint(展開数, 未展開数, 到達済み数) が True を返したら打ち切る
+            （TubeSolver._checkpoint を渡すと進捗の通知と時間制限が効く）
+        pruner: 移動の絞り込み（省略時は Pruner()。経路に依存する規則は使わないこと）
+        poll: 終了判定と上限の確認を行う間隔（秒）
+        pattern_db: 下界に使うパターンデータベースのファイル（patterns.py。形が合わなければ LowerBound）
+    """
+    layout = start.layout
+    ctx = multiprocessing.get_context()
+    record_size = _HEADER.size + (layout.tube_bits * layout.num_tubes + 7) // 8
+    shared = _Shared(ctx, workers, record_size)
+    spec = (start.code, layout.colors.colors[1:], layout.num_tubes, layout.capacity, layout.pour_run,
+            layout.units_per_color, pruner or Pruner(), tuple(pattern_db))
+    conns, processes = [], []
+    try:
+        for index in range(workers):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=_run_worker, args=(index, shared, spec, child_conn), daemon=True)
+            process.start()
+            conns.append(parent_conn)
+            processes.append(process)
+
+        finished = False
+        previous = None
+        while True:
+            time.sleep(poll)
+            iterations = sum(shared.column(_EXPANDED))
+            if iterations >= max_iterations:
+                break
+            if checkpoint is not None and checkpoint(iterations, sum(shared.column(_FRONTIER)),
+                                                     sum(shared.column(_VISITED))):
+                break
+            if not all(shared.idle) or any(not p.is_alive() for p in processes):
+                previous = None
+                if any(not p.is_alive() for p in processes):
+                    raise RuntimeError("探索プロセスが異常終了しました")
+                continue
+            snapshot = (tuple(shared.column(_SENT)), tuple(shared.column(_RECEIVED)))
+            if sum(snapshot[0]) == sum(snapshot[1]) and snapshot == previous:
+                finished = True
+                break
+            previous = snapshot
+        shared.stop.value = 1
+
+        reports = [conn.recv() for conn in conns]
+        cost, node = shared.incumbent[0], shared.incumbent[1]
+        solved = cost < INF
+        if not solved:
+            _, node = min(reports)
+        moves = _path(conns, node) if node != ROOT else []
+        return ParallelResult(solved, moves, solved and finished, sum(shared.column(_EXPANDED)),
+                              sum(shared.column(_FRONTIER)), sum(shared.column(_VISITED)), workers)
+    finally:
+        shared.stop.value = 1
+        for conn in conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        shared.close()
@@ -0,0 +1,487 @@
+"""色の一部だけを見分けるパターンデータベース（許容的な下界）
+
+    python -m src.solver.patterns build pairs.pdb --tubes 13 --colors 11 [--capacity 4] [--tracked 2]
+    python -m src.solver.patterns info pairs.pdb
+
+    solver = TubeSolver(pattern_db="pairs.pdb")
+    solver.solve(state, strategy="astar")
+
+tracked 色（既定は2色）だけを見分け、残りの色を空白（その他の色）とみなした盤面
+（抽象状態）ごとに、完成までに「見分けている色を動かす手数」の最小値を前もって
+求めてファイルに書き出す。空白の移動は0手と数えるので、色を tracked 色ずつの組に
+分けて組ごとの値を足しても実際の手数を超えない（加算的）。組の分け方をずらして
+いくつか試した最大値を、A* などの許容的な下界として使う（PatternBound）。
+
+空白だけの試験管どうしの間では空白を0手で自由に移せるので、見分けている色を含む
+試験管の組（並べ替えを除く）だけで抽象状態を表す（空白だけの試験管の中身は個数の
+合計から決まる）。抽象状態には組合せの数から求める完全な順位を付け、ファイルには
+順位ごとの手数を1バイトずつ並べる。13本・11色・容量4の盤面の2色でおよそ540万状態
+（約8MB）で、作るのには Python で2〜3分かかる。
+
+TubeSolver は読み込み時にファイルを mmap するだけなので、プロセスごとに作り直す
+必要がなく、同じファイルを開いた複数のプロセス（hda_star のワーカーや batch の
+プロセスプール）は OS のページを共有する。データベースは盤面の形（試験管の本数・
+容量・1色あたりの個数・色の数）ごとに作る。形が違う盤面や未知の色がある盤面、
+pour_run の盤面では使わず、heuristics.LowerBound に戻る。
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from collections import Counter, deque
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from .packed import DEFAULT_CAPACITY, PackedState
+
+MAGIC = b"TUBEPDB1"
+# マジック, 試験管の本数, 容量, 1色あたりの個数, 色の数, 見分ける色の数, 試験管の形の数,
+# 個数の表の要素のバイト数, 抽象状態の数
+_HEADER = struct.Struct("<8s7HQ")
+# 完成できない抽象状態の手数
+UNREACHABLE = 255
+# 組の分け方をずらして試す数（多いほど下界は大きく、計算は遅くなる）
+PARTITIONS = 2
+# 試験管ごとのメモの上限
+MAX_TUBE_MEMO = 1 << 18
+# 作るときに進捗を知らせる間隔（抽象状態の数）
+REPORT_EVERY = 100000
+
+Kinds = Tuple[int, ...]  # 見分ける色を含む試験管の形の番号（昇順）
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class _Space:
+    """抽象状態の全体と、その順位の付け方
+
+    見分ける色を 1..tracked、空白を 0 で表し、見分ける色を1個以上含む試験管の
+    中身（下から順の記号の並び）を「形」として番号を付ける。抽象状態は形の番号の
+    昇順の並びで、順位は（形の数 m, それらに入る空白の数 x）ごとの通し番号の
+    先頭 base[m, x] に、並びの辞書順の順位を足したもの。辞書順の順位は
+    counts[n, j, r]（番号 j 以上の形を n 個、資源 r をちょうど使い切る並びの数）の
+    差で求まるので、1本あたり2回表を引くだけで済む。資源 r は（空白の数,
+    見分ける色ごとの個数）を units_per_color + 1 進で1つの整数にしたもの。
+    """
+
+    def __init__(self, num_tubes: int, capacity: int, units_per_color: int, num_colors: int, tracked: int,
+                 counts: Optional[Callable[[int], Sequence[int]]] = None):
+        if not 0 < tracked <= num_colors <= num_tubes:
+            raise ValueError(f"見分ける色の数は1以上、色の数（{num_colors}）以下にしてください: {tracked}")
+        if not 0 < units_per_color <= capacity:
+            raise ValueError(f"1色あたりの個数は1以上、容量（{capacity}）以下にしてください: {units_per_color}")
+        self.num_tubes = num_tubes
+        self.capacity = capacity
+        self.units_per_color = units_per_color
+        self.num_colors = num_colors
+        self.tracked = tracked
+        self.blanks = (num_colors - tracked) * units_per_color
+        self.kinds: List[Tuple[int, ...]] = [
+            kind for length in range(1, capacity + 1) for kind in self._sequences(length)
+            if any(kind) and all(kind.count(c) <= units_per_color for c in range(1, tracked + 1))]
+        self.index: Dict[Tuple[int, ...], int] = {kind: i for i, kind in enumerate(self.kinds)}
+        self.max_mixed = min(num_tubes, tracked * units_per_color)
+        self.max_blanks = min(self.blanks, self.max_mixed * (capacity - 1))
+        radix = units_per_color + 1
+        self.width = radix ** tracked
+        self.num_resources = (self.max_blanks + 1) * self.width
+        self.full = self.width - 1  # 見分ける色が全て units_per_color 個
+        self.cost = [kind.count(0) * self.width + sum(radix ** (s - 1) for s in kind if s) for kind in self.kinds]
+        self.row = (len(self.kinds) + 1) * self.num_resources  # counts の n ごとの大きさ
+        self.counts_length = (self.max_mixed + 1) * self.row
+        # counts を渡さなければ求める。渡すときは counts(表の長さ) で表を返す関数にする
+        self.counts = self._count() if counts is None else counts(self.counts_length)
+        self.base: List[int] = []
+        size = 0
+        for m in range(self.max_mixed + 1):
+            pure = num_tubes - m
+            for x in range(self.max_blanks + 1):
+                self.base.append(size)
+                if 0 <= self.blanks - x <= capacity * pure:
+                    size += self.counts[m * self.row + x * self.width + self.full]
+        self.size = size
+
+    def _sequences(self, length: int) -> Iterator[Tuple[int, ...]]:
+        if not length:
+            yield ()
+            return
+        for head in self._sequences(length - 1):
+            for symbol in range(self.tracked + 1):
+                yield head + (symbol,)
+
+    def _count(self) -> List[int]:
+        """counts[n, j, r] を求める（作るときだけ。読み込むときはファイルの表を使う）"""
+        num_kinds = len(self.kinds)
+        resources = self.num_resources
+        width, radix = self.width, self.units_per_color + 1
+        digits = []
+        for r in range(resources):
+            x, rest = divmod(r, width)
+            digits.append((x,) + tuple(rest // radix ** c % radix for c in range(self.tracked)))
+        kind_digits = [digits[cost] if cost < resources else None for cost in self.cost]
+        counts = [0] * self.counts_length
+        for j in range(num_kinds + 1):
+            counts[j * resources] = 1  # 0個の並びは資源が0のときだけ1通り
+        for n in range(1, self.max_mixed + 1):
+            row, previous = n * self.row, (n - 1) * self.row
+            for j in range(num_kinds - 1, -1, -1):
+                need = kind_digits[j]
+                here, after = row + j * resources, row + (j + 1) * resources
+                cost = self.cost[j]
+                for r in range(resources):
+                    total = counts[after + r]
+                    if need is not None and all(a >= b for a, b in zip(digits[r], need)):
+                        total += counts[previous + j * resources + r - cost]
+                    counts[here + r] = total
+        return counts
+
+    def rank(self, kinds: Kinds) -> int:
+        """昇順の形の並びの順位"""
+        cost = self.cost
+        counts = self.counts
+        resources = self.num_resources
+        r = 0
+        for kind in kinds:
+            r += cost[kind]
+        n = len(kinds)
+        index = self.base[n * (self.max_blanks + 1) + r // self.width]
+        previous = 0
+        for kind in kinds:
+            row = n * self.row + r
+            index += counts[row + previous * resources] - counts[row + kind * resources]
+            r -= cost[kind]
+            previous = kind
+            n -= 1
+        return index
+
+    def sections(self, item_size: int) -> Tuple[int, int, int]:
+        """ファイル上の（個数の表, 手数の表, 全体の大きさ）の位置"""
+        counts = _align(_HEADER.size)
+        dist = _align(counts + self.counts_length * item_size)
+        return counts, dist, dist + self.size
+
+
+class _Builder:
+    """抽象状態の手数を完成形から逆向きの 0-1 BFS で求める"""
+
+    def __init__(self, space: _Space):
+        self.space = space
+        kinds, index, capacity = space.kinds, space.index, space.capacity
+        # pop[k]: 一番上を取り除いた（記号, 残りの形の番号（空なら -1））。順向きの移動で
+        # 載せられなかった形（残りの一番上が別の記号）なら None
+        self.pop: List[Optional[Tuple[int, int]]] = []
+        for kind in kinds:
+            symbol, rest = kind[-1], kind[:-1]
+            if rest and rest[-1] != symbol:
+                self.pop.append(None)
+            else:
+                self.pop.append((symbol, index[rest] if rest else -1))
+        # push[k][s]: 一番上に記号 s を載せた形の番号（載らなければ -1）
+        self.push = [[index.get(kind + (symbol,), -1) if len(kind) < capacity else -1
+                      for symbol in range(space.tracked + 1)] for kind in kinds]
+        # on_pure[h][s]: 空白 h 個の試験管に見分ける色 s を載せた形の番号
+        self.on_pure = [[-1] + [index[(0,) * h + (symbol,)] for symbol in range(1, space.tracked + 1)]
+                        for h in range(capacity)]
+        self.blank_count = [kind.count(0) for kind in kinds]
+
+    def goal(self) -> Kinds:
+        space = self.space
+        if space.blanks > space.capacity * (space.num_tubes - space.tracked):
+            raise ValueError("完成形に空白が入りきりません（色の数に対して試験管が足りません）")
+        return tuple(sorted(space.index[(symbol,) * space.units_per_color]
+                            for symbol in range(1, space.tracked + 1)))
+
+    def predecessors(self, kinds: Kinds) -> Iterator[Tuple[Kinds, int]]:
+        """（1手で kinds になる抽象状態, その手の数え方（見分ける色なら1、空白なら0））"""
+        space = self.space
+        capacity = space.capacity
+        push, on_pure = self.push, self.on_pure
+        pure = space.num_tubes - len(kinds)
+        pure_blanks = space.blanks - sum(self.blank_count[kind] for kind in kinds)
+        tried = set()
+        for b, kind_b in enumerate(kinds):
+            if kind_b in tried or self.pop[kind_b] is None:
+                continue
+            tried.add(kind_b)
+            symbol, rest = self.pop[kind_b]
+            cost = 1 if symbol else 0
+            others = list(kinds[:b] + kinds[b + 1:])
+            # 移動元 a に戻す（b そのものには戻さない）
+            sources = set()
+            for a, kind_a in enumerate(others):
+                if kind_a in sources:
+                    continue
+                sources.add(kind_a)
+                moved = push[kind_a][symbol]
+                if moved >= 0:
+                    previous = others[:]
+                    previous[a] = moved
+                    if rest >= 0:
+                        previous.append(rest)
+                    yield tuple(sorted(previous)), cost
+            if rest >= 0:
+                others.append(rest)
+            # 空白だけの試験管（b 以外の pure 本）に戻す
+            if not pure:
+                continue
+            if symbol:
+                for h in range(min(capacity - 1, pure_blanks) + 1):
+                    if pure_blanks - h <= capacity * (pure - 1):
+                        yield tuple(sorted(others + [on_pure[h][symbol]])), cost
+            elif pure_blanks + 1 <= capacity * pure:
+                yield tuple(sorted(others)), cost
+        # 空白だけの試験管の一番上の空白は、見分ける色を含む試験管から来たかもしれない
+        if pure_blanks:
+            tried.clear()
+            for a, kind_a in enumerate(kinds):
+                if kind_a in tried:
+                    continue
+                tried.add(kind_a)
+                moved = push[kind_a][0]
+                if moved >= 0:
+                    yield tuple(sorted(kinds[:a] + (moved,) + kinds[a + 1:])), 0
+
+    def run(self, report: Optional[Callable[[int, int], None]] = None) -> bytearray:
+        """順位ごとの手数の表（完成できない抽象状態は UNREACHABLE）"""
+        space = self.space
+        rank = space.rank
+        dist = bytearray([UNREACHABLE]) * space.size
+        goal = self.goal()
+        start = rank(goal)
+        dist[start] = 0
+        queue = deque([(goal, start, 0)])
+        done = 0
+        while queue:
+            kinds, index, d = queue.popleft()
+            if dist[index] != d:  # より短い手数で取り出し済み
+                continue
+            done += 1
+            if report is not None and not done % REPORT_EVERY:
+                report(done, d)
+            for previous, cost in self.predecessors(kinds):
+                index = rank(previous)
+                if d + cost < dist[index]:
+                    if d + cost >= UNREACHABLE:
+                        raise ValueError("手数が1バイトに収まりません")
+                    dist[index] = d + cost
+                    if cost:
+                        queue.append((previous, index, d + cost))
+                    else:
+                        queue.appendleft((previous, index, d))
+        return dist
+
+
+def build(path: str, num_tubes: int, num_colors: int, capacity: int = DEFAULT_CAPACITY,
+          units_per_color: Optional[int] = None, tracked: int = 2,
+          report: Optional[Callable[[int, int], None]] = None) -> 'PatternDatabase':
+    """パターンデータベースを作って path に書き出し、読み込んだものを返す
+
+    report(求めた抽象状態の数, 今の手数) を REPORT_EVERY 状態ごとに呼ぶ。
+    """
+    units_per_color = capacity if units_per_color is None else units_per_color
+    space = _Space(num_tubes, capacity, units_per_color, num_colors, tracked)
+    dist = _Builder(space).run(report)
+    item_size = 4 if max(space.counts) < 1 << 32 else 8
+    counts_at, dist_at, end = space.sections(item_size)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, num_tubes, capacity, units_per_color, num_colors, tracked, len(space.kinds),
+                             item_size, space.size))
+        f.write(bytes(counts_at - _HEADER.size))
+        f.write(struct.pack(f"<{len(space.counts)}{'I' if item_size == 4 else 'Q'}", *space.counts))
+        f.write(bytes(dist_at - f.tell()))
+        f.write(dist)
+    os.replace(temporary, path)
+    return load(path)
+
+
+class PatternDatabase:
+    """mmap したパターンデータベースのファイル（load で開く）"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_tubes, capacity, units_per_color, num_colors, tracked, num_kinds, item_size, size = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"パターンデータベースのファイルではありません: {path}")
+        self.num_tubes = num_tubes
+        self.capacity = capacity
+        self.units_per_color = units_per_color
+        self.num_colors = num_colors
+        self.tracked = tracked
+        view = memoryview(self._mmap)
+        counts_at = _align(_HEADER.size)
+        if len(view) < counts_at:
+            raise ValueError(f"パターンデータベースのファイルが壊れています: {path}")
+
+        def counts(length):
+            return view[counts_at:counts_at + length * item_size].cast("I" if item_size == 4 else "Q")
+
+        self.space = _Space(num_tubes, capacity, units_per_color, num_colors, tracked, counts)
+        _, dist_at, end = self.space.sections(item_size)
+        if len(self.space.kinds) != num_kinds or self.space.size != size or len(view) != end:
+            raise ValueError(f"パターンデータベースのファイルが壊れています: {path}")
+        self.dist = view[dist_at:end]
+
+    def __len__(self) -> int:
+        return self.space.size
+
+    def lookup(self, kinds: Kinds) -> int:
+        """抽象状態（昇順の形の番号）の手数"""
+        return self.dist[self.space.rank(kinds)]
+
+    def matches(self, state: PackedState) -> bool:
+        """盤面の形と色の組がこのデータベースを作ったときと同じか"""
+        layout = state.layout
+        if layout.pour_run or (layout.num_tubes, layout.capacity, layout.units_per_color) != \
+                (self.num_tubes, self.capacity, self.units_per_color):
+            return False
+        totals: Dict[int, int] = {}
+        for tube in state.tube_ids():
+            for cid in tube:
+                totals[cid] = totals.get(cid, 0) + 1
+        return layout.colors.unknown_id not in totals and len(totals) == self.num_colors \
+            and all(total == self.units_per_color for total in totals.values())
+
+    def bound(self, state: PackedState) -> Optional['PatternBound']:
+        """state と同じ色の組の盤面の下界（使えない盤面なら None）"""
+        if not self.matches(state):
+            return None
+        return PatternBound(self, sorted({cid for tube in state.tube_ids() for cid in tube}))
+
+
+# 開いたデータベース（パスごとに1つだけ mmap する）
+_loaded: Dict[str, PatternDatabase] = {}
+
+
+def load(path: str) -> PatternDatabase:
+    """パターンデータベースを開く（同じプロセスで同じファイルは使い回す）"""
+    key = os.path.abspath(path)
+    database = _loaded.get(key)
+    if database is None:
+        database = _loaded[key] = PatternDatabase(key)
+    return database
+
+
+class PatternBound:
+    """色を tracked 色ずつの組に分けて引いた手数の和の、分け方 PARTITIONS 通りの最大値
+
+    heuristics.LowerBound と同じく bound(state) で呼ぶ。色の番号順の並びを1つずつ
+    ずらしてから tracked 色ずつに区切り、区切りきれずに余った色は
+    （その色の個数 − 一番長い底の並び）を足す（LowerBound の色ごとの項と同じ）。
+    抽象状態の手数はこの項の和以上なので、LowerBound より小さくはならない。
+    """
+    __slots__ = ('database', 'colors', 'partitions', '_tubes')
+
+    def __init__(self, database: PatternDatabase, colors: Sequence[int]):
+        self.database = database
+        self.colors = list(colors)
+        tracked = database.tracked
+        # 分け方ごとの（色 → （組の番号, 記号）, 余った色）
+        self.partitions: List[Tuple[Dict[int, Tuple[int, int]], List[int]]] = []
+        # 区切りの位置が変わるのは tracked 通りまで
+        for offset in range(min(PARTITIONS, tracked) if tracked < len(self.colors) else 1):
+            order = self.colors[offset:] + self.colors[:offset]
+            grouped = len(order) - len(order) % tracked
+            symbols = {cid: (i // tracked, i % tracked + 1) for i, cid in enumerate(order[:grouped])}
+            self.partitions.append((symbols, order[grouped:]))
+        self._tubes: Dict[int, tuple] = {}
+
+    def _tube_info(self, value: int, layout) -> tuple:
+        """スロット値から（底の色, 底の並びの長さ, 分け方ごとの（組の番号, 形の番号）の並び）を求める"""
+        units = layout.units(value)
+        run = 0
+        while run < len(units) and units[run] == units[0]:
+            run += 1
+        index = self.database.space.index
+        per_partition = []
+        for symbols, _ in self.partitions:
+            kinds = []
+            for group in sorted({symbols[cid][0] for cid in units if cid in symbols}):
+                kind = tuple(symbols[cid][1] if cid in symbols and symbols[cid][0] == group else 0 for cid in units)
+                kinds.append((group, index[kind]))
+            per_partition.append(tuple(kinds))
+        if len(self._tubes) >= MAX_TUBE_MEMO:
+            self._tubes.clear()
+        info = self._tubes[value] = (units[0], run, tuple(per_partition))
+        return info
+
+    def __call__(self, state: PackedState) -> int:
+        layout = state.layout
+        code = state.code
+        mask = layout.tube_mask
+        tube_bits = layout.tube_bits
+        tubes = self._tubes
+        infos = []
+        run_max: Dict[int, int] = {}
+        for _ in range(layout.num_tubes):
+            value = code & mask
+            code >>= tube_bits
+            if not value:
+                continue
+            info = tubes.get(value) or self._tube_info(value, layout)
+            infos.append(info)
+            if info[1] > run_max.get(info[0], 0):
+                run_max[info[0]] = info[1]
+        database = self.database
+        units = database.units_per_color
+        best = 0
+        for p, (symbols, rest) in enumerate(self.partitions):
+            groups: Dict[int, List[int]] = {}
+            for info in infos:
+                for group, kind in info[2][p]:
+                    groups.setdefault(group, []).append(kind)
+            total = sum(units - run_max.get(cid, 0) for cid in rest)
+            for group, kinds in groups.items():
+                kinds.sort()
+                moves = database.lookup(tuple(kinds))
+                if moves == UNREACHABLE:  # 完成できない（実際の盤面も解けない）。許容的な値に戻す
+                    moves = sum(units - run_max.get(cid, 0) for cid, (g, _) in symbols.items() if g == group)
+                total += moves
+            if total > best:
+                best = total
+        return best
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.solver.patterns", description="パターンデータベースを作る")
+    commands = parser.add_subparsers(dest="command", required=True)
+    make = commands.add_parser("build", help="作ってファイルに書き出す")
+    make.add_argument("path", help="書き出すファイル")
+    make.add_argument("--tubes", type=int, required=True, help="試験管の本数")
+    make.add_argument("--colors", type=int, required=True, help="色の数")
+    make.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="試験管の容量")
+    make.add_argument("--units-per-color", type=int, help="1色あたりの個数（省略時は容量と同じ）")
+    make.add_argument("--tracked", type=int, default=2, help="見分ける色の数")
+    info = commands.add_parser("info", help="ファイルの中身を表示する")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+
+        def report(done, depth):
+            print(f"[{time.perf_counter() - started:7.1f}s] {done:,d} 状態 手数 {depth}", file=sys.stderr)
+
+        database = build(args.path, args.tubes, args.colors, args.capacity, args.units_per_color, args.tracked,
+                         report)
+        print(f"{len(database):,d} 状態を {args.path} に書き出しました（{time.perf_counter() - started:.1f}秒）",
+              file=sys.stderr)
+    else:
+        database = load(args.path)
+    histogram = Counter(database.dist)
+    print(f"試験管 {database.num_tubes} 本, 容量 {database.capacity}, 1色 {database.units_per_color} 個, "
+          f"{database.num_colors} 色のうち {database.tracked} 色を見分ける: {len(database):,d} 状態, "
+          f"{os.path.getsize(database.path):,d} バイト")
+    for moves in sorted(histogram):
+        label = "完成できない" if moves == UNREACHABLE else f"{moves:3d} 手"
+        print(f"  {label}: {histogram[moves]:,d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
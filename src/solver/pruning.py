@@ -0,0 +1,156 @@
+from typing import Iterator, List, Optional, Tuple
+from .packed import PackedState
+
+Move = Tuple[int, int]
+
+
+class Pruner:
+    """探索で展開する移動を絞り込む
+
+    常に除く移動（従来どおり）:
+      - 空の試験管や完成した（同じ色が Layout.units_per_color 個そろった）試験管からの移動
+      - 2本目以降の空の試験管への移動（1本目への移動と同じ状態になる）
+
+    規則ごとに切り替えられるもの:
+      inverse:          直前の移動をそのまま戻す移動（祖父の状態に戻るだけ。並びごと移す
+                        規則でも、祖父の状態から1手で行ける状態にしかならない）
+      uniform_to_empty: 単色の試験管から空の試験管への移動（同じ色が2本に分かれる
+                        だけで、空の試験管を失う分だけ不利になる）
+      commuting:        直前の移動と試験管が重ならない移動は、(移動元, 移動先) の
+                        順が直前より後のものだけにする（入れ替えても同じ状態になる
+                        2手の順番を1通りに決める）
+      dead_ends:        上の規則で残る移動が1つもない未完成の状態を子として返さない
+
+    commuting は経路に依存する規則なので、状態の重複除去と組み合わせると
+    最短手順を落とし得る。最短性を保証する探索では使わないこと。
+    dead_ends は行き止まりが少ないパズルでは判定の手間の方が大きいので既定では使わない。
+    """
+    __slots__ = ('inverse', 'uniform_to_empty', 'commuting', 'dead_ends')
+
+    def __init__(self, inverse: bool = True, uniform_to_empty: bool = True, commuting: bool = False,
+                 dead_ends: bool = False):
+        self.inverse = inverse
+        self.uniform_to_empty = uniform_to_empty
+        self.commuting = commuting
+        self.dead_ends = dead_ends
+
+    @classmethod
+    def disabled(cls) -> 'Pruner':
+        """従来どおりの最小限の絞り込みだけを行う"""
+        return cls(inverse=False, uniform_to_empty=False, commuting=False, dead_ends=False)
+
+    def is_redundant(self, state: PackedState, last: Optional[Move], move: Move) -> bool:
+        """state で move を指すのが無駄かどうか（last は state に至った直前の移動）"""
+        from_tube, to_tube = move
+        if not state.tube(to_tube):
+            if any(not state.tube(i) for i in range(to_tube)):
+                return True
+            if self.uniform_to_empty and state.is_uniform(from_tube) \
+                    and state.top(from_tube) != state.layout.colors.unknown_id:
+                return True
+        if last is not None:
+            if self.inverse and last == (to_tube, from_tube):
+                return True
+            if self.commuting and move < last and from_tube not in last and to_tube not in last:
+                return True
+        return False
+
+    @staticmethod
+    def _tables(state: PackedState) -> Tuple[List[int], List[int], List[bool]]:
+        """試験管ごとの（長さ, 一番上の色ID, 単色か）"""
+        layout = state.layout
+        lengths, tops, uniform = [], [], []
+        code = state.code
+        for _ in range(layout.num_tubes):
+            value = code & layout.tube_mask
+            code >>= layout.tube_bits
+            n = layout.length(value)
+            lengths.append(n)
+            tops.append(value >> ((n - 1) * layout.bits) if n else 0)
+            uniform.append(n > 0 and value == (value & layout.slot_mask) * layout.uniform[n])
+        return lengths, tops, uniform
+
+    def _moves(self, lengths: List[int], tops: List[int], uniform: List[bool], capacity: int, complete: int,
+               unknown_id: int, last: Optional[Move], commuting: bool) -> Iterator[Move]:
+        num_tubes = len(lengths)
+        first_empty = lengths.index(0) if 0 in lengths else -1
+        inverse = self.inverse and last is not None
+        commuting = commuting and last is not None
+        uniform_to_empty = self.uniform_to_empty
+
+        for from_tube in range(num_tubes):
+            n = lengths[from_tube]
+            if not n or (n == complete and uniform[from_tube]):
+                continue
+            color = tops[from_tube]
+            for to_tube in range(num_tubes):
+                if to_tube == from_tube:
+                    continue
+                if not lengths[to_tube]:
+                    if to_tube != first_empty:
+                        continue
+                    if uniform_to_empty and uniform[from_tube] and color != unknown_id:
+                        continue
+                elif lengths[to_tube] >= capacity or tops[to_tube] != color or color == unknown_id:
+                    continue
+                if inverse and last[0] == to_tube and last[1] == from_tube:
+                    continue
+                if commuting and (from_tube, to_tube) < last \
+                        and from_tube not in last and to_tube not in last:
+                    continue
+                yield from_tube, to_tube
+
+    def moves(self, state: PackedState, last: Optional[Move] = None) -> Iterator[Move]:
+        """合法で無駄でない移動を列挙する（last は state に至った直前の移動）"""
+        layout = state.layout
+        return self._moves(*self._tables(state), layout.capacity, layout.units_per_color, layout.colors.unknown_id,
+                           last, self.commuting)
+
+    def is_dead_end(self, state: PackedState, last: Optional[Move] = None) -> bool:
+        """未完成なのに、経路によらない規則で残る移動が1つもないか"""
+        if not self.dead_ends or state.is_solved():
+            return False
+        layout = state.layout
+        for _ in self._moves(*self._tables(state), layout.capacity, layout.units_per_color, layout.colors.unknown_id,
+                             last, False):
+            return False
+        return True
+
+    def successors(self, state: PackedState, last: Optional[Move] = None) -> Iterator[Tuple[Move, PackedState]]:
+        """（移動, 移動後の状態）を列挙する。行き止まりの子は返さない
+
+        子は Layout の規則（PackedState.step）で作る。
+        行き止まりの判定では、空の試験管があって単色でない試験管が2本以上あれば
+        （直前の移動を戻す以外に空の試験管へ移せるので）移動が残る。そうでないときだけ、
+        親の表から移動で変わる2本を書き換えた子の表で確かめる。
+        """
+        layout = state.layout
+        capacity = layout.capacity
+        complete = layout.units_per_color
+        unknown_id = layout.colors.unknown_id
+        lengths, tops, uniform = self._tables(state)
+        empties = lengths.count(0)
+        mixed = uniform.count(False) - empties
+        for move in self._moves(lengths, tops, uniform, capacity, complete, unknown_id, last, self.commuting):
+            child = state.step(*move)
+            if self.dead_ends:
+                from_tube, to_tube = move
+                moved = lengths[from_tube] - child.length(from_tube)
+                # 移動先が単色かどうかは変わらず、移動元は単色か空になり得る
+                child_empties = empties - (not lengths[to_tube]) + (lengths[from_tube] == moved)
+                if child_empties and mixed - (not uniform[from_tube]) >= 2:
+                    yield move, child
+                    continue
+                child_lengths, child_tops, child_uniform = lengths[:], tops[:], uniform[:]
+                color = tops[from_tube]
+                n = child_lengths[from_tube] = lengths[from_tube] - moved
+                child_tops[from_tube] = child.top(from_tube) if n else 0
+                child_uniform[from_tube] = n > 0 and (uniform[from_tube] or child.is_uniform(from_tube))
+                child_lengths[to_tube] = lengths[to_tube] + moved
+                child_tops[to_tube] = color
+                child_uniform[to_tube] = uniform[to_tube] or not lengths[to_tube]
+                remaining = self._moves(child_lengths, child_tops, child_uniform, capacity, complete, unknown_id,
+                                        move, False)
+                if next(remaining, None) is None and not child.is_solved():
+                    continue
+            yield move, child
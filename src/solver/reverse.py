@@ -0,0 +1,78 @@
+"""完成した盤面から逆向きにたどるための移動の生成
+
+双方向探索（TubeSolver の strategy="bidirectional"）で、完成形の側から
+探索するのに使う。predecessors(state) は「1手で state になる盤面」と
+その1手（順向きの (移動元, 移動先)）を列挙する。
+"""
+from typing import Iterator, Optional, Tuple
+from .packed import PackedState
+
+Move = Tuple[int, int]
+
+
+def goal_state(start: PackedState) -> Optional[PackedState]:
+    """start と同じ色の組で、各色が1本ずつにそろった完成形（作れなければ None）
+
+    完成形は試験管の並べ替えを除いて1通りなので、正規化キーで比べれば
+    どの完成形とも一致する。不明な色がある盤面や、色の個数が units_per_color と
+    違う盤面、色の数が試験管の本数より多い盤面では作れない。
+    """
+    layout = start.layout
+    totals = {}
+    for tube in start.tube_ids():
+        for cid in tube:
+            totals[cid] = totals.get(cid, 0) + 1
+    if layout.colors.unknown_id in totals or len(totals) > layout.num_tubes \
+            or any(total != layout.units_per_color for total in totals.values()):
+        return None
+    tubes = [[cid] * layout.units_per_color for cid in sorted(totals)]
+    tubes += [[] for _ in range(layout.num_tubes - len(tubes))]
+    return PackedState(layout.pack(tubes), layout)
+
+
+def predecessors(state: PackedState) -> Iterator[Tuple[Move, PackedState]]:
+    """（移動, 移動前の盤面）を列挙する。移動前の盤面.step(*移動) == state になる
+
+    順向きの移動 (b, a) を戻すには、a の一番上から色 c を取り除いて b に載せる。
+    順向きで a に載せられたので、取り除いたあとの a は空か一番上が c のはず
+    （1個ずつ移す規則なら a の一番上の並びが2個以上か、a が1個だけ）。
+    並びごと移す規則（Layout.pour_run）では k 個まとめて戻し、順向きの pour で
+    ちょうど k 個移ることも確かめる（b の一番上も c なら、a が満杯で止まったときだけ）。
+    完成した試験管からの移動（順向きの探索では展開しない）になるものは返さない。
+    移動前の b が空でない盤面どうしは試験管の並べ替えで同じになるので、
+    空の b へ戻すのは1本目の空の試験管だけにする。
+    """
+    layout = state.layout
+    num_tubes = layout.num_tubes
+    capacity = layout.capacity
+    bits = layout.bits
+    lengths = [state.length(i) for i in range(num_tubes)]
+    tops = [state.top(i) for i in range(num_tubes)]
+    runs = [state.top_run(i) for i in range(num_tubes)]
+    first_empty = lengths.index(0) if 0 in lengths else -1
+    pour_run = layout.pour_run
+
+    for a in range(num_tubes):
+        n_a = lengths[a]
+        if not n_a:
+            continue
+        color, run = tops[a], runs[a]
+        if pour_run:
+            # 並びの一部を戻すか、a が並びだけなら全部戻す
+            counts = range(1, run + 1 if run == n_a else run)
+        else:
+            counts = (1,) if run >= 2 or n_a == 1 else ()
+        for k in counts:
+            removed = color * layout.uniform[k]
+            for b in range(num_tubes):
+                n_b = lengths[b]
+                if b == a or n_b + k > capacity or (not n_b and b != first_empty):
+                    continue
+                if pour_run and n_b and tops[b] == color and n_a != capacity:
+                    continue
+                code = state.code - (removed << (a * layout.tube_bits + (n_a - k) * bits))
+                code += removed << (b * layout.tube_bits + n_b * bits)
+                previous = PackedState(code, layout)
+                if previous.is_complete(b):
+                    continue
+                yield (b, a), previous
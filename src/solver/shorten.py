@@ -0,0 +1,139 @@
+"""見つけた手順を短くする後処理
+
+    from src.solver.shorten import shorten
+
+    moves = shorten(state, moves)
+
+dfs などで見つけた手順には、往復や後で打ち消される移動、空の試験管を経由する
+回り道が多く含まれる。shorten は次の2つを繰り返して手順を短くする。
+
+1. 循環の除去: 手順を再生し、同じ正規化キーの盤面が後でもう一度現れたら
+   最後に現れたところまで飛ぶ（正規化キーが同じ盤面どうしは試験管の並べ替えと
+   色の付け替えで移り合うので、飛んだ先の手順は試験管番号を付け替えて続ける）。
+2. 区間の解き直し: 長さ window の区間ごとに、区間の始めの盤面から終わりの盤面
+   （と同じ正規化キーの盤面）までの最短手順を、両側から幅優先で広げる
+   探索（状態数 max_states まで）で求め、短ければ置き換える。
+
+返す手順は元の手順と同じく初期状態から完成形に至る（完成形の試験管の並びは
+変わることがある）。短くできなければ元の手順をそのまま返す。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from .canonical import canonicalizer
+from .packed import PackedState
+from .pruning import Pruner
+from .reverse import predecessors
+from .state import TubeState
+
+Move = Tuple[int, int]
+
+
+def _replay(start: PackedState, moves: Sequence[Move]) -> List[PackedState]:
+    states = [start]
+    for from_tube, to_tube in moves:
+        states.append(states[-1].step(from_tube, to_tube))
+    return states
+
+
+def _tube_map(canonical, source: PackedState, target: PackedState) -> List[int]:
+    """同じ正規化キーの2つの盤面で、source の試験管番号 → target の試験管番号"""
+    target_order = canonical.form(target.code)[1]
+    tube_map = [0] * source.layout.num_tubes
+    for j, tube in enumerate(canonical.form(source.code)[1]):
+        tube_map[tube] = target_order[j]
+    return tube_map
+
+
+def _relabel(canonical, source: PackedState, target: PackedState, moves: Sequence[Move]) -> List[Move]:
+    """source から始まる手順を、同じ正規化キーの target の試験管番号に付け替える"""
+    tube_map = _tube_map(canonical, source, target)
+    return [(tube_map[from_tube], tube_map[to_tube]) for from_tube, to_tube in moves]
+
+
+def remove_cycles(start: PackedState, moves: Sequence[Move]) -> List[Move]:
+    """同じ正規化キーの盤面が再び現れる区間を取り除いた手順"""
+    canonical = canonicalizer(start.layout)
+    states = _replay(start, moves)
+    keys = [canonical.key(state.code) for state in states]
+    last = {key: i for i, key in enumerate(keys)}
+    result: List[Move] = []
+    current = start
+    # 今の盤面 current は states[i] と同じ正規化キー。飛んだあとは試験管番号の対応を
+    # tube_map に持つ（同じ移動を続ける間は対応も変わらない）
+    i = last[keys[0]]
+    tube_map = _tube_map(canonical, states[i], current) if i else None
+    while i < len(moves):
+        from_tube, to_tube = moves[i]
+        move = (from_tube, to_tube) if tube_map is None else (tube_map[from_tube], tube_map[to_tube])
+        result.append(move)
+        current = current.step(*move)
+        j = last[keys[i + 1]]
+        if j != i + 1:
+            tube_map = _tube_map(canonical, states[j], current)
+        i = j
+    return result
+
+
+def _bridge(start: PackedState, goal: PackedState, limit: int, max_states: int,
+            pruner: Pruner) -> Optional[Tuple[List[Move], PackedState]]:
+    """start から goal と同じ正規化キーの盤面までの limit 手以下の最短手順とその盤面（なければ None）"""
+    canonical = canonicalizer(start.layout)
+    forward: Dict[int, Tuple[PackedState, List[Move]]] = {canonical.key(start.code): (start, [])}
+    backward: Dict[int, Tuple[PackedState, List[Move]]] = {canonical.key(goal.code): (goal, [])}
+    if next(iter(backward)) in forward:
+        return [], start
+    layers = ([start], [goal])
+    depths = [0, 0]
+    while depths[0] + depths[1] < limit and len(forward) + len(backward) < max_states:
+        side = 0 if len(layers[0]) <= len(layers[1]) else 1
+        own, other = (forward, backward)[side], (backward, forward)[side]
+        next_layer = []
+        meeting = None
+        for state in layers[side]:
+            path = own[canonical.key(state.code)][1]
+            steps = pruner.successors(state, path[-1] if path else None) if side == 0 else predecessors(state)
+            for move, child in steps:
+                key = canonical.key(child.code)
+                if key in own:
+                    continue
+                # 完成形の側の手順は、その盤面から goal までの順向きの手順
+                child_path = path + [move] if side == 0 else [move] + path
+                own[key] = (child, child_path)
+                next_layer.append(child)
+                if key in other and (meeting is None or len(child_path) + len(other[key][1]) < meeting[0]):
+                    meeting = (len(child_path) + len(other[key][1]), key)
+        depths[side] += 1
+        if meeting is not None:
+            (middle, head), (joint, tail) = forward[meeting[1]], backward[meeting[1]]
+            moves = head + _relabel(canonical, joint, middle, tail)
+            return moves, _replay(start, moves)[-1]
+        if not next_layer:
+            return None
+        layers = (next_layer, layers[1]) if side == 0 else (layers[0], next_layer)
+    return None
+
+
+def shorten(state: Union[TubeState, PackedState], moves: Sequence[Move], window: int = 6,
+            max_states: int = 1000) -> List[Move]:
+    """state から完成形に至る手順 moves を短くした手順（短くできなければ moves のまま）
+
+    Args:
+        state: 初期状態（TubeState なら packed を使う）
+        moves: state から完成形に至る移動手順
+        window: 解き直す区間の手数
+        max_states: 区間ごとの探索で記録する状態数の上限
+    """
+    start = state.packed if isinstance(state, TubeState) else state
+    canonical = canonicalizer(start.layout)
+    pruner = Pruner()
+    best = remove_cycles(start, moves)
+    i = 0
+    while i + 1 < len(best):
+        states = _replay(start, best)
+        end = min(i + window, len(best))
+        bridge = _bridge(states[i], states[end], end - i - 1, max_states, pruner)
+        if bridge is None:
+            i += 1
+            continue
+        path, reached = bridge
+        best = remove_cycles(start, best[:i] + path + _relabel(canonical, states[end], reached, best[end:]))
+    return best if len(best) < len(moves) else list(moves)
@@ -1,208 +1,994 @@
-from typing import List, Tuple, Dict, Set, Optional
-from queue import PriorityQueue
-from collections import defaultdict
-from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, List, Sequence, Tuple, Dict, Set, Optional, Union
+from heapq import heappop, heappush, nlargest
+from functools import partial
+from itertools import count
+from operator import itemgetter
 from .state import TubeState
-import random
+from .packed import Layout, PackedState
+from .canonical import canonicalizer
+from .heuristics import Evaluator, LowerBound
+from .events import CHECK_EVERY, Progress, ProgressCallback
+from .arena import ROOT, NodeArena
+from .pruning import Pruner
+from .reverse import goal_state, predecessors
+from .shorten import shorten
+from .instrument import (INSTRUMENT_ENV, PROFILE_ENV, PROFILE_EVERY_ENV, Instrument, Profiler, SolveStats,
+                         env_flag, parse_profile)
+import os
+import time
+
+if TYPE_CHECKING:
+    # parallel（multiprocessing）・store（sqlite3）・closed（mmap）は使う探索のときだけ読み込む
+    from .closed import ClosedSet
+    from .patterns import PatternDatabase
+    from .store import Known, SolutionStore
 
 # 色の定義
 EMPTY = -1
 UNKNOWN = -2
 
-@dataclass(order=True)
-class PrioritizedState:
-    priority: int
-    moves: int = field(compare=False)
-    state: TubeState = field(compare=False)
+# 選択できる探索方法
+STRATEGIES = ("dfs", "best_first", "astar", "ida_star", "beam", "hda_star", "bidirectional", "anytime")
+# 直前の移動と入れ替えられる移動の順番を1通りに決める枝刈りを使う探索方法
+# （最短手順を保証する探索では最短手順を落とし得るため、dfs では遠回りが増えるため使わない）
+COMMUTING_STRATEGIES = ("best_first", "beam")
+# TubeSolver(vectorized=True) で NumPy のまとめた展開を使う探索方法
+VECTORIZED_STRATEGIES = ("best_first", "beam")
+# 最短手順を保証する探索方法（SolutionStore に最短として記録する。anytime は下界が手数に追いついたときだけ）
+OPTIMAL_STRATEGIES = ("astar", "ida_star", "hda_star", "bidirectional", "anytime")
 
 class TubeSolver:
-    def __init__(self):
-        self.seen_states: Set[str] = set()
-        self.eval_cache = {}
+    def __init__(self, beam_width: int = 500, table_size: int = 1 << 20, eval_cache_size: int = 1 << 16,
+                 progress: Optional[ProgressCallback] = None, progress_interval: float = 1.0,
+                 workers: int = 2, prune: Union[bool, Pruner] = True, pour_run: bool = False,
+                 store: Optional['SolutionStore'] = None, memory_limit: Optional[int] = None,
+                 spill_dir: Optional[str] = None, vectorized: bool = False, anytime_weight: float = 3.0,
+                 post_optimize: bool = False, instrument: Optional[bool] = None, profile: Optional[str] = None,
+                 profile_every: Optional[int] = None,
+                 pattern_db: Union[None, str, 'PatternDatabase', Sequence[Union[str, 'PatternDatabase']]] = None):
+        self.seen_states: Set[int] = set()
+        self.eval_cache: Dict[int, int] = {}  # 正規化キー → 深さを除いた評価値
+        self.eval_cache_size = eval_cache_size
+        self.beam_width = beam_width  # ビーム探索で各深さに残す状態数
+        self.table_size = table_size  # IDA* の置換表に記録する状態数の上限
+        self.workers = workers  # HDA* のプロセス数
+        # 移動の枝刈り。True なら探索方法に合わせた Pruner、False なら従来どおりの
+        # 最小限の絞り込みだけ、Pruner を渡すとどの探索方法でもそれを使う
+        self.prune = prune
+        self._pruner = prune if isinstance(prune, Pruner) else Pruner() if prune else Pruner.disabled()
+        # True なら一番上の同じ色の並びを1手でまとめて移す規則で解く（移動手順も並び単位になる）
+        self.pour_run = pour_run
+        self._run_layout: Optional[Tuple[Layout, Layout]] = None  # （元の Layout, 並び単位の Layout）
+        self._evaluator: Optional[Evaluator] = None
+        # 解いた結果を実行をまたいで使い回すディスク上の置換表（None なら使わない）
+        self.store = store
+        self._known = None  # 探索中に引く SolutionStore.get（記録がなければ None）
+        # 最短手順を保証する探索で、見つけた手順が最短と確かめられたか（確かめた探索だけが True にする）
+        self._proven = False
+        # dfs, best_first, beam の記録済みの状態の集合に使うメモリの目安（バイト）。
+        # 超えた分は spill_dir の一時ファイルへ書き出す（None なら普通の set で上限なし）
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self._closed_sets: List['ClosedSet'] = []
+        # True なら best_first と beam で先端の状態を NumPy の配列でまとめて展開する（vectorized.py）
+        self.vectorized = vectorized
+        # anytime で最初の解を急ぐための下界の重み（f = g + anytime_weight * h）
+        self.anytime_weight = anytime_weight
+        self.bound: Optional[int] = None  # 直前の anytime の探索で分かった最短手数の下界（それ以外は None）
+        # True なら最短手順を保証しない探索で解けた手順を shorten.shorten で短くしてから返す
+        self.post_optimize = post_optimize
+        self._shorten_from: Optional[PackedState] = None  # 短くする手順の初期状態（短くしないなら None）
+        # 最短手順を保証する探索の下界に使うパターンデータベース（patterns.py。パスか、
+        # 形の違う盤面用に複数）。作成時に mmap で開き、盤面の形が合うものがなければ LowerBound を使う
+        self.pattern_db: Tuple['PatternDatabase', ...] = ()
+        if pattern_db is not None:
+            from .patterns import load
+            databases = pattern_db if isinstance(pattern_db, (list, tuple)) else [pattern_db]
+            self.pattern_db = tuple(load(db) if isinstance(db, str) else db for db in databases)
+        # 進捗の通知先（None なら何も出力しない）
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self._progress: Optional[Progress] = None
+        self._deadline: Optional[float] = None
+        # True なら探索の内側の処理ごとの回数と時間を数える（instrument.py。省略時は環境変数
+        # TUBE_SOLVER_INSTRUMENT）。profile は "cprofile" / "tracemalloc" のカンマ区切り
+        # （省略時は TUBE_SOLVER_PROFILE）で、profile_every 回に1回の探索を測る
+        self.instrument = env_flag(INSTRUMENT_ENV) if instrument is None else instrument
+        self.profile = parse_profile(os.environ.get(PROFILE_ENV) if profile is None else profile)
+        self.profile_every = profile_every or int(os.environ.get(PROFILE_EVERY_ENV) or 1)
+        self._solves = 0  # これまでの探索の回数（profile_every に使う）
+        self.stats: Optional[SolveStats] = None  # 直前の探索の統計
+        self._instrument: Optional[Instrument] = None
+        self._started = 0.0
         
-    def solve(self, initial_state, max_iterations=100000):
-        """パズルを解く"""
+    def solve(self, initial_state, max_iterations=100000, strategy="dfs", time_limit=None):
+        """パズルを解く
+
+        Args:
+            initial_state: 初期状態の TubeState
+            max_iterations: 展開する状態数の上限
+            strategy: 探索方法
+                "dfs": 深さ優先探索（従来の動作）
+                "best_first": 評価値の高い状態から展開する最良優先探索
+                "astar": 許容的な下界を使う A*（最短手順）
+                "ida_star": 反復深化 A*（最短手順、省メモリ）
+                "beam": 各深さで評価値の上位 beam_width 個だけを残すビーム探索
+                "hda_star": workers 個のプロセスで状態を分担する並列 A*（最短手順）
+                "bidirectional": 初期状態と完成形の両側からの幅優先探索（最短手順）
+                "anytime": 重み付き A* で早く解を見つけ、予算の残りで短くし続ける
+                    （max_iterations と time_limit で打ち切り、その時点の最短の解を返す）
+            time_limit: 探索時間の上限（秒）。None なら制限しない。
+
+        Returns:
+            (解けたか, 移動手順, スコア, 色付きの移動手順) のタプル。
+            解けなかった場合は最も良かった途中までの手順を返す。
+            pour_run のとき（初期状態の Layout が pour_run のときも）移動手順は並び単位になる。
+            1個ずつの手順には PackedState.unit_moves で展開できる。
+
+        store があれば、初期状態の記録済みの手順をそのまま返す（最短手順を保証する
+        探索方法では最短と分かっている記録だけ）。記録がなければ探索し、途中で記録済みの
+        状態に着いたらその先の手順をつなげて終える。解けた手順は store に記録する。
+
+        post_optimize なら、最短手順を保証しない探索方法で解けた手順を shorten.shorten で短くしてから返す。
+
+        探索の統計（instrument.SolveStats）を self.stats に残し、SOLVED / FINISHED のイベントにも付ける。
+        instrument なら処理ごとの回数と時間を、profile なら cProfile / tracemalloc の結果も入る。
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知の探索方法です: {strategy}")
+        self.stats = SolveStats(strategy, instrumented=self.instrument)
+        self._started = time.perf_counter()
+        profiling = bool(self.profile) and self._solves % self.profile_every == 0
+        self._solves += 1
+        if not self.instrument and not profiling:
+            return self._solve(initial_state, max_iterations, strategy, time_limit)
+
+        if self.instrument:
+            self._install(Instrument(self.stats))
+        profiler = Profiler(self.profile) if profiling else None
+        try:
+            if profiler is None:
+                return self._solve(initial_state, max_iterations, strategy, time_limit)
+            with profiler:
+                result = self._solve(initial_state, max_iterations, strategy, time_limit)
+            profiler.report(self.stats)
+            return result
+        finally:
+            self._uninstall()
+
+    def _install(self, instrument: Instrument) -> None:
+        """探索が使う呼び出しを、回数と時間を数える包みに差し替える"""
+        self._instrument = instrument
+        self._successors = instrument.timed(self._successors, "expand", lazy=True)
+        self._get_valid_moves = instrument.timed(self._get_valid_moves, "expand")
+        if self._evaluator is not None:
+            self._evaluator = instrument.evaluator(self._evaluator)
+
+    def _uninstall(self) -> None:
+        if self._instrument is None:
+            return
+        self._instrument = None
+        for name in ("_successors", "_get_valid_moves"):
+            self.__dict__.pop(name, None)
+        self._evaluator = getattr(self._evaluator, "_target", self._evaluator)
+
+    def _canonicalizer(self, layout: Layout):
+        """正規化キーの計算（instrument なら回数と時間を数える）"""
+        canonical = canonicalizer(layout)
+        return canonical if self._instrument is None else self._instrument.canonical(canonical)
+
+    def _lower_bound(self, start: PackedState):
+        """start と同じ色の組の盤面の許容的な下界（instrument なら評価の回数と時間に数える）
+
+        形の合うパターンデータベースがあればそれを引き、なければ LowerBound を使う。
+        """
+        for database in self.pattern_db:
+            lower_bound = database.bound(start)
+            if lower_bound is not None:
+                break
+        else:
+            lower_bound = LowerBound(start.layout)
+        return lower_bound if self._instrument is None else self._instrument.timed(lower_bound, "evaluate")
+
+    def _table(self, *args) -> dict:
+        """正規化キーごとの表（instrument なら記録済みの状態に当たった回数を数える）"""
+        return dict(*args) if self._instrument is None else self._instrument.table(*args)
+
+    def _solve(self, initial_state, max_iterations, strategy, time_limit):
+        """solve の本体（統計と計測の準備は solve が行う）"""
+        if self.pour_run and not initial_state.layout.pour_run:
+            initial_state = TubeState.from_packed(self._with_pour_run(initial_state.packed))
+        self._prepare(initial_state.packed)
+        self._progress = Progress(self.progress, self.progress_interval) if self.progress else None
+        self._deadline = time.monotonic() + time_limit if time_limit is not None else None
+        if self.prune is True:
+            self._pruner = Pruner(commuting=strategy in COMMUTING_STRATEGIES)
+        store = self.store
+        self._known = None
+        self._proven = False
+        self.bound = None
+        self._shorten_from = None
+        if self.post_optimize and (strategy not in OPTIMAL_STRATEGIES or strategy == "anytime"):
+            self._shorten_from = initial_state.packed
+        if store is not None:
+            start = initial_state.packed
+            known = store.get(start, touch=True)
+            if known is not None and (known.exact or strategy not in OPTIMAL_STRATEGIES):
+                self._proven = known.exact
+                return self._finish_known(0, start, [], known)
+            if strategy != "hda_star" and store.has_shape(start):
+                self._known = store.get
+        method = f"_solve_{strategy}"
+        if self.vectorized and strategy in VECTORIZED_STRATEGIES:
+            from .vectorized import BatchExpander
+            if BatchExpander.supports(initial_state.layout, self._pruner):
+                method += "_vectorized"
+        try:
+            result = getattr(self, method)(initial_state, max_iterations)
+        finally:
+            for closed in self._closed_sets:
+                closed.close()
+            self._closed_sets.clear()
+        if store is not None and result[0] and result[1]:
+            store.put(initial_state.packed, result[1], strategy in OPTIMAL_STRATEGIES and self._proven)
+        return result
+
+    def _closed_set(self, layout: Layout, key_bytes: Optional[int] = None) -> Union[Set[int], 'ClosedSet']:
+        """記録済みの状態の集合（memory_limit があればメモリの上限を決めた ClosedSet）
+
+        key_bytes はキーを固定幅で書き出すときのバイト数（省略時は正規化キーの幅）。
+        """
+        if self.memory_limit is None:
+            visited = set()
+        else:
+            from .closed import ClosedSet
+            visited = ClosedSet(key_bytes or layout.num_tubes * layout.capacity, self.memory_limit, self.spill_dir)
+            self._closed_sets.append(visited)
+        return visited if self._instrument is None else self._instrument.visited(visited)
+
+    def _with_pour_run(self, state: PackedState) -> PackedState:
+        """同じ盤面を並び単位の規則の Layout に載せ替える（同じ Layout からは同じものを使い回す）"""
+        if self._run_layout is None or self._run_layout[0] is not state.layout:
+            layout = state.layout
+            self._run_layout = (layout, Layout(layout.num_tubes, layout.colors, layout.capacity, True,
+                                               layout.units_per_color))
+        return PackedState(state.code, self._run_layout[1])
+
+    def _prepare(self, start: PackedState):
+        """評価関数を初期状態に合わせて用意する
+
+        同じ Layout で色ごとの個数も同じなら試験管ごとのメモを使い回す。
+        eval_cache は盤面だけで決まる値なので、Layout が変わったときだけ捨てる。
+        """
+        evaluator = Evaluator.from_state(start)
+        if self._instrument is not None:
+            evaluator = self._instrument.evaluator(evaluator)
+        if self._evaluator is not None and self._evaluator.layout is start.layout:
+            if self._evaluator.totals != evaluator.totals:
+                self._evaluator = evaluator
+            return
+        self._evaluator = evaluator
+        self.eval_cache.clear()
+
+    def _checkpoint(self, iterations: int, frontier: int, visited: int) -> bool:
+        """CHECK_EVERY 回の展開ごとに呼ぶ。進捗を通知し、時間切れなら True を返す"""
+        if self._progress is not None:
+            self._progress.tick(iterations, frontier, visited)
+        if self._instrument is not None:
+            self._instrument.sizes(frontier, visited)
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    def _finish(self, solved, iterations, state, moves, move_history, score, frontier=0, visited=0, bound=None):
+        """探索結果のタプルを作り、進捗の通知先へ終了を伝える
+
+        post_optimize なら、解けた手順を（最短と分かっているときを除いて）短くしてから返す。
+        """
+        start = self._shorten_from
+        if solved and moves and start is not None and (self.bound is None or self.bound < len(moves)):
+            shorter = shorten(start, moves)
+            if len(shorter) < len(moves):
+                moves, move_history = shorter, self._move_history(start, shorter)
+                state = start
+                for from_tube, to_tube in moves:
+                    state = state.step(from_tube, to_tube)
+                score = self._evaluate(state, len(moves))
+        stats = self.stats
+        if stats is not None:
+            stats.solved, stats.iterations, stats.frontier, stats.visited = solved, iterations, frontier, visited
+            stats.elapsed = time.perf_counter() - self._started
+            if self._instrument is not None:
+                self._instrument.sizes(frontier, visited)
+        if self._progress is not None:
+            self._progress.finish(solved, iterations, score, state, moves, move_history, frontier, visited, bound,
+                                  stats)
+        return solved, moves, score, move_history
+
+    def _finish_known(self, iterations: int, start: PackedState, prefix: List[Tuple[int, int]], known: 'Known',
+                      frontier: int = 0, visited: int = 0):
+        """記録済みの状態までの手順 prefix に、そこから先の記録済みの手順をつないで解けた結果を返す"""
+        moves = prefix + known.moves
+        state = start
+        for from_tube, to_tube in moves:
+            state = state.step(from_tube, to_tube)
+        return self._finish(True, iterations, state, moves, self._move_history(start, moves),
+                            self._evaluate(state, len(moves)), frontier, visited)
+
+    def _path(self, arena: NodeArena, start: PackedState, node: int) -> Tuple[List[Tuple[int, int]], list]:
+        """ノードまでの（移動手順, 色付きの移動手順）を組み立てる"""
+        moves = arena.path(node)
+        return moves, self._move_history(start, moves)
+
+    def _move_history(self, start: PackedState, moves) -> list:
+        """移動手順を再生して、各手で動かした色を付ける"""
+        colors = start.layout.colors
+        history = []
+        state = start
+        for from_tube, to_tube in moves:
+            history.append((from_tube, to_tube, colors.color(state.top(from_tube))))
+            state = state.step(from_tube, to_tube)
+        return history
+
+    def _solve_dfs(self, initial_state, max_iterations):
+        """深さ優先探索"""
+        canonical = self._canonicalizer(initial_state.layout)
+        evaluator = self._evaluator
+        pruner = self._pruner
+        progress = self._progress
+        known = self._known
+        arena = NodeArena()
+        start = initial_state.packed
         best_score = float('-inf')
-        best_moves = []
-        best_move_history = []
-        visited = set()
-        queue = [(initial_state, [], [])]  # (state, moves, move_history)
+        best_state, best_node = start, ROOT
+        visited = self._closed_set(start.layout)
+        queue = [(start, ROOT, None, evaluator.static_score(start))]  # (state, parent, move, static_score)
         iterations = 0
 
         while queue and iterations < max_iterations:
             iterations += 1
-            current_state, moves, move_history = queue.pop()
-            state_hash = current_state.get_hash()
+            if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(queue), len(visited)):
+                break
+            current_state, parent, move, static_score = queue.pop()
+            state_hash = canonical.key(current_state.code)
 
             if state_hash in visited:
                 continue
 
             visited.add(state_hash)
-            score = self._evaluate(current_state, len(moves))
+            node = arena.add(parent, move) if move else arena.add()
+            score = static_score - arena.depth[node] * 3
 
             if score > best_score:
-                best_score = score
-                best_moves = moves.copy()
-                best_move_history = move_history.copy()
-                self._print_state(current_state, score, moves, move_history)
+                best_score, best_state, best_node = score, current_state, node
+                if progress is not None:
+                    progress.new_best(iterations, score, current_state, partial(self._path, arena, start, node),
+                                      len(queue), len(visited))
 
             if current_state.is_solved():
-                return True, moves, score, move_history
+                return self._finish(True, iterations, current_state, *self._path(arena, start, node), score,
+                                    len(queue), len(visited))
+            if known is not None:
+                hit = known(current_state, state_hash)
+                if hit is not None:
+                    return self._finish_known(iterations, start, arena.path(node), hit, len(queue), len(visited))
 
             next_moves = self._get_valid_moves(current_state)
             for from_tube, to_tube in next_moves:
-                new_state = current_state.copy()
-                color = new_state.tubes[from_tube][-1] if new_state.tubes[from_tube] else None
-                if new_state.move(from_tube, to_tube) and color is not None:
-                    new_moves = moves + [(from_tube, to_tube)]
-                    new_move_history = move_history + [(from_tube, to_tube, color)]
-                    queue.append((new_state, new_moves, new_move_history))
-
-        return False, best_moves, best_score, best_move_history
-        
-    def _evaluate(self, state: TubeState, depth: int) -> int:
-        """状態を評価する関数"""
-        score = 0
-        
-        # 完成したチューブのボーナスを大きく
-        completed_tubes = 0
-        for tube in state.tubes:
-            if len(tube) == 4 and all(c == tube[0] for c in tube):
-                completed_tubes += 1
-                score += 20000  # 完成ボーナスを2倍に
-        
-        # 空のチューブのボーナス
-        empty_tubes = sum(1 for tube in state.tubes if not tube)
-        score += empty_tubes * 300  # 空チューブのボーナスを増加
-        
-        # 連続した同じ色のボーナス
-        for tube in state.tubes:
-            if not tube:
+                if current_state.can_move(from_tube, to_tube) \
+                        and not pruner.is_redundant(current_state, move, (from_tube, to_tube)):
+                    new_state = current_state.step(from_tube, to_tube)
+                    if pruner.is_dead_end(new_state, (from_tube, to_tube)):
+                        continue
+                    new_score = static_score + evaluator.delta(current_state, new_state, from_tube, to_tube)
+                    queue.append((new_state, node, (from_tube, to_tube), new_score))
+
+        return self._finish(False, iterations, best_state, *self._path(arena, start, best_node), best_score,
+                            len(queue), len(visited))
+
+    def _solve_best_first(self, initial_state, max_iterations):
+        """評価値の高い状態から展開する最良優先探索（ヒープ＋遅延削除）"""
+        start = initial_state.packed
+        canonical = self._canonicalizer(start.layout)
+        evaluator = self._evaluator
+        arena = NodeArena()
+        counter = count()
+        static_score = evaluator.static_score(start)
+        # (-score, 順序, static_score, state, parent, move)
+        frontier = [(-static_score, next(counter), static_score, start, ROOT, None)]
+        visited = self._closed_set(start.layout)
+        progress = self._progress
+        known = self._known
+        best_score, best_state, best_node = float('-inf'), start, ROOT
+        iterations = 0
+
+        while frontier and iterations < max_iterations:
+            neg_score, _, static_score, state, parent, move = heappop(frontier)
+            key = canonical.key(state.code)
+            if key in visited:  # 展開済みの状態は取り出した時点で捨てる
                 continue
-            consecutive = 1
-            for i in range(len(tube)-1):
-                if tube[i] == tube[i+1]:
-                    consecutive += 1
-                    score += consecutive * 200  # 連続ボーナスを2倍に
-            
-            # チューブが完成に近い場合の追加ボーナス
-            if len(tube) >= 2 and all(c == tube[0] for c in tube):
-                score += len(tube) * 500
-        
-        # 深さペナルティを調整（より小さく）
-        score -= depth * 3
-        
-        # 同じ色が異なるチューブに分散しているペナルティ（より重く）
-        color_locations = {}
-        for i, tube in enumerate(state.tubes):
-            for color in tube:
-                if color not in color_locations:
-                    color_locations[color] = set()
-                color_locations[color].add(i)
-        
-        for locations in color_locations.values():
-            if len(locations) > 1:  # 同じ色が複数のチューブに存在する場合
-                score -= len(locations) * 200  # ペナルティを2倍に
-        
-        return score
-        
-    def _generate_moves(self, state: TubeState) -> List[TubeState]:
-        """可能な手を全て生成"""
-        moves = []
-        empty_tubes = []
-        
-        # 空の試験管を先に見つける
-        for i, tube in enumerate(state.tubes):
-            if not tube:
-                empty_tubes.append(i)
-        
-        for i, from_tube in enumerate(state.tubes):
-            # 移動元の試験管が空なら飛ばす
-            if not from_tube:
+            visited.add(key)
+            node = arena.add(parent, move) if move else arena.add()
+            iterations += 1
+            if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(frontier), len(visited)):
+                break
+
+            if -neg_score > best_score:
+                best_score, best_state, best_node = -neg_score, state, node
+                if progress is not None:
+                    progress.new_best(iterations, best_score, state, partial(self._path, arena, start, node),
+                                      len(frontier), len(visited))
+
+            if state.is_solved():
+                return self._finish(True, iterations, state, *self._path(arena, start, node), -neg_score,
+                                    len(frontier), len(visited))
+            if known is not None:
+                hit = known(state, key)
+                if hit is not None:
+                    return self._finish_known(iterations, start, arena.path(node), hit, len(frontier), len(visited))
+
+            child_depth = arena.depth[node] + 1
+            for child_move, child in self._successors(state, move):
+                if canonical.key(child.code) in visited:
+                    continue
+                child_static = static_score + evaluator.delta(state, child, *child_move)
+                heappush(frontier, (child_depth * 3 - child_static, next(counter), child_static, child, node,
+                                    child_move))
+
+        return self._finish(False, iterations, best_state, *self._path(arena, start, best_node), best_score,
+                            len(frontier), len(visited))
+
+    def _solve_astar(self, initial_state, max_iterations):
+        """許容的な下界を使う A*（ヒープ＋遅延削除）"""
+        start = initial_state.packed
+        canonical = self._canonicalizer(start.layout)
+        lower_bound = self._lower_bound(start)
+        arena = NodeArena()
+        counter = count()
+        h = lower_bound(start)
+        start_key = canonical.key(start.code)
+        # (f, h, 順序, g, key, state, parent, move)
+        frontier = [(h, h, next(counter), 0, start_key, start, ROOT, None)]
+        best_g = self._table({start_key: 0})
+        best_h, best_state, best_node = h, start, ROOT
+        progress = self._progress
+        known = self._known
+        incumbent = None  # 記録済みの最短手順につないだ解 (手数, ノード, 記録)
+        iterations = 0
+
+        while frontier and iterations < max_iterations:
+            f, h, _, g, key, state, parent, move = heappop(frontier)
+            if best_g[key] < g:  # より短い手順で到達済みなら古いエントリとして捨てる
                 continue
-                
-            # 移動元の試験管が完成していれば飛ばす
-            if len(from_tube) == 4 and all(c == from_tube[0] for c in from_tube):
+            if incumbent is not None and f >= incumbent[0]:  # 残りはどれも記録につないだ解より短くならない
+                break
+            node = arena.add(parent, move) if move else arena.add()
+            iterations += 1
+            if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(frontier), len(best_g)):
+                break
+
+            if h < best_h:
+                best_h, best_state, best_node = h, state, node
+                if progress is not None:
+                    progress.new_best(iterations, self._evaluate(state, g, key), state,
+                                      partial(self._path, arena, start, node), len(frontier), len(best_g))
+
+            if state.is_solved():
+                self._proven = True
+                return self._finish(True, iterations, state, *self._path(arena, start, node),
+                                    self._evaluate(state, g, key), len(frontier), len(best_g))
+            if known is not None:
+                hit = known(state, key)
+                if hit is not None and hit.exact:
+                    # この先の最短は記録どおりなので展開しない
+                    if incumbent is None or g + len(hit.moves) < incumbent[0]:
+                        incumbent = (g + len(hit.moves), node, hit)
+                    continue
+
+            child_g = g + 1
+            for child_move, child in self._successors(state, move):
+                child_key = canonical.key(child.code)
+                if best_g.get(child_key, child_g + 1) <= child_g:
+                    continue
+                best_g[child_key] = child_g
+                child_h = lower_bound(child)
+                heappush(frontier, (child_g + child_h, child_h, next(counter), child_g, child_key, child, node,
+                                    child_move))
+
+        if incumbent is not None:
+            length, node, hit = incumbent
+            self._proven = not frontier or frontier[0][0] >= length
+            return self._finish_known(iterations, start, arena.path(node), hit, len(frontier), len(best_g))
+        moves, move_history = self._path(arena, start, best_node)
+        return self._finish(False, iterations, best_state, moves, move_history,
+                            self._evaluate(best_state, len(moves)), len(frontier), len(best_g))
+
+    def _solve_ida_star(self, initial_state, max_iterations):
+        """反復深化 A*（各反復で置換表を使って重複する経路を刈る）"""
+        start = initial_state.packed
+        colors = start.layout.colors
+        canonical = self._canonicalizer(start.layout)
+        lower_bound = self._lower_bound(start)
+        if start.is_solved():
+            self._proven = True
+            return self._finish(True, 0, start, [], [], self._evaluate(start, 0))
+
+        start_key = canonical.key(start.code)
+        threshold = lower_bound(start)
+        best = (threshold, start, [], [])
+        progress = self._progress
+        known = self._known
+        iterations = 0
+        timed_out = False
+
+        while iterations < max_iterations:
+            next_threshold = float('inf')
+            table = self._table({start_key: 0})
+            path_keys = {start_key}
+            moves, move_history = [], []
+            stack = [(start, 0, start_key, self._successors(start))]
+
+            while stack:
+                state, g, key, children = stack[-1]
+                step = next(children, None)
+                if step is None:
+                    stack.pop()
+                    path_keys.discard(key)
+                    if moves:
+                        moves.pop()
+                        move_history.pop()
+                    continue
+
+                (from_tube, to_tube), child = step
+                child_g = g + 1
+                child_h = lower_bound(child)
+                if child_g + child_h > threshold:
+                    next_threshold = min(next_threshold, child_g + child_h)
+                    continue
+                child_key = canonical.key(child.code)
+                if child_key in path_keys or table.get(child_key, child_g + 1) <= child_g:
+                    continue
+                if len(table) < self.table_size:
+                    table[child_key] = child_g
+
+                iterations += 1
+                if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(stack), len(table)):
+                    timed_out = True
+                    break
+                if known is not None:
+                    hit = known(child, child_key)
+                    if hit is not None and hit.exact:
+                        # 記録どおりの手数で完成できる。閾値以内ならこの反復で見つかる最短手順
+                        if child_g + len(hit.moves) <= threshold:
+                            self._proven = True
+                            return self._finish_known(iterations, start, moves + [(from_tube, to_tube)], hit,
+                                                      len(stack), len(table))
+                        next_threshold = min(next_threshold, child_g + len(hit.moves))
+                        continue
+                moves.append((from_tube, to_tube))
+                move_history.append((from_tube, to_tube, colors.color(state.top(from_tube))))
+                if child_h < best[0]:
+                    best = (child_h, child, list(moves), list(move_history))
+                    if progress is not None:
+                        progress.new_best(iterations, self._evaluate(child, child_g), child,
+                                          partial(tuple, best[2:]), len(stack), len(table))
+                if child.is_solved():
+                    self._proven = True
+                    return self._finish(True, iterations, child, moves, move_history, self._evaluate(child, child_g),
+                                        len(stack), len(table))
+                if iterations >= max_iterations:
+                    break
+                path_keys.add(child_key)
+                stack.append((child, child_g, child_key, self._successors(child, (from_tube, to_tube))))
+
+            if timed_out or next_threshold == float('inf'):
+                break
+            threshold = next_threshold
+
+        _, state, moves, move_history = best
+        return self._finish(False, iterations, state, moves, move_history, self._evaluate(state, len(moves)))
+
+    def _solve_beam(self, initial_state, max_iterations):
+        """各深さで評価値の上位 beam_width 個だけを残すビーム探索"""
+        start = initial_state.packed
+        canonical = self._canonicalizer(start.layout)
+        evaluator = self._evaluator
+        arena = NodeArena()
+        visited = self._closed_set(start.layout)
+        visited.add(canonical.key(start.code))
+        static_score = evaluator.static_score(start)
+        layer = [(static_score, static_score, start, ROOT, None)]  # (score, static_score, state, parent, move)
+        progress = self._progress
+        known = self._known
+        best_score, best_state, best_node = float('-inf'), start, ROOT
+        iterations = 0
+        timed_out = False
+
+        while layer and iterations < max_iterations and not timed_out:
+            candidates = []
+            for score, static_score, state, parent, move in layer:
+                node = arena.add(parent, move) if move else arena.add()
+                iterations += 1
+                if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(layer), len(visited)):
+                    timed_out = True
+                    break
+                if score > best_score:
+                    best_score, best_state, best_node = score, state, node
+                    if progress is not None:
+                        progress.new_best(iterations, score, state, partial(self._path, arena, start, node),
+                                          len(layer), len(visited))
+                if state.is_solved():
+                    return self._finish(True, iterations, state, *self._path(arena, start, node), score,
+                                        len(layer), len(visited))
+                if known is not None:
+                    hit = known(state)
+                    if hit is not None:
+                        return self._finish_known(iterations, start, arena.path(node), hit, len(layer), len(visited))
+
+                child_depth = arena.depth[node] + 1
+                for child_move, child in self._successors(state, move):
+                    child_key = canonical.key(child.code)
+                    if child_key in visited:
+                        continue
+                    visited.add(child_key)
+                    child_static = static_score + evaluator.delta(state, child, *child_move)
+                    candidates.append((child_static - child_depth * 3, child_static, child, node, child_move))
+            layer = nlargest(self.beam_width, candidates, key=itemgetter(0))
+
+        return self._finish(False, iterations, best_state, *self._path(arena, start, best_node), best_score,
+                            len(layer), len(visited))
+
+    def _solve_best_first_vectorized(self, initial_state, max_iterations):
+        """最良優先探索（VECTOR_BATCH 個ずつ取り出して BatchExpander でまとめて展開する）"""
+        from .vectorized import VECTOR_BATCH, BatchExpander
+        start = initial_state.packed
+        layout = start.layout
+        evaluator = self._evaluator
+        expander = BatchExpander(layout, evaluator.totals, self._pruner)
+        arena = NodeArena()
+        counter = count()
+        static_score = evaluator.static_score(start)
+        start_key = expander.keys(expander.encode([start.code]))[0]
+        # (-score, 順序, static_score, key, state, parent, move)
+        frontier = [(-static_score, next(counter), static_score, start_key, start, ROOT, None)]
+        visited = self._closed_set(layout, expander.key_bytes)
+        progress = self._progress
+        known = self._known
+        best_score, best_state, best_node = float('-inf'), start, ROOT
+        iterations = 0
+        timed_out = False
+
+        while frontier and iterations < max_iterations and not timed_out:
+            batch = []  # 展開する (ノード, 盤面, 直前の移動)
+            while frontier and len(batch) < VECTOR_BATCH and iterations < max_iterations:
+                neg_score, _, static_score, key, state, parent, move = heappop(frontier)
+                if key in visited:
+                    continue
+                visited.add(key)
+                node = arena.add(parent, move) if move else arena.add()
+                iterations += 1
+                if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(frontier), len(visited)):
+                    timed_out = True
+                    break
+
+                if -neg_score > best_score:
+                    best_score, best_state, best_node = -neg_score, state, node
+                    if progress is not None:
+                        progress.new_best(iterations, best_score, state, partial(self._path, arena, start, node),
+                                          len(frontier), len(visited))
+
+                if state.is_solved():
+                    return self._finish(True, iterations, state, *self._path(arena, start, node), -neg_score,
+                                        len(frontier), len(visited))
+                if known is not None:
+                    hit = known(state)
+                    if hit is not None:
+                        return self._finish_known(iterations, start, arena.path(node), hit, len(frontier),
+                                                  len(visited))
+                batch.append((node, state, move))
+            if timed_out or not batch:
+                break
+
+            expansion = expander.expand([entry[1].code for entry in batch], [entry[2] for entry in batch])
+            fresh = [i for i, key in enumerate(expansion.keys) if key not in visited]
+            if not fresh:
                 continue
-                
-            # 移動元の一番上の色を取得
-            top_color = from_tube[0]  # インデックス0が一番上
-            
-            # まず、同じ色がある試験管への移動を試みる
-            found_same_color = False
-            for j, to_tube in enumerate(state.tubes):
-                if i == j or len(to_tube) >= 4:
+            parents = expansion.parents.tolist()
+            moves = expansion.moves.tolist()
+            scores = expansion.scores.tolist()
+            keys = expansion.keys
+            depth = arena.depth
+            for i, code in zip(fresh, expander.pack(expansion.children[fresh])):
+                node = batch[parents[i]][0]
+                child_static = scores[i]
+                heappush(frontier, ((depth[node] + 1) * 3 - child_static, next(counter), child_static, keys[i],
+                                    PackedState(code, layout), node, tuple(moves[i])))
+
+        return self._finish(False, iterations, best_state, *self._path(arena, start, best_node), best_score,
+                            len(frontier), len(visited))
+
+    def _solve_beam_vectorized(self, initial_state, max_iterations):
+        """ビーム探索（各深さの状態を BatchExpander でまとめて展開する）"""
+        from .vectorized import BatchExpander
+        start = initial_state.packed
+        layout = start.layout
+        evaluator = self._evaluator
+        expander = BatchExpander(layout, evaluator.totals, self._pruner)
+        arena = NodeArena()
+        visited = self._closed_set(layout, expander.key_bytes)
+        visited.add(expander.keys(expander.encode([start.code]))[0])
+        static_score = evaluator.static_score(start)
+        layer = [(static_score, static_score, start, ROOT, None)]  # (score, static_score, state, parent, move)
+        progress = self._progress
+        known = self._known
+        best_score, best_state, best_node = float('-inf'), start, ROOT
+        iterations = 0
+        timed_out = False
+
+        while layer and iterations < max_iterations and not timed_out:
+            nodes = []
+            for score, static_score, state, parent, move in layer:
+                node = arena.add(parent, move) if move else arena.add()
+                iterations += 1
+                if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(layer), len(visited)):
+                    timed_out = True
+                    break
+                if score > best_score:
+                    best_score, best_state, best_node = score, state, node
+                    if progress is not None:
+                        progress.new_best(iterations, score, state, partial(self._path, arena, start, node),
+                                          len(layer), len(visited))
+                if state.is_solved():
+                    return self._finish(True, iterations, state, *self._path(arena, start, node), score,
+                                        len(layer), len(visited))
+                if known is not None:
+                    hit = known(state)
+                    if hit is not None:
+                        return self._finish_known(iterations, start, arena.path(node), hit, len(layer), len(visited))
+                nodes.append(node)
+            if timed_out:
+                break
+
+            expansion = expander.expand([entry[2].code for entry in layer], [entry[4] for entry in layer])
+            fresh = []
+            for i, key in enumerate(expansion.keys):
+                if key not in visited:
+                    visited.add(key)
+                    fresh.append(i)
+            if not fresh:
+                break
+            chosen = expander.top(expansion.scores, fresh, self.beam_width)
+            child_depth = arena.depth[nodes[0]] + 1
+            parents = expansion.parents[chosen].tolist()
+            moves = expansion.moves[chosen].tolist()
+            scores = expansion.scores[chosen].tolist()
+            layer = [(child_static - child_depth * 3, child_static, PackedState(code, layout), nodes[parent],
+                      tuple(move))
+                     for code, parent, move, child_static
+                     in zip(expander.pack(expansion.children[chosen]), parents, moves, scores)]
+
+        return self._finish(False, iterations, best_state, *self._path(arena, start, best_node), best_score,
+                            len(layer), len(visited))
+
+    def _solve_hda_star(self, initial_state, max_iterations):
+        """ハッシュ分散 A*（parallel.hda_star を参照）"""
+        start = initial_state.packed
+        from .parallel import hda_star
+        result = hda_star(start, self.workers, max_iterations, self._checkpoint, pruner=self._pruner,
+                          pattern_db=[db.path for db in self.pattern_db])
+        self._proven = result.optimal  # 予算で打ち切ったなら最短とは限らない
+        state = start
+        for from_tube, to_tube in result.moves:
+            state = state.step(from_tube, to_tube)
+        return self._finish(result.solved, result.iterations, state, result.moves,
+                            self._move_history(start, result.moves), self._evaluate(state, len(result.moves)),
+                            result.frontier, result.visited)
+
+    def _solve_anytime(self, initial_state, max_iterations):
+        """anytime な重み付き A*（解を見つけても止めずに、より短い解を探し続ける）
+
+        f = g + anytime_weight * h の小さい順に展開して早く最初の解を見つけ、
+        その後は g + h が今の解の手数以上の状態を刈りながら展開を続ける。
+        子が完成形なら、今の解より短ければ置き換える。先端の g + h の最小値
+        （と今の解の手数の小さい方）が最短手数の下界で、先端が空になれば
+        今の解が最短と分かる。予算（max_iterations と time_limit）を使い切るか
+        最短と分かったところで終え、最後の下界を self.bound に残す。
+        より短い解と下界は IMPROVED のイベントで通知する。
+        """
+        start = initial_state.packed
+        canonical = self._canonicalizer(start.layout)
+        lower_bound = self._lower_bound(start)
+        weight = self.anytime_weight
+        arena = NodeArena()
+        counter = count()
+        h = lower_bound(start)
+        start_key = canonical.key(start.code)
+        # (g + weight * h, h, 順序, g, key, state, parent, move)
+        frontier = [(weight * h, h, next(counter), 0, start_key, start, ROOT, None)]
+        best_g = self._table({start_key: 0})
+        best_h, best_state, best_node = h, start, ROOT
+        progress = self._progress
+        incumbent = None  # (手数, 完成形, 完成形の1手前のノード, 最後の移動)
+        if start.is_solved():
+            incumbent = (0, start, ROOT, None)
+            frontier = []
+        bound = h
+        iterations = 0
+
+        def solution():
+            length, state, node, move = incumbent
+            moves = arena.path(node) + [move] if move else []
+            return state, moves, self._move_history(start, moves)
+
+        while frontier and iterations < max_iterations:
+            _, h, _, g, key, state, parent, move = heappop(frontier)
+            if best_g[key] < g:  # より短い手順で到達済みなら古いエントリとして捨てる
+                continue
+            if incumbent is not None and g + h >= incumbent[0]:  # 今の解より短くならない
+                continue
+            node = arena.add(parent, move) if move else arena.add()
+            iterations += 1
+            if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(frontier), len(best_g)):
+                break
+
+            if incumbent is None and h < best_h:
+                best_h, best_state, best_node = h, state, node
+                if progress is not None:
+                    progress.new_best(iterations, self._evaluate(state, g, key), state,
+                                      partial(self._path, arena, start, node), len(frontier), len(best_g))
+
+            child_g = g + 1
+            for child_move, child in self._successors(state, move):
+                if incumbent is not None and child_g >= incumbent[0]:
+                    break
+                if child.is_solved():
+                    incumbent = (child_g, child, node, child_move)
+                    bound = min(child_g, max(bound, min((entry[3] + entry[1] for entry in frontier), default=child_g)))
+                    if progress is not None:
+                        child_state, moves, move_history = solution()
+                        progress.improved(iterations, self._evaluate(child, child_g), child_state, moves,
+                                          move_history, bound, len(frontier), len(best_g))
+                    break
+                child_key = canonical.key(child.code)
+                if best_g.get(child_key, child_g + 1) <= child_g:
                     continue
-                    
-                if to_tube and to_tube[0] == top_color:  # インデックス0と比較
-                    found_same_color = True
-                    new_state = state.copy()
-                    if new_state.move(i, j):
-                        moves.append(new_state)
-                        
-            # 同じ色が見つからなかった場合のみ、空の試験管への移動を考慮
-            if not found_same_color and empty_tubes:
-                # 空の試験管が複数ある場合は1つだけ使用
-                new_state = state.copy()
-                if new_state.move(i, empty_tubes[0]):
-                    moves.append(new_state)
-        
-        return moves
+                child_h = lower_bound(child)
+                if incumbent is not None and child_g + child_h >= incumbent[0]:
+                    continue
+                best_g[child_key] = child_g
+                heappush(frontier, (child_g + weight * child_h, child_h, next(counter), child_g, child_key, child,
+                                    node, child_move))
+
+        if incumbent is None:
+            self._proven = False
+            moves, move_history = self._path(arena, start, best_node)
+            return self._finish(False, iterations, best_state, moves, move_history,
+                                self._evaluate(best_state, len(moves)), len(frontier), len(best_g))
+        length = incumbent[0]
+        live = (entry[3] + entry[1] for entry in frontier if entry[3] + entry[1] < length)
+        self.bound = min(length, max(bound, min(live, default=length)))
+        self._proven = self.bound == length
+        state, moves, move_history = solution()
+        return self._finish(True, iterations, state, moves, move_history, self._evaluate(state, length),
+                            len(frontier), len(best_g), self.bound)
+
+    def _solve_bidirectional(self, initial_state, max_iterations):
+        """初期状態と完成形の両側から幅優先で1層ずつ広げ、正規化キーで出会ったところでつなぐ（最短手順）
+
+        先端の小さい側の層を1つ全て展開し、その層で相手側の記録済みの状態に
+        出会ったら、出会った中で最も短い手順を返す。完成形の側は
+        reverse.predecessors で逆向きにたどる。完成形を作れない盤面
+        （不明な色があるなど）は astar で解く。
+        """
+        start = initial_state.packed
+        goal = goal_state(start)
+        if goal is None:
+            return self._solve_astar(initial_state, max_iterations)
+        if start.is_solved():
+            self._proven = True
+            return self._finish(True, 0, start, [], [], self._evaluate(start, 0))
+        canonical = self._canonicalizer(start.layout)
+        lower_bound = self._lower_bound(start)
+        forward, backward = NodeArena(), NodeArena()
+        # 正規化キー → (ノード, 盤面)
+        seen = (self._table({canonical.key(start.code): (forward.add(), start)}),
+                self._table({canonical.key(goal.code): (backward.add(), goal)}))
+        layers = ([(start, 0, None)], [(goal, 0, None)])  # (盤面, ノード, 直前の移動)
+        progress = self._progress
+        best_h, best_state, best_node = lower_bound(start), start, 0
+        iterations = 0
+        timed_out = False
+        meeting = None  # (手数, 初期状態の側のノード, 盤面, 完成形の側のノード, 盤面)
+
+        while layers[0] and layers[1] and iterations < max_iterations and not timed_out:
+            side = 0 if len(layers[0]) <= len(layers[1]) else 1
+            arena, own, other = (forward, backward)[side], seen[side], seen[1 - side]
+            next_layer = []
+            for state, node, move in layers[side]:
+                iterations += 1
+                if not iterations % CHECK_EVERY and self._checkpoint(iterations, len(layers[0]) + len(layers[1]),
+                                                                     len(own) + len(other)):
+                    timed_out = True
+                    break
+                steps = self._successors(state, move) if side == 0 else predecessors(state)
+                for child_move, child in steps:
+                    key = canonical.key(child.code)
+                    if key in own:
+                        continue
+                    child_node = arena.add(node, child_move)
+                    own[key] = (child_node, child)
+                    next_layer.append((child, child_node, child_move))
+                    if key in other:
+                        found = (child_node, child), other[key]
+                        (forward_node, forward_state), (backward_node, backward_state) = \
+                            found if side == 0 else found[::-1]
+                        length = forward.depth[forward_node] + backward.depth[backward_node]
+                        if meeting is None or length < meeting[0]:
+                            meeting = (length, forward_node, forward_state, backward_node, backward_state)
+                    elif side == 0:
+                        h = lower_bound(child)
+                        if h < best_h:
+                            best_h, best_state, best_node = h, child, child_node
+                            if progress is not None:
+                                progress.new_best(iterations, self._evaluate(child, forward.depth[child_node]),
+                                                  child, partial(self._path, forward, start, child_node),
+                                                  len(next_layer), len(own) + len(other))
+            if meeting is not None:
+                break
+            layers = (next_layer, layers[1]) if side == 0 else (layers[0], next_layer)
+
+        visited = len(seen[0]) + len(seen[1])
+        frontier = len(layers[0]) + len(layers[1])
+        if meeting is None:
+            moves, move_history = self._path(forward, start, best_node)
+            return self._finish(False, iterations, best_state, moves, move_history,
+                                self._evaluate(best_state, len(moves)), frontier, visited)
+        _, forward_node, forward_state, backward_node, backward_state = meeting
+        self._proven = not timed_out  # 層の途中で打ち切ったなら、より短くつながる状態が残っているかもしれない
+        # 完成形の側の手順（出会った盤面から完成形まで）を、出会った盤面どうしの
+        # 試験管の対応（正規化したときの並び）で初期状態の側の試験管番号に直す
+        forward_order = canonical.form(forward_state.code)[1]
+        backward_order = canonical.form(backward_state.code)[1]
+        position = {tube: j for j, tube in enumerate(backward_order)}
+        rest = [(forward_order[position[from_tube]], forward_order[position[to_tube]])
+                for from_tube, to_tube in reversed(backward.path(backward_node))]
+        moves = forward.path(forward_node) + rest
+        state = start
+        for from_tube, to_tube in moves:
+            state = state.step(from_tube, to_tube)
+        return self._finish(True, iterations, state, moves, self._move_history(start, moves),
+                            self._evaluate(state, len(moves)), frontier, visited)
+
+    def _successors(self, state: PackedState, last: Optional[Tuple[int, int]] = None
+                    ) -> Iterator[Tuple[Tuple[int, int], PackedState]]:
+        """合法な移動と移動後の状態を列挙する（last は state に至った直前の移動）
+
+        完成した試験管からの移動と、2本目以降の空の試験管への移動
+        （1本目への移動と同じ状態になる）は常に除く。prune=True なら
+        さらに Pruner の規則で無駄な移動と行き止まりの子を除く。
+        """
+        return self._pruner.successors(state, last)
+
+    def _evaluate(self, state: PackedState, depth: int, key: Optional[int] = None) -> int:
+        """状態を評価する関数
+
+        key（正規化キー）を渡すと、深さを除いた評価値を eval_cache に
+        記録して使い回す。キャッシュは eval_cache_size 件を超えると古いものから捨てる。
+        """
+        if self._evaluator is None or self._evaluator.layout is not state.layout:
+            self._prepare(state)
+        if key is None:
+            return self._evaluator.static_score(state) - depth * 3
+        static_score = self.eval_cache.get(key)
+        if static_score is None:
+            static_score = self._evaluator.static_score(state)
+            if len(self.eval_cache) >= self.eval_cache_size:
+                del self.eval_cache[next(iter(self.eval_cache))]
+            self.eval_cache[key] = static_score
+        return static_score - depth * 3
         
     def _is_redundant_move(self, old_state: TubeState, new_state: TubeState) -> bool:
-        """無意味な移動かどうかをチェック"""
-        last_move = new_state.moves[-1]
-        from_idx, to_idx = last_move
-        
-        # 空の試験管を経由する無意味な移動をチェック
-        if len(old_state.tubes[to_idx]) == 0:
-            # 他の空の試験管があれば冗長
-            empty_tubes = sum(1 for tube in old_state.tubes if not tube)
-            if empty_tubes > 1:
-                return True
-        
-        # 同じ色を持つ試験管間の無意味な移動をチェック
-        if len(new_state.moves) >= 2:
-            prev_from, prev_to = new_state.moves[-2]
-            if prev_to == from_idx and prev_from == to_idx:
-                return True
-        
-        return False 
-        
-    def _get_color_name(self, color):
-        if color is None:
-            return "不明"
-        
-        color_names = {
-            (255, 0, 0): "赤",            # RED
-            (255, 255, 0): "黄",          # YELLOW
-            (0, 191, 255): "水色",        # LIGHT_BLUE
-            (128, 0, 128): "赤紫",        # PURPLE
-            (148, 0, 211): "紫",          # VIOLET
-            (255, 165, 0): "オレンジ",    # ORANGE
-            (0, 255, 0): "緑",            # GREEN
-            (255, 182, 193): "ピンク",    # PINK
-            (0, 0, 255): "青",            # BLUE
-            (0, 100, 0): "深緑",          # DARK_GREEN
-            (255, 218, 185): "肌色",      # SKIN
-            (128, 128, 128): "不明"       # UNKNOWN
-        }
-        return color_names.get(color, "不明")
-
-    def _print_state(self, state, score, moves, move_history=None):
-        print(f"\n現在の状態:")
-        print(f"スコア: {score}")
-        print(f"手数: {len(moves)}")
-        print("\n試験管の状態:")
-        for i, tube in enumerate(state.tubes):
-            colors = [self._get_color_name(color) for color in tube]
-            print(f"試験管{i+1:2d}: {colors}")
-
-        if move_history:
-            print("\n手順一覧:")
-            for i, (from_tube, to_tube, color) in enumerate(move_history, 1):
-                color_name = self._get_color_name(color)
-                print(f"{i:2d}手目: 試験管{from_tube+1:2d} → 試験管{to_tube+1:2d} ({color_name}を移動)")
+        """無意味な移動かどうかをチェック（new_state は old_state から1手進めた状態）"""
+        last = old_state.moves[-1] if old_state.moves else None
+        return self._pruner.is_redundant(old_state.packed, last, new_state.moves[-1])
 
     def _is_unknown_color(self, color):
         """色が不明かどうかを判定する"""
@@ -216,44 +1002,44 @@ class TubeSolver:
             for color in tube:
                 color_counts[color] = color_counts.get(color, 0) + 1
         
-        # 各色が4つずつあるかチェック
-        return all(count == 4 for count in color_counts.values()) 
+        # 各色が units_per_color 個ずつあるかチェック
+        units_per_color = state.layout.units_per_color
+        return all(count == units_per_color for count in color_counts.values())
 
-    def _get_valid_moves(self, state):
+    def _get_valid_moves(self, state: PackedState):
         """有効な移動手順を生成する"""
         valid_moves = []
         empty_tubes = []
+        num_tubes = state.layout.num_tubes
+        capacity = state.layout.capacity
+        lengths = [state.length(i) for i in range(num_tubes)]
+        tops = [state.top(i) for i in range(num_tubes)]
         
         # 空の試験管を先に見つける
-        for i, tube in enumerate(state.tubes):
-            if not tube:
+        for i in range(num_tubes):
+            if not lengths[i]:
                 empty_tubes.append(i)
         
         # 完成したチューブは移動元から除外
-        for from_tube in range(len(state.tubes)):
-            if not state.tubes[from_tube]:  # 空の試験管からは移動できない
+        for from_tube in range(num_tubes):
+            if not lengths[from_tube]:  # 空の試験管からは移動できない
                 continue
-            if len(state.tubes[from_tube]) == 4 and all(c == state.tubes[from_tube][0] for c in state.tubes[from_tube]):
+            if state.is_complete(from_tube):
                 continue
             
-            from_color = state.tubes[from_tube][-1]
+            from_color = tops[from_tube]
             
             # 同じ色が連続している場合は、その色をまとめて移動することを優先
-            consecutive_count = 1
-            for i in range(len(state.tubes[from_tube])-2, -1, -1):
-                if state.tubes[from_tube][i] == from_color:
-                    consecutive_count += 1
-                else:
-                    break
+            consecutive_count = state.top_run(from_tube)
             
             # まず、同じ色がある試験管への移動を試みる
             found_same_color = False
-            for to_tube in range(len(state.tubes)):
-                if from_tube == to_tube or len(state.tubes[to_tube]) >= 4:
+            for to_tube in range(num_tubes):
+                if from_tube == to_tube or lengths[to_tube] >= capacity:
                     continue
                 
-                if state.tubes[to_tube] and state.tubes[to_tube][-1] == from_color:
-                    if len(state.tubes[to_tube]) + consecutive_count <= 4:
+                if lengths[to_tube] and tops[to_tube] == from_color:
+                    if lengths[to_tube] + consecutive_count <= capacity:
                         valid_moves.insert(0, (from_tube, to_tube))  # 優先度の高い移動を先頭に
                         found_same_color = True
             
@@ -263,10 +1049,3 @@ class TubeSolver:
                 valid_moves.append((from_tube, empty_tubes[0]))
         
         return valid_moves
-
-    def _print_move(self, move, move_number):
-        from_tube, to_tube = move
-        color = self._get_color_name(self.state.tubes[from_tube][-1])
-        print(f"\n{move_number:2d}手目: 試験管{from_tube + 1:2d} → 試験管{to_tube + 1:2d} ({color}を移動)")
-        print("\n現在の状態:")
-        self._print_state() 
\ No newline at end of file
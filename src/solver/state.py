@@ -1,90 +1,101 @@
 from typing import List, Tuple, Optional
-from copy import deepcopy
+from .packed import Color, ColorTable, DEFAULT_CAPACITY, Layout, PackedState
+from .canonical import canonical_key
 
 class TubeState:
-    def __init__(self, tubes: List[List[Tuple[int, int, int]]], moves: List[Tuple[int, int]] = None):
-        self.tubes = tubes  # 各試験管の状態（色のリスト）
+    """PackedState を包む従来どおりのインターフェース
+
+    盤面は整数に詰めた PackedState で持ち、``tubes`` は参照のたびに
+    RGBタプルのリストへ展開する。pour_run=True なら move は一番上の同じ色の
+    並びを入るだけまとめて移す（moves はその単位の手順になる）。
+    capacity と units_per_color（1色あたりの個数、省略時は capacity）は Layout に渡す。
+
+    tubes は今の盤面（moves を指した後の盤面）で、moves を巻き戻した盤面を
+    initial に入れる。初期盤面と移動履歴から今の盤面を作るときは、初期盤面で
+    作ってから move を順に呼ぶ。巻き戻せない移動履歴なら ValueError。
+    """
+    def __init__(self, tubes: List[List[Tuple[int, int, int]]], moves: List[Tuple[int, int]] = None,
+                 colors: Optional[ColorTable] = None, pour_run: bool = False, capacity: int = DEFAULT_CAPACITY,
+                 units_per_color: Optional[int] = None):
+        colors = colors if colors is not None else ColorTable()
+        colors.intern_tubes(tubes)
+        layout = Layout(len(tubes), colors, capacity, pour_run, units_per_color)
+        self.packed = PackedState.from_tubes(tubes, layout)
         self.moves = moves or []  # 移動履歴 [(from_idx, to_idx), ...]
-        
+        if pour_run and self.moves:
+            raise ValueError("pour_run では移動履歴から初期状態を求められません")
+        # 移動履歴を巻き戻して初期状態を求める（移動先から1個取り、移動元へ戻す）
+        initial = self.packed
+        for step in range(len(self.moves), 0, -1):
+            from_idx, to_idx = self.moves[step - 1]
+            if not (0 <= from_idx < layout.num_tubes and 0 <= to_idx < layout.num_tubes) or from_idx == to_idx \
+                    or not initial.tube(to_idx) or initial.length(from_idx) >= layout.capacity:
+                raise ValueError(f"移動履歴の {step} 手目 {(from_idx, to_idx)} を巻き戻せません"
+                                 "（tubes は移動履歴を指した後の盤面を渡してください）")
+            initial = initial.apply(to_idx, from_idx)
+        self.initial = initial
+
+    @classmethod
+    def from_packed(cls, packed: PackedState, moves: List[Tuple[int, int]] = None,
+                    initial: Optional[PackedState] = None) -> 'TubeState':
+        """PackedState から作る（initial を省略すると packed を初期状態とみなす）"""
+        state = cls.__new__(cls)
+        state.packed = packed
+        state.moves = moves or []
+        state.initial = initial or packed
+        return state
+
+    @property
+    def tubes(self) -> List[List[Color]]:
+        """各試験管の状態（色のリスト、下から上）"""
+        return self.packed.decode()
+
+    @property
+    def layout(self) -> Layout:
+        return self.packed.layout
+
     def copy(self) -> 'TubeState':
-        return TubeState(deepcopy(self.tubes), deepcopy(self.moves))
-        
+        return TubeState.from_packed(self.packed, list(self.moves), self.initial)
+
     def get_top_color(self, tube_idx: int) -> Optional[Tuple[int, int, int]]:
         """指定した試験管の一番上の色を取得"""
-        if not self.tubes[tube_idx]:
+        top = self.packed.top(tube_idx)
+        if not top:
             return None
-        return self.tubes[tube_idx][-1]  # 末尾（一番上）の色を返す
-        
+        return self.layout.colors.color(top)
+
     def can_move(self, from_idx: int, to_idx: int) -> bool:
         """移動可能かどうかを判定"""
-        # 同じ試験管への移動は不可
-        if from_idx == to_idx:
-            return False
-            
-        # 移動元が空なら不可
-        if not self.tubes[from_idx]:
-            return False
-            
-        # 移動先が満杯なら不可
-        if len(self.tubes[to_idx]) >= 4:
-            return False
-            
-        # 移動先が空なら可能
-        if not self.tubes[to_idx]:
-            return True
-            
-        # 移動先の一番上が不明な色なら不可
-        if self.tubes[to_idx][-1] == (128, 128, 128):
-            return False
-            
-        # 色が同じ場合のみ可能
-        return self.get_top_color(from_idx) == self.get_top_color(to_idx)
-        
+        return self.packed.can_move(from_idx, to_idx)
+
     def move(self, from_idx: int, to_idx: int) -> bool:
         """液体を移動。成功したらTrueを返す"""
         if not self.can_move(from_idx, to_idx):
             return False
-            
-        color = self.tubes[from_idx].pop()  # 一番上（末尾）の色を取得
-        self.tubes[to_idx].append(color)  # 一番上（末尾）に追加
+
+        self.packed = self.packed.step(from_idx, to_idx)
         self.moves.append((from_idx, to_idx))
         return True
-        
+
     def is_solved(self) -> bool:
         """パズルが解けているかどうかを判定"""
-        for tube in self.tubes:
-            # 空の試験管はOK
-            if not tube:
-                continue
-                
-            # 4つ揃っていない、または色が混ざっている場合はNG
-            if len(tube) != 4 or any(c != tube[0] for c in tube[1:]):
-                return False
-                
-        return True
-        
-    def get_hash(self) -> str:
-        """状態のハッシュ値を取得"""
-        # 試験管の状態をソートしてタプルに変換
-        sorted_tubes = sorted(tuple(tube) for tube in self.tubes)
-        return str(sorted_tubes)
-        
+        return self.packed.is_solved()
+
+    def get_hash(self) -> int:
+        """状態のハッシュ値を取得（試験管の並び順と色の付け替えによらない整数）"""
+        return canonical_key(self.packed)
+
     def __str__(self) -> str:
         return f"Tubes: {self.tubes}, Moves: {self.moves}"
 
     def get_state_at_move(self, move_number: int) -> List[List[Tuple[int, int, int]]]:
-        """指定された手数までの移動を適用した状態を返す"""
-        if move_number <= 0:
-            return self.tubes
-
-        # 初期状態をコピー
-        current_tubes = deepcopy(self.tubes)
-        
-        # 指定された手数まで移動を適用
-        for i in range(min(move_number, len(self.moves))):
-            from_idx, to_idx = self.moves[i]
-            if current_tubes[from_idx]:  # 移動元が空でない場合
-                color = current_tubes[from_idx].pop()
-                current_tubes[to_idx].append(color)
-                
-        return current_tubes 
\ No newline at end of file
+        """初期状態から指定された手数までの移動を適用した状態を返す"""
+        current = self.initial
+        for from_idx, to_idx in self.moves[:max(move_number, 0)]:
+            if current.tube(from_idx):  # 移動元が空でない場合
+                current = current.step(from_idx, to_idx)
+        return current.decode()
+
+    def unit_moves(self) -> List[Tuple[int, int]]:
+        """移動履歴を1個ずつの移動に展開する（pour_run でなければ moves と同じ）"""
+        return self.initial.unit_moves(self.moves)
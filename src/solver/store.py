@@ -0,0 +1,193 @@
+"""解いた結果を実行をまたいで使い回すためのディスク上の置換表
+
+    from src.solver.store import SolutionStore
+
+    store = SolutionStore("solutions.sqlite3")
+    solver = TubeSolver(store=store)
+
+SQLite（WAL モード）に、盤面の正規化キーごとに「そこから完成までの手順」を記録する。
+解けたときは初期状態だけでなく手順の途中の各状態も記録するので、途中から
+同じ局面になる別のパズルにも使える。最短手順を保証する探索（astar, ida_star, hda_star,
+bidirectional, anytime）が最短と確かめた手順は最短（exact）として、それ以外（予算で
+打ち切った探索の暫定解を含む）は上界として記録する。
+
+手順は正規化後の試験管の位置で保存する。正規化キーが同じ盤面どうしは
+試験管の並べ替えと色の付け替えで移り合うので、引くときに位置を元の
+試験管番号へ戻せばそのまま再生できる。
+
+WAL モードなので複数のプロセスから同時に読める（書き込みは1つずつ）。
+接続はプロセス・スレッドごとに開き、pickle するとパスと設定だけが渡る。
+件数が max_entries を超えると、最後に使った時刻の古いものから1割ずつ消す。件数は
+毎回数えず、前に数えた件数に書いた行数を足した見積もりが上限を超えたときと、
+EVICT_CHECK_EVERY 回の put ごと（他のプロセスが書いた分）に数え直す。
+"""
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from struct import Struct
+import os
+import sqlite3
+import threading
+import time
+from .canonical import canonicalizer
+from .packed import Layout, PackedState
+
+Move = Tuple[int, int]
+
+# put の何回ごとに件数を数え直すか（その間は書いた行数から見積もる）
+EVICT_CHECK_EVERY = 64
+
+# キーの先頭に付けるパズルの形（試験管の本数, 容量, 1色あたりの個数, 並びごと移すか）
+_SHAPE = Struct('<HHHB')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS solutions (
+    key BLOB PRIMARY KEY,
+    moves BLOB NOT NULL,
+    length INTEGER NOT NULL,
+    exact INTEGER NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used);
+"""
+
+# 短い手順か、同じ長さで最短と分かったものだけで上書きする
+_UPSERT = """
+INSERT INTO solutions (key, moves, length, exact, used) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    moves = excluded.moves, length = excluded.length, exact = excluded.exact, used = excluded.used
+WHERE excluded.length < solutions.length
+   OR (excluded.length = solutions.length AND excluded.exact > solutions.exact)
+"""
+
+
+class Known(NamedTuple):
+    moves: List[Move]  # 引いた盤面の試験管番号での、完成までの手順
+    exact: bool  # 最短手順か（False なら len(moves) は完成までの手数の上界）
+
+
+class SolutionStore:
+    """正規化キー → 完成までの手順 を SQLite に記録する
+
+    Args:
+        path: データベースファイルのパス
+        max_entries: 記録する状態数の上限
+        timeout: 他のプロセスが書き込み中のときに待つ秒数
+    """
+
+    def __init__(self, path: str, max_entries: int = 1_000_000, timeout: float = 30.0):
+        self.path = os.fspath(path)
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_entries': self.max_entries, 'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """このプロセス・スレッド用の接続（初回に開いて表を作る）"""
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            local.conn, local.pid = conn, os.getpid()
+            local.entries, local.puts = None, 0  # 件数の見積もり（None なら次の put で数える）と put の回数
+        return conn
+
+    def close(self) -> None:
+        """このスレッドの接続を閉じる（次に使うときに開き直す）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _shape(layout: Layout) -> bytes:
+        return _SHAPE.pack(layout.num_tubes, layout.capacity, layout.units_per_color, layout.pour_run)
+
+    @classmethod
+    def _blob(cls, layout: Layout, key: int) -> bytes:
+        """形を先頭に付けた正規化キー"""
+        return cls._shape(layout) + key.to_bytes(layout.num_tubes * layout.capacity, 'little')
+
+    def has_shape(self, state: PackedState) -> bool:
+        """state と同じ形のパズルの記録が1件でもあるか"""
+        layout = state.layout
+        shape = self._shape(layout)
+        row = self.connection.execute("SELECT 1 FROM solutions WHERE key >= ? AND key < ? LIMIT 1",
+                                      (shape, shape + b'\xff' * (layout.num_tubes * layout.capacity + 1))
+                                      ).fetchone()
+        return row is not None
+
+    def get(self, state: PackedState, key: Optional[int] = None, touch: bool = False) -> Optional[Known]:
+        """state から完成までの記録済みの手順（なければ None）
+
+        key に state の正規化キーを渡すと計算し直さない。touch=True なら最後に使った
+        時刻を更新する（他のプロセスが書き込み中なら待たずに更新をあきらめる）。
+        """
+        layout = state.layout
+        canonical = canonicalizer(layout)
+        blob = self._blob(layout, canonical.key(state.code) if key is None else key)
+        conn = self.connection
+        row = conn.execute("SELECT moves, exact FROM solutions WHERE key = ?", (blob,)).fetchone()
+        if row is None:
+            return None
+        if touch:
+            conn.execute("PRAGMA busy_timeout = 0")
+            try:
+                conn.execute("UPDATE solutions SET used = ? WHERE key = ?", (time.time(), blob))
+            except sqlite3.OperationalError:
+                pass
+            finally:
+                conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        order = canonical.form(state.code)[1]
+        data = row[0]
+        return Known([(order[data[i]], order[data[i + 1]]) for i in range(0, len(data), 2)], bool(row[1]))
+
+    def put(self, start: PackedState, moves: Sequence[Move], exact: bool) -> None:
+        """start から完成までの手順を、途中の各状態の分も含めて記録する
+
+        exact=True なら手順が最短であることを表す（最短手順の途中から先も最短）。
+        記録済みの方が短いか、同じ長さで最短と分かっている状態は上書きしない。
+        """
+        states = [start]
+        for from_tube, to_tube in moves:
+            states.append(states[-1].step(from_tube, to_tube))
+        canonical = canonicalizer(start.layout)
+        now = time.time()
+        rows = []
+        for i, state in enumerate(states[:-1]):
+            key, order = canonical.form(state.code)
+            position = {tube: j for j, tube in enumerate(order)}
+            data = bytes(position[t] for move in moves[i:] for t in move)
+            rows.append((self._blob(state.layout, key), data, len(moves) - i, int(exact), now))
+        conn = self.connection
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(_UPSERT, rows)
+            self._evict(conn, len(rows))
+
+    def _evict(self, conn: sqlite3.Connection, added: int) -> None:
+        """件数が max_entries を超えていたら古いものを消す（件数は見積もりが超えたときだけ数える）"""
+        local = self._local
+        local.puts += 1
+        if local.entries is not None:
+            local.entries += added  # 上書きした行も足すので多めの見積もり
+            if local.entries <= self.max_entries and local.puts % EVICT_CHECK_EVERY:
+                return
+        count = conn.execute("SELECT count(*) FROM solutions").fetchone()[0]
+        if count > self.max_entries:
+            excess = count - self.max_entries + self.max_entries // 10
+            conn.execute("DELETE FROM solutions WHERE key IN (SELECT key FROM solutions ORDER BY used LIMIT ?)",
+                         (excess,))
+            count -= excess
+        local.entries = count
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM solutions").fetchone()[0]
@@ -0,0 +1,198 @@
+"""NumPy で探索の先端の状態をまとめて展開する
+
+    TubeSolver(vectorized=True).solve(state, strategy="beam")
+
+状態のまとまりを (状態数, 試験管, 容量) の uint8 配列（色ID、0 は空き）にして、
+一番上の色・一番上の並びの長さ・合法な移動のマスク・子の盤面・評価値・
+重複除去のキーを配列演算で求める。ビーム探索と最良優先探索の内側のループに使う。
+
+重複除去のキーは「試験管の並べ替え」だけを同一視したもの（各試験管を8バイトの
+整数にしてソートした列）で、正規化キー（canonical.py）と違って色の付け替えは
+同一視しない。そのぶん除ける重複は減るが、キーを配列演算だけで作れる。
+容量が MAX_CAPACITY を超えるパズルや、色が255種類を超えるパズルには使えない
+（supports() が False になり、TubeSolver は従来の展開に戻る）。
+"""
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from .packed import Layout
+from .pruning import Pruner
+
+# 試験管1本を8バイトの整数にするので容量は8まで
+MAX_CAPACITY = 8
+# 最良優先探索で1度に取り出して展開する状態数
+VECTOR_BATCH = 64
+
+
+class Expansion(NamedTuple):
+    parents: np.ndarray   # 子ごとの親の添字（展開した状態の並びでの位置）
+    moves: np.ndarray     # 子ごとの (移動元, 移動先)（形は (子の数, 2)）
+    children: np.ndarray  # 子の盤面 (子の数, 試験管, 容量)
+    scores: np.ndarray    # 子の深さを除いた評価値（Evaluator.static_score と同じ値）
+    keys: List[int]       # 子の重複除去のキー
+
+
+class BatchExpander:
+    """Layout・色ごとの個数・枝刈りの規則を固定して、状態をまとめて展開する"""
+
+    def __init__(self, layout: Layout, totals: dict, pruner: Pruner):
+        self.layout = layout
+        self.pruner = pruner
+        self.tubes = layout.num_tubes
+        self.capacity = layout.capacity
+        self.bits = layout.bits
+        self.slot_count = layout.num_tubes * layout.capacity
+        self.code_bytes = (self.slot_count * self.bits + 7) // 8
+        self.key_bytes = 8 * layout.num_tubes
+        self.unknown = layout.colors.unknown_id
+        self.totals = np.zeros(256, np.int64)  # 色IDごとの盤面全体での個数
+        for cid, total in totals.items():
+            self.totals[cid] = total
+        self._weights = (1 << np.arange(self.bits)).astype(np.uint8)
+        self._shifts = (8 * np.arange(self.capacity)).astype(np.uint64)
+        self._tube_index = np.arange(self.tubes)
+        self._lower = np.tril(np.ones((self.capacity, self.capacity), bool), -1)
+        self._not_self = ~np.eye(self.tubes, dtype=bool)
+
+    @staticmethod
+    def supports(layout: Layout, pruner: Pruner) -> bool:
+        """このパズルと枝刈りの規則でまとめて展開できるか"""
+        return layout.capacity <= MAX_CAPACITY and len(layout.colors) < 256 and not pruner.dead_ends
+
+    def encode(self, codes: Sequence[int]) -> np.ndarray:
+        """PackedState.code の並びを (状態数, 試験管, 容量) の配列にする"""
+        count = len(codes)
+        n = self.code_bytes
+        raw = np.frombuffer(b''.join(code.to_bytes(n, 'little') for code in codes), np.uint8).reshape(count, n)
+        bits = np.unpackbits(raw, axis=1, bitorder='little')[:, :self.slot_count * self.bits]
+        values = (bits.reshape(count, self.slot_count, self.bits) * self._weights).sum(axis=2, dtype=np.uint8)
+        return values.reshape(count, self.tubes, self.capacity)
+
+    def pack(self, states: np.ndarray) -> List[int]:
+        """(状態数, 試験管, 容量) の配列を PackedState.code の並びに戻す"""
+        count = len(states)
+        bits = np.unpackbits(states.reshape(count, self.slot_count, 1), axis=2, bitorder='little')[:, :, :self.bits]
+        raw = np.packbits(bits.reshape(count, -1), axis=1, bitorder='little')
+        n = raw.shape[1]
+        data = raw.tobytes()
+        return [int.from_bytes(data[i * n:(i + 1) * n], 'little') for i in range(count)]
+
+    def keys(self, states: np.ndarray) -> List[int]:
+        """試験管の並べ替えを同一視した重複除去のキー"""
+        tubes = (states.astype(np.uint64) << self._shifts).sum(axis=2, dtype=np.uint64)
+        tubes.sort(axis=1)
+        n = self.key_bytes
+        data = tubes.astype('>u8').tobytes()
+        return [int.from_bytes(data[i * n:(i + 1) * n], 'big') for i in range(len(states))]
+
+    def tables(self, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """試験管ごとの（長さ, 一番上の色ID, 一番上の並びの長さ, 単色か）"""
+        lengths = np.count_nonzero(states, axis=2)
+        top_index = np.maximum(lengths - 1, 0)[:, :, None]
+        tops = np.take_along_axis(states, top_index, axis=2)[:, :, 0]
+        runs = (lengths > 0).astype(np.int64)
+        running = lengths > 0
+        for k in range(1, self.capacity):
+            index = lengths - 1 - k
+            below = np.take_along_axis(states, np.maximum(index, 0)[:, :, None], axis=2)[:, :, 0]
+            running &= (index >= 0) & (below == tops)
+            runs += running
+        uniform = (lengths > 0) & (runs == lengths)
+        return lengths, tops, runs, uniform
+
+    def solved(self, states: np.ndarray) -> np.ndarray:
+        """状態ごとに、全ての試験管が空か完成しているか"""
+        lengths, _, _, uniform = self.tables(states)
+        return ((lengths == 0) | (uniform & (lengths == self.layout.units_per_color))).all(axis=1)
+
+    def move_mask(self, lengths: np.ndarray, tops: np.ndarray, uniform: np.ndarray,
+                  last: Optional[np.ndarray]) -> np.ndarray:
+        """(状態数, 移動元, 移動先) の合法で無駄でない移動のマスク（Pruner.moves と同じ規則）
+
+        last は状態ごとの直前の (移動元, 移動先)。直前の移動がない状態は -1。
+        """
+        pruner = self.pruner
+        unknown = self.unknown
+        empty = lengths == 0
+        sources = ~empty & ~(uniform & (lengths == self.layout.units_per_color))
+        first_empty = np.where(empty.any(axis=1), empty.argmax(axis=1), -1)
+        to_empty = (self._tube_index[None, :] == first_empty[:, None])[:, None, :]
+        if pruner.uniform_to_empty:
+            to_empty = to_empty & ~(uniform & (tops != unknown))[:, :, None]
+        to_filled = (~empty & (lengths < self.capacity))[:, None, :] & (tops[:, None, :] == tops[:, :, None])
+        if unknown:
+            to_filled &= (tops != unknown)[:, :, None]
+        mask = sources[:, :, None] & (to_empty | to_filled) & self._not_self
+        if last is not None:
+            has_last = last[:, 0] >= 0
+            rows = np.nonzero(has_last)[0]
+            if pruner.inverse:
+                mask[rows, last[rows, 1], last[rows, 0]] = False
+            if pruner.commuting:
+                f = self._tube_index[None, :, None]
+                t = self._tube_index[None, None, :]
+                lf = last[:, 0, None, None]
+                lt = last[:, 1, None, None]
+                earlier = (f < lf) | ((f == lf) & (t < lt))
+                disjoint = (f != lf) & (f != lt) & (t != lf) & (t != lt)
+                mask &= ~(has_last[:, None, None] & earlier & disjoint)
+        return mask
+
+    def children(self, states: np.ndarray, parents: np.ndarray, from_tubes: np.ndarray, to_tubes: np.ndarray,
+                 lengths: np.ndarray, tops: np.ndarray, runs: np.ndarray) -> np.ndarray:
+        """移動ごとの子の盤面（Layout.pour_run なら並びごと、そうでなければ1個ずつ移す）"""
+        children = states[parents]
+        n_from = lengths[parents, from_tubes]
+        n_to = lengths[parents, to_tubes]
+        color = tops[parents, from_tubes]
+        if self.layout.pour_run:
+            counts = np.minimum(runs[parents, from_tubes], self.capacity - n_to)
+        else:
+            counts = np.ones(len(parents), np.int64)
+        rows = np.arange(len(parents))
+        for j in range(int(counts.max()) if len(counts) else 0):
+            moving = j < counts
+            r = rows[moving]
+            children[r, from_tubes[moving], n_from[moving] - 1 - j] = 0
+            children[r, to_tubes[moving], n_to[moving] + j] = color[moving]
+        return children
+
+    def scores(self, states: np.ndarray) -> np.ndarray:
+        """状態ごとの深さを除いた評価値（Evaluator.tube_score の和と同じ）"""
+        count = len(states)
+        tubes = states.reshape(-1, self.capacity)
+        n = np.count_nonzero(tubes, axis=1)
+        valid = np.arange(self.capacity)[None, :] < n[:, None]
+        score = np.where(n == 0, 300, 0)
+        uniform = (n > 0) & ((tubes == tubes[:, :1]) | ~valid).all(axis=1)
+        score += np.where(uniform & (n == self.layout.units_per_color), 20000, 0)
+        # 連続した同じ色のボーナス（同じ色が続くたびに 200 × それまでの連続数）
+        equal = (tubes[:, 1:] == tubes[:, :-1]) & valid[:, 1:]
+        score += 200 * (equal * (1 + np.cumsum(equal, axis=1))).sum(axis=1)
+        score += np.where(uniform & (n >= 2), n * 500, 0)
+        # 色の分散ペナルティ（含まれる色ごとに -200、その色の全個数がそろっていれば +200）
+        same = tubes[:, :, None] == tubes[:, None, :]
+        first = valid & ~(same & self._lower).any(axis=2)
+        counts = (same & valid[:, None, :]).sum(axis=2)
+        gathered = counts == self.totals[tubes]
+        score += (first * np.where(gathered, 0, -200)).sum(axis=1)
+        return score.reshape(count, self.tubes).sum(axis=1)
+
+    @staticmethod
+    def top(scores: np.ndarray, candidates: Sequence[int], width: int) -> np.ndarray:
+        """candidates（添字）のうち scores の大きい順に width 個（同点なら先のもの）"""
+        candidates = np.asarray(candidates, np.int64)
+        return candidates[np.argsort(-scores[candidates], kind='stable')[:width]]
+
+    def expand(self, codes: Sequence[int], last: Optional[Sequence[Optional[Tuple[int, int]]]] = None
+               ) -> Expansion:
+        """状態をまとめて展開する（last は状態ごとの直前の移動か None）"""
+        states = self.encode(codes)
+        lengths, tops, runs, uniform = self.tables(states)
+        last_array = None
+        if last is not None:
+            last_array = np.array([move if move is not None else (-1, -1) for move in last], np.int64)
+            last_array = last_array.reshape(len(codes), 2)
+        parents, from_tubes, to_tubes = np.nonzero(self.move_mask(lengths, tops, uniform, last_array))
+        children = self.children(states, parents, from_tubes, to_tubes, lengths, tops, runs)
+        return Expansion(parents, np.stack([from_tubes, to_tubes], axis=1), children, self.scores(children),
+                         self.keys(children))